@@ -0,0 +1,343 @@
+import joblib
+import numpy as np
+import pandas as pd
+
+import data_store
+
+# เกณฑ์แบ่งพื้นที่ (Zoning) ตามคะแนนเฉลี่ย STEM (แกน x) และภาษา (แกน y): <50, 50-80, >=80
+ZONE_THRESHOLDS = [50, 80]
+
+# ชื่อพื้นที่ตามช่วงคะแนน [ช่วง STEM][ช่วงภาษา] ให้ตรงกับพื้นหลังใน plot_classroom_cluster
+ZONE_GRID = [
+    ["Warning Zone", "STEM Support", "Language Expert"],
+    ["Language Support", "Development Zone", "Language Strong"],
+    ["STEM Expert", "STEM Strong", "Perfect Zone"],
+]
+
+ZONE_NAMES = [
+    "Warning Zone",
+    "STEM Support",
+    "Language Support",
+    "Development Zone",
+    "Language Expert",
+    "STEM Expert",
+    "STEM Strong",
+    "Language Strong",
+    "Perfect Zone",
+]
+
+ZONE_STAT_COLUMNS = ["MATH", "SCIENCE", "ENGLISH", "THAI", "STEM_AVG", "LANGUAGE_AVG", "OVERALL_AVG"]
+
+
+def assign_zones(stem_avg, language_avg):
+    """
+    จัดนักเรียนเข้าพื้นที่ทั้งหมดในครั้งเดียว (vectorized ด้วย np.digitize)
+    คืนค่า Categorical ของชื่อพื้นที่ (NaN ถ้าไม่มีคะแนน)
+    """
+    stem_avg = np.asarray(stem_avg, dtype=float)
+    language_avg = np.asarray(language_avg, dtype=float)
+
+    stem_bin = np.digitize(stem_avg, ZONE_THRESHOLDS)
+    language_bin = np.digitize(language_avg, ZONE_THRESHOLDS)
+
+    # แปลง (ช่วง STEM, ช่วงภาษา) เป็นรหัสพื้นที่ตามลำดับใน ZONE_NAMES
+    zone_codes = np.array([[ZONE_NAMES.index(name) for name in row] for row in ZONE_GRID])
+    codes = zone_codes[stem_bin, language_bin]
+    codes[np.isnan(stem_avg) | np.isnan(language_avg)] = -1
+
+    return pd.Categorical.from_codes(codes, categories=ZONE_NAMES)
+
+
+def add_zone_column(df):
+    """เพิ่มคอลัมน์ ZONE จาก STEM_AVG และ LANGUAGE_AVG (แก้ไข df ที่ส่งเข้ามาโดยตรง)"""
+    if "STEM_AVG" in df.columns and "LANGUAGE_AVG" in df.columns:
+        df["ZONE"] = assign_zones(df["STEM_AVG"], df["LANGUAGE_AVG"])
+    return df
+
+
+def zone_statistics(df):
+    """สรุปจำนวนนักเรียนและคะแนนเฉลี่ยในแต่ละพื้นที่ (ครบทั้ง 9 พื้นที่ แม้ไม่มีนักเรียน)"""
+    if "ZONE" not in df.columns:
+        df = add_zone_column(df.copy())
+
+    stat_columns = [column for column in ZONE_STAT_COLUMNS if column in df.columns]
+    grouped = df.groupby("ZONE", observed=False)
+    stats = grouped[stat_columns].mean()
+    stats.insert(0, "STUDENTS", grouped.size())
+    stats["SHARE"] = stats["STUDENTS"] / max(len(df), 1)
+
+    return stats.reindex(ZONE_NAMES).reset_index()
+
+
+# คุณลักษณะที่ใช้วัดความใกล้เคียงกับนักเรียนจำลอง (ค่าเริ่มต้นตรงกับแกนของ scatter plot)
+NEIGHBOR_FEATURES = ["STEM_AVG", "LANGUAGE_AVG"]
+NEIGHBOR_K = 5
+
+
+class TierNeighborIndex:
+    """
+    KD-tree ของนักเรียนจำลองแยกตามประเภทห้องเรียน
+    ใช้หานักเรียนจำลองที่ใกล้ที่สุด k คน และ TIER ส่วนใหญ่ของกลุ่มนั้น ให้กับนักเรียนจริง
+    """
+
+    def __init__(self, df, features=None, version=None):
+        self.features = list(features or NEIGHBOR_FEATURES)
+        self.version = version
+        self._trees = {}
+
+        if "CLASSROOM_TYPE" not in df.columns or "IS_SIMULATED" not in df.columns:
+            return
+
+        # import sklearn เมื่อสร้างดัชนีจริงเท่านั้น (ใช้เวลา import เกือบ 1 วินาที ไม่ให้ช้าตอนเปิดหน้าเว็บครั้งแรก)
+        from sklearn.neighbors import KDTree
+
+        simulated = df[df["IS_SIMULATED"]].dropna(subset=self.features + ["TIER"])
+        for classroom_type, group in simulated.groupby("CLASSROOM_TYPE", observed=True):
+            points = group[self.features].to_numpy(dtype=np.float64)
+            self._trees[classroom_type] = (
+                KDTree(points),
+                group["ALIAS"].astype(str).to_numpy(),
+                group["TIER"].astype(str).to_numpy(),
+            )
+
+    @property
+    def classroom_types(self):
+        return list(self._trees)
+
+    def query(self, classroom_type, points, k=NEIGHBOR_K):
+        """
+        หานักเรียนจำลองที่ใกล้ที่สุด k คนของแต่ละจุด
+        คืนค่า (ระยะทาง, ALIAS, TIER) เป็น array ขนาด (จำนวนจุด, k)
+        """
+        tree, aliases, tiers = self._trees[classroom_type]
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        k = min(k, len(aliases))
+        distances, positions = tree.query(points, k=k)
+        return distances, aliases[positions], tiers[positions]
+
+    def tier_vote(self, classroom_type, points, k=NEIGHBOR_K):
+        """TIER ที่พบมากที่สุดในเพื่อนบ้าน k คน (ถ้าเท่ากันเลือก TIER ของคนที่ใกล้กว่า)"""
+        if classroom_type not in self._trees:
+            return np.full(len(np.atleast_2d(points)), None, dtype=object)
+
+        _, _, neighbor_tiers = self.query(classroom_type, points, k)
+        # นับโหวตของทุกจุดพร้อมกัน: one-hot ของ TIER ขนาด (จำนวนจุด, k, จำนวน TIER)
+        labels, codes = np.unique(neighbor_tiers, return_inverse=True)
+        codes = codes.reshape(neighbor_tiers.shape)
+        one_hot = codes[:, :, None] == np.arange(len(labels))
+        counts = one_hot.sum(axis=1)
+        first_seen = np.where(one_hot.any(axis=1), one_hot.argmax(axis=1), codes.shape[1])
+        # เรียงตามจำนวนโหวตมากสุด แล้วตามลำดับความใกล้
+        best = np.argmax(counts * (codes.shape[1] + 1) - first_seen, axis=1)
+        return labels[best].astype(object)
+
+    def nearest_tiers(self, rows, k=NEIGHBOR_K):
+        """TIER ที่ใกล้ที่สุดของแต่ละแถว (ใช้ CLASSROOM_TYPE ของแถวนั้น) คืนค่าเป็น Series ตาม index เดิม"""
+        result = pd.Series(None, index=rows.index, dtype=object)
+        for classroom_type, group in rows.groupby("CLASSROOM_TYPE", observed=True):
+            if classroom_type in self._trees:
+                result.loc[group.index] = self.tier_vote(classroom_type, group[self.features], k)
+        return result
+
+
+def _neighbor_index_path(source_path, sheet_name, features):
+    return data_store.snapshot_artifact_path(source_path, f"neighbors_{sheet_name}_{'_'.join(features)}.joblib")
+
+
+def read_neighbor_index(source_path, sheet_name, features=None):
+    """TierNeighborIndex ที่บันทึกไว้คู่กับ snapshot ปัจจุบัน (ไม่สร้างใหม่) None ถ้ายังไม่มีหรือเป็นของเวอร์ชันอื่น"""
+    features = list(features or NEIGHBOR_FEATURES)
+    manifest = data_store.current_snapshot(source_path)
+    artifact_path = _neighbor_index_path(source_path, sheet_name, features)
+    if manifest is None or not artifact_path.exists():
+        return None
+    try:
+        index = joblib.load(artifact_path)
+    except Exception:
+        # ไฟล์เสียหรือสร้างจาก sklearn คนละเวอร์ชัน
+        return None
+    if index.version != manifest["version"] or index.features != features:
+        return None
+    return index
+
+
+def load_neighbor_index(source_path, sheet_name, df, features=None):
+    """
+    โหลด TierNeighborIndex ที่บันทึกไว้คู่กับ snapshot ถ้าเวอร์ชันตรงกัน (ดู read_neighbor_index)
+    ไม่เช่นนั้นสร้างใหม่แล้วบันทึก (worker ที่เริ่มใหม่จะไม่ต้องสร้างซ้ำ)
+    ไม่แปลงไฟล์ export เอง ถ้ายังไม่มี snapshot จะสร้างดัชนีจาก df โดยไม่บันทึก
+    """
+    features = list(features or NEIGHBOR_FEATURES)
+    manifest = data_store.current_snapshot(source_path)
+    if manifest is None:
+        return TierNeighborIndex(df, features)
+    index = read_neighbor_index(source_path, sheet_name, features)
+    if index is not None:
+        return index
+
+    artifact_path = _neighbor_index_path(source_path, sheet_name, features)
+    index = TierNeighborIndex(df, features, version=manifest["version"])
+    data_store.write_snapshot_artifact(artifact_path, lambda path: joblib.dump(index, path))
+    return index
+
+
+# คอลัมน์วิชาและเวลาเรียน (ชั่วโมง) ที่ใช้ในภาพรวมระดับชั้น
+COHORT_SUBJECTS = ["MATH", "SCIENCE", "ENGLISH", "THAI"]
+COHORT_SCORE_COLUMNS = COHORT_SUBJECTS + ["STEM_AVG", "LANGUAGE_AVG", "OVERALL_AVG"]
+
+
+def cohort_statistics(df, df_our_students=None):
+    """
+    สรุปภาพรวมทั้งระดับชั้นจาก groupby ชุดเดียวต่อตาราง (ไม่วนสร้างข้อมูลทีละคน)
+    คืนค่า dict ของ DataFrame:
+        tiers: จำนวนนักเรียนแต่ละ TIER ตาม (CLASSROOM_TYPE, STUDENT_CATEGORY)
+        scores: คะแนนเฉลี่ยแต่ละวิชาตาม (CLASSROOM_TYPE, STUDENT_CATEGORY)
+        zones: จำนวนนักเรียนแต่ละพื้นที่ตาม (CLASSROOM_TYPE, STUDENT_CATEGORY)
+        time_vs_score: คะแนนเฉลี่ยและจำนวนนักเรียนตามเวลาเรียนของแต่ละวิชา (จากห้องเรียนจริง)
+    """
+    if "ZONE" not in df.columns:
+        df = add_zone_column(df.copy())
+
+    grouped = df.groupby(["CLASSROOM_TYPE", "STUDENT_CATEGORY"], observed=True)
+    score_columns = [column for column in COHORT_SCORE_COLUMNS if column in df.columns]
+
+    tiers = pd.DataFrame()
+    if "TIER" in df.columns:
+        tier_order = data_store.EXPORT_SCHEMA["Analysis_"]["categories"]["TIER"]
+        tiers = grouped["TIER"].value_counts().unstack(fill_value=0).reindex(columns=tier_order, fill_value=0)
+    scores = grouped[score_columns].mean()
+    scores.insert(0, "STUDENTS", grouped.size())
+    zones = grouped["ZONE"].value_counts().unstack(fill_value=0).reindex(columns=ZONE_NAMES, fill_value=0)
+
+    # เวลาเรียนมีเฉพาะนักเรียนจริง ใช้ข้อมูลห้องเรียนจริง (OurStudent) ถ้ามี
+    time_source = df_our_students if df_our_students is not None else df
+    time_frames = []
+    for subject in COHORT_SUBJECTS:
+        time_column = f"{subject}_TIME_HR"
+        if time_column not in time_source.columns or subject not in time_source.columns:
+            continue
+        by_time = time_source.groupby(time_column)[subject].agg(["mean", "count"])
+        by_time = by_time.rename_axis("TIME_HR").reset_index()
+        by_time.insert(0, "SUBJECT", subject)
+        time_frames.append(by_time)
+    time_vs_score = (
+        pd.concat(time_frames, ignore_index=True)
+        if time_frames
+        else pd.DataFrame(columns=["SUBJECT", "TIME_HR", "mean", "count"])
+    )
+
+    return {
+        "tiers": tiers.reset_index(),
+        "scores": scores.reset_index(),
+        "zones": zones.reset_index(),
+        "time_vs_score": time_vs_score,
+    }
+
+
+# แบบจำลองเวลาเรียน -> คะแนน สำหรับคำถาม "ถ้าเรียนคณิตเพิ่มอีก 30 นาที"
+# เวลาเรียนมีเฉพาะนักเรียนจริง จึงเรียนรู้ความชันจากห้องเรียนจริง และใช้นักเรียนจำลองหา TIER ที่ใกล้ที่สุด
+STUDY_TIME_SUBJECTS = COHORT_SUBJECTS
+# ความชันเริ่มต้น (คะแนนต่อ log(1 + ชั่วโมง)) และน้ำหนักของค่าเริ่มต้น (เทียบเท่าผลรวมกำลังสองของเวลาที่ต่างกัน)
+# เมื่อเวลาเรียนของนักเรียนจริงแทบไม่ต่างกัน ความชันจะใกล้ค่าเริ่มต้น
+STUDY_TIME_PRIOR_SLOPE = 10.0
+STUDY_TIME_PRIOR_WEIGHT = 1.0
+# ความชันของวิชาจะถือว่า "เรียนรู้จากข้อมูล" เมื่อมีนักเรียนอย่างน้อยเท่านี้
+# และน้ำหนักของข้อมูล (ส่วนของความชันที่ไม่ได้มาจาก prior) ไม่น้อยกว่า STUDY_TIME_MIN_DATA_WEIGHT
+STUDY_TIME_MIN_SAMPLES = 10
+STUDY_TIME_MIN_DATA_WEIGHT = 0.5
+
+
+class StudyTimeModel:
+    """
+    คะแนนแต่ละวิชา = คะแนนปัจจุบัน + ความชันของวิชา x (log(1 + เวลาใหม่) - log(1 + เวลาปัจจุบัน))
+    ความชันมาจาก ridge regression แบบปิด (ดึงเข้าหา STUDY_TIME_PRIOR_SLOPE) และไม่ติดลบ
+    ถ้าเวลาเรียนแทบไม่ต่างกันระหว่างนักเรียน ความชันจะเกือบเท่ากับ prior ดู data_weight / fitted ของแต่ละวิชา
+    predict รับเวลาเรียนหลายชุดพร้อมกัน (array ขนาด (จำนวนชุด, 4)) และคำนวณด้วย NumPy ครั้งเดียว
+    """
+
+    def __init__(self, df, neighbor_index=None, version=None, prior_slope=STUDY_TIME_PRIOR_SLOPE,
+                 prior_weight=STUDY_TIME_PRIOR_WEIGHT):
+        self.version = version
+        # ใช้ได้เฉพาะดัชนีที่วัดระยะด้วย STEM_AVG / LANGUAGE_AVG (ค่าเริ่มต้นของ TierNeighborIndex)
+        self.neighbor_index = neighbor_index if neighbor_index is None or neighbor_index.features == NEIGHBOR_FEATURES else None
+        self.subjects = list(STUDY_TIME_SUBJECTS)
+        self.slopes = np.full(len(self.subjects), float(prior_slope))
+        self.samples = np.zeros(len(self.subjects), dtype=int)
+        # ส่วนเบี่ยงเบนมาตรฐานของเวลาเรียน (ชั่วโมง) และน้ำหนักของข้อมูลในความชัน (0 = prior ล้วน, 1 = ข้อมูลล้วน)
+        self.time_std = np.zeros(len(self.subjects))
+        self.data_weight = np.zeros(len(self.subjects))
+
+        for position, subject in enumerate(self.subjects):
+            time_column = f"{subject}_TIME_HR"
+            if time_column not in df.columns or subject not in df.columns:
+                continue
+            rows = df[[time_column, subject]].dropna().to_numpy(dtype=np.float64)
+            if len(rows) == 0:
+                continue
+            x = np.log1p(rows[:, 0])
+            y = rows[:, 1]
+            x = x - x.mean()
+            y = y - y.mean()
+            slope = (x @ y + prior_weight * prior_slope) / (x @ x + prior_weight)
+            self.slopes[position] = max(slope, 0.0)
+            self.samples[position] = len(rows)
+            self.time_std[position] = rows[:, 0].std()
+            self.data_weight[position] = (x @ x) / (x @ x + prior_weight)
+
+        self.fitted = (self.samples >= STUDY_TIME_MIN_SAMPLES) & (self.data_weight >= STUDY_TIME_MIN_DATA_WEIGHT)
+
+    def predict(self, base_scores, base_times, allocations):
+        """
+        base_scores / base_times: คะแนนและเวลาเรียน (ชั่วโมง) ปัจจุบันของนักเรียน ตามลำดับ self.subjects
+        allocations: เวลาเรียนที่ต้องการทดลอง (ชั่วโมง) ขนาด (จำนวนชุด, 4)
+        คืนค่า dict ของ array: scores (จำนวนชุด, 4), STEM_AVG, LANGUAGE_AVG, OVERALL_AVG, ZONE
+        และ TIER แยกตามประเภทห้องเรียน (ถ้ามี neighbor_index)
+        """
+        base_scores = np.asarray(base_scores, dtype=np.float64)
+        base_times = np.asarray(base_times, dtype=np.float64)
+        allocations = np.atleast_2d(np.asarray(allocations, dtype=np.float64))
+
+        gain = self.slopes * (np.log1p(np.clip(allocations, 0, None)) - np.log1p(base_times))
+        scores = np.clip(base_scores + gain, 0, 100)
+        stem_avg = scores[:, :2].mean(axis=1)
+        language_avg = scores[:, 2:].mean(axis=1)
+
+        prediction = {
+            "scores": scores,
+            "STEM_AVG": stem_avg,
+            "LANGUAGE_AVG": language_avg,
+            "OVERALL_AVG": scores.mean(axis=1),
+            "ZONE": np.asarray(assign_zones(stem_avg, language_avg), dtype=object),
+            "TIER": {},
+        }
+        if self.neighbor_index is not None:
+            points = np.column_stack([stem_avg, language_avg])
+            for classroom_type in self.neighbor_index.classroom_types:
+                prediction["TIER"][classroom_type] = self.neighbor_index.tier_vote(classroom_type, points)
+        return prediction
+
+
+def reallocation_grid(base_times, step_hours=0.5, max_change_hours=1.0, subjects=None):
+    """
+    ชุดเวลาเรียนทางเลือก: ย้ายเวลา step ถึง max_change ชั่วโมงจากวิชาหนึ่งไปอีกวิชาหนึ่ง (เวลารวมเท่าเดิม)
+    subjects: ตำแหน่งของวิชาที่ย้ายได้ (None = ทุกวิชา)
+    คืนค่า (allocations ขนาด (จำนวนชุด, 4), รายการ (วิชาต้นทาง, วิชาปลายทาง, ชั่วโมง))
+    """
+    base_times = np.asarray(base_times, dtype=np.float64)
+    changes = np.arange(step_hours, max_change_hours + step_hours / 2, step_hours)
+    positions = range(len(base_times)) if subjects is None else list(subjects)
+    moves = [
+        (source, target, change)
+        for source in positions
+        for target in positions
+        if source != target
+        for change in changes
+        if base_times[source] - change >= 0
+    ]
+    allocations = np.tile(base_times, (len(moves), 1))
+    if moves:
+        sources, targets, amounts = (np.array(column) for column in zip(*moves))
+        rows = np.arange(len(moves))
+        allocations[rows, sources] -= amounts
+        allocations[rows, targets] += amounts
+    return allocations, moves
@@ -0,0 +1,411 @@
+"""
+HTTP API (JSON) ที่ให้ข้อมูลรายงานชุดเดียวกับหน้า Streamlit โดยไม่ต้องเปิด session ของ Streamlit
+สำหรับ LINE bot และ portal ของโรงเรียน
+
+ตัวอย่าง:
+    python api.py --hash-token <token>                # ค่า hash สำหรับใส่ในไฟล์ token
+    BEWDAR_API_TOKENS=api_tokens.json python api.py --port 8600
+    curl -H "Authorization: Bearer <token>" http://localhost:8600/api/report/Primary2/JULY/Kyiv
+
+Endpoints:
+    GET /api/levels                                   ระดับชั้นและเดือนที่มีไฟล์ export
+    GET /api/students/{level}/{month}                 นักเรียนจริงและเดือนที่ประเมิน
+    GET /api/report/{level}/{month}/{alias}           รายงานของนักเรียน (?assessment_month=... ถ้ามีหลายเดือน)
+    GET /api/cohort/{level}/{month}                   ภาพรวมระดับชั้น
+
+กราฟทั้งหมดเป็น Plotly JSON ที่ส่งให้ Plotly.newPlot ได้ทันที
+response ถูก cache ตามเวอร์ชันของ snapshot และตอบ 304 เมื่อ ETag ตรงกัน
+
+ทุก request ต้องมี Authorization: Bearer <token> ไฟล์ token (BEWDAR_API_TOKENS) เป็น JSON:
+    {"<sha256 ของ token>": {"name": "line-bot", "students": "*"},
+     "<sha256 ของ token>": {"name": "parent-42", "students": {"Primary2": ["Kyiv"]}}}
+students เป็น "*" (ทุกระดับชั้น) หรือ dict ของระดับชั้น -> "*" (ทั้งระดับชั้น) หรือรายการ ALIAS
+ถ้าไม่ได้ตั้งไฟล์ token ทุก request จะได้ 401
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response
+from starlette.routing import Route
+
+import analytics
+import data_store
+import report_builder
+import shared_cache
+
+LEVELS = ["Primary1", "Primary2", "Primary3", "Primary4", "Primary5", "Primary6"]
+RESPONSE_CACHE_MAX_ENTRIES = 512
+LEVEL_CACHE_MAX_ENTRIES = 8
+# response ขึ้นกับสิทธิ์ของผู้เรียก ห้าม proxy / CDN เก็บไว้ให้ผู้อื่น
+CACHE_CONTROL = "private, max-age=60"
+TOKENS_ENV = "BEWDAR_API_TOKENS"
+# เวลาที่ client ควรรอก่อนลองใหม่เมื่อ snapshot ยังไม่พร้อม (วินาที)
+NOT_READY_RETRY_AFTER = 5
+
+
+class NotFound(Exception):
+    pass
+
+
+class Unauthorized(Exception):
+    pass
+
+
+class Forbidden(Exception):
+    pass
+
+
+class NotReady(Exception):
+    """snapshot ยังไม่พร้อม problems: ปัญหาที่ watcher พบตอนแปลงไฟล์ (ถ้าไฟล์ไม่ผ่านการตรวจ)"""
+
+    def __init__(self, message, problems=None):
+        super().__init__(message)
+        self.problems = problems or []
+
+
+class _LRU:
+    """dict ขนาดจำกัดที่ลบรายการที่ไม่ได้ใช้นานที่สุดออกก่อน (ใช้ได้หลาย thread)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+_responses = _LRU(RESPONSE_CACHE_MAX_ENTRIES)
+# SnapshotWatcher ของ process นี้ (ตั้งใน main) ใช้ดูปัญหาของไฟล์ที่แปลงไม่สำเร็จ
+_watcher = None
+_levels = _LRU(LEVEL_CACHE_MAX_ENTRIES)
+_level_lock = threading.Lock()
+# งานที่กำลังคำนวณอยู่ (request ที่ซ้ำกันจะรอผลเดียวกัน แทนการคำนวณพร้อมกันหลายครั้ง)
+_inflight = {}
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+_tokens = {"signature": None, "scopes": {}}
+_tokens_lock = threading.Lock()
+
+
+def load_tokens():
+    """สิทธิ์ของแต่ละ token (key เป็น sha256) อ่านไฟล์ใหม่เมื่อไฟล์เปลี่ยน ({} ถ้าไม่ได้ตั้งไฟล์)"""
+    path = os.environ.get(TOKENS_ENV)
+    if not path:
+        return {}
+    try:
+        stat = os.stat(path)
+        signature = (path, stat.st_mtime_ns, stat.st_size)
+        with _tokens_lock:
+            if _tokens["signature"] != signature:
+                with open(path, encoding="utf-8") as f:
+                    _tokens["scopes"] = json.load(f)
+                _tokens["signature"] = signature
+            return _tokens["scopes"]
+    except (OSError, ValueError):
+        # ไฟล์หายหรือเสีย ไม่ให้ token ใดผ่าน
+        return {}
+
+
+def authorize(request):
+    """สิทธิ์ของผู้เรียก (ค่า students ในไฟล์ token) raise Unauthorized ถ้าไม่มี token หรือ token ไม่ถูกต้อง"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise Unauthorized("ต้องระบุ Authorization: Bearer <token>")
+    entry = load_tokens().get(hash_token(token.strip()))
+    if entry is None:
+        raise Unauthorized("token ไม่ถูกต้อง")
+    return entry.get("students") or {}
+
+
+def allowed_aliases(scope, level):
+    """ALIAS ที่เข้าถึงได้ในระดับชั้น: "*" = ทุกคน, set ของ ALIAS หรือ set ว่างถ้าไม่มีสิทธิ์"""
+    if scope == "*":
+        return "*"
+    allowed = scope.get(level, [])
+    return "*" if allowed == "*" else set(map(str, allowed))
+
+
+def require_level(scope, level):
+    """ข้อมูลทั้งระดับชั้น (เช่น ภาพรวม) ต้องมีสิทธิ์ทั้งระดับชั้น"""
+    if allowed_aliases(scope, level) != "*":
+        raise Forbidden(f"ไม่มีสิทธิ์ดูข้อมูลทั้งระดับชั้น {level}")
+
+
+def require_student(scope, level, student_alias):
+    allowed = allowed_aliases(scope, level)
+    if allowed != "*" and student_alias not in allowed:
+        raise Forbidden(f"ไม่มีสิทธิ์ดูรายงานของ {student_alias}")
+
+
+def scope_key(scope):
+    """ส่วนของ cache key ที่แยก response ตามสิทธิ์ (ผู้มีสิทธิ์เท่ากันใช้ response ร่วมกันได้)"""
+    return json.dumps(scope, sort_keys=True)
+
+
+def snapshot_version(level, month):
+    """เวอร์ชันของ snapshot ที่ SnapshotWatcher สร้างและตรวจแล้ว (ไม่แปลงไฟล์ระหว่าง request)"""
+    source_path = data_store.export_path(level, month)
+    if level not in LEVELS or not source_path.exists():
+        raise NotFound(f"ไม่พบไฟล์ export ของ {level} เดือน {month}")
+    manifest = data_store.current_snapshot(source_path)
+    if manifest is None:
+        problems = _watcher.errors.get(source_path.name, []) if _watcher is not None else []
+        if problems:
+            raise NotReady(f"ไฟล์ export ของ {level} เดือน {month} ไม่ผ่านการตรวจ", problems)
+        raise NotReady(f"กำลังเตรียมข้อมูลของ {level} เดือน {month}")
+    return manifest["version"]
+
+
+def level_data(level, month, version):
+    """
+    ข้อมูลและดัชนีของระดับชั้น (โหลดครั้งเดียวต่อเวอร์ชันของ snapshot)
+    ใช้เฉพาะผลการจัดกลุ่มและดัชนีนักเรียนจำลองที่ watcher สร้างไว้หลัง ingest (ไม่ fit หรือสร้างดัชนีระหว่าง request)
+    """
+    key = (level, month, version)
+    data = _levels.get(key)
+    if data is None:
+        with _level_lock:
+            data = _levels.get(key)
+            if data is None:
+                data = report_builder.load_level(level, month, refresh=False, precomputed=True)
+                _levels.set(key, data)
+    return data
+
+
+def list_levels(scope):
+    return {
+        "levels": {
+            level: data_store.available_months(level) for level in LEVELS if allowed_aliases(scope, level)
+        }
+    }
+
+
+def list_students(level, month, version, scope):
+    """นักเรียนจริงและเดือนที่ประเมิน เฉพาะคนที่ผู้เรียกมีสิทธิ์"""
+    student_index = level_data(level, month, version)["student_index"]
+    allowed = allowed_aliases(scope, level)
+    return {
+        "level": level,
+        "month": month,
+        "version": version,
+        "students": [
+            {"alias": str(alias), "months": [str(m) for m in student_index.months_for(alias)]}
+            for alias in student_index.real_aliases
+            if allowed == "*" or str(alias) in allowed
+        ],
+    }
+
+
+def student_report(level, month, version, student_alias, assessment_month=None):
+    """รายงานของนักเรียน (อ่านจากรายงานที่สร้างไว้ล่วงหน้าถ้ามี)"""
+    data = level_data(level, month, version)
+    student_index = data["student_index"]
+    aliases = {str(alias): alias for alias in student_index.real_aliases}
+    if student_alias not in aliases:
+        raise NotFound(f"ไม่พบนักเรียน {student_alias} ใน {level} เดือน {month}")
+
+    months = [str(m) for m in student_index.months_for(aliases[student_alias])]
+    assessment_month = assessment_month or (months[0] if months else None)
+    if assessment_month not in months:
+        raise NotFound(f"ไม่พบผลการประเมินของ {student_alias} เดือน {assessment_month}")
+
+    def build():
+        report = report_builder.build_student_report(
+            data["df"],
+            data["df_our_students"],
+            aliases[student_alias],
+            assessment_month,
+            student_index,
+            data["our_student_index"],
+            data["neighbor_index"],
+            data["snapshot_key"],
+        )
+        return report_builder.serialize_student_report(report)
+
+    payload = shared_cache.cached_json(
+        report_builder.REPORT_CACHE_NAMESPACE,
+        report_builder.student_report_key(level, month, version, student_alias, assessment_month),
+        build,
+    )
+    # รายงานใน cache มีเฉพาะ trace ของนักเรียน ส่ง scatter plot เต็มให้ client
+    payload = report_builder.expand_student_report(
+        payload,
+        lambda classroom_type, classroom_name: report_builder.get_classroom_base_figure(
+            data["snapshot_key"], classroom_type, classroom_name, data["df"], data["student_index"]
+        ),
+    )
+    return {"level": level, "version": version, **payload}
+
+
+def cohort(level, month, version):
+    data = level_data(level, month, version)
+    stats = analytics.cohort_statistics(data["df"], data["df_our_students"])
+    figures = report_builder.create_cohort_figures(stats)
+    return {
+        "level": level,
+        "month": month,
+        "version": version,
+        "tables": {name: json.loads(table.to_json(orient="split", index=False)) for name, table in stats.items()},
+        "figures": {name: json.loads(fig.to_json()) for name, fig in figures.items()},
+    }
+
+
+async def _cached_response(request, key, compute):
+    """
+    คืน response จาก cache ถ้ามี ไม่เช่นนั้นคำนวณใน thread pool (ไม่บล็อก event loop)
+    key ต้องมีเวอร์ชันของ snapshot อยู่ด้วย
+    """
+    cached = _responses.get(key)
+    if cached is None:
+        future = _inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(run_in_threadpool(_encode, compute))
+            _inflight[key] = future
+            future.add_done_callback(lambda _: _inflight.pop(key, None))
+        cached = await future
+        _responses.set(key, cached)
+
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Authorization"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _encode(compute):
+    body = json.dumps(compute(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return f'"{hashlib.sha256(body).hexdigest()[:16]}"', body
+
+
+def _error(status_code, message, headers=None, **details):
+    body = json.dumps({"error": message, **details}, ensure_ascii=False).encode("utf-8")
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def _handler(function):
+    """ตรวจ token ก่อนเรียก function(request, scope) และแปลง exception เป็น response"""
+    async def endpoint(request):
+        try:
+            scope = authorize(request)
+            return await function(request, scope)
+        except Unauthorized as e:
+            return _error(401, str(e), {"WWW-Authenticate": "Bearer"})
+        except Forbidden as e:
+            return _error(403, str(e))
+        except NotFound as e:
+            return _error(404, str(e))
+        except NotReady as e:
+            details = {"problems": e.problems} if e.problems else {}
+            return _error(503, str(e), {"Retry-After": str(NOT_READY_RETRY_AFTER)}, **details)
+        except data_store.SnapshotNotReady as e:
+            # snapshot หรือไฟล์ที่คำนวณหลัง ingest (ผลการจัดกลุ่ม, ดัชนี) ยังไม่พร้อม
+            return _error(503, f"กำลังเตรียมข้อมูลของ {e}", {"Retry-After": str(NOT_READY_RETRY_AFTER)})
+        except ValueError as e:
+            # ไฟล์ export ไม่ผ่านการตรวจ schema
+            return _error(422, str(e))
+    return endpoint
+
+
+@_handler
+async def levels_endpoint(request, scope):
+    # key เปลี่ยนเมื่อมีไฟล์ export เพิ่มหรือถูกลบ
+    export_files = tuple(sorted(path.name for path in data_store.DATA_DIR.glob("export_all_outputs_*.xlsx")))
+    return await _cached_response(request, ("levels", export_files, scope_key(scope)), lambda: list_levels(scope))
+
+
+@_handler
+async def students_endpoint(request, scope):
+    level, month = request.path_params["level"], request.path_params["month"]
+    if not allowed_aliases(scope, level):
+        raise Forbidden(f"ไม่มีสิทธิ์ดูข้อมูลของ {level}")
+    version = await run_in_threadpool(snapshot_version, level, month)
+    return await _cached_response(
+        request,
+        ("students", level, month, version, scope_key(scope)),
+        lambda: list_students(level, month, version, scope),
+    )
+
+
+@_handler
+async def report_endpoint(request, scope):
+    level, month = request.path_params["level"], request.path_params["month"]
+    student_alias = request.path_params["alias"]
+    assessment_month = request.query_params.get("assessment_month")
+    # ตรวจสิทธิ์ก่อนหาข้อมูล (ไม่บอกว่ามีนักเรียนคนนี้หรือไม่)
+    require_student(scope, level, student_alias)
+    version = await run_in_threadpool(snapshot_version, level, month)
+    return await _cached_response(
+        request,
+        ("report", level, month, version, student_alias, assessment_month),
+        lambda: student_report(level, month, version, student_alias, assessment_month),
+    )
+
+
+@_handler
+async def cohort_endpoint(request, scope):
+    level, month = request.path_params["level"], request.path_params["month"]
+    require_level(scope, level)
+    version = await run_in_threadpool(snapshot_version, level, month)
+    return await _cached_response(request, ("cohort", level, month, version), lambda: cohort(level, month, version))
+
+
+api = Starlette(
+    routes=[
+        Route("/api/levels", levels_endpoint),
+        Route("/api/students/{level}/{month}", students_endpoint),
+        Route("/api/report/{level}/{month}/{alias}", report_endpoint),
+        Route("/api/cohort/{level}/{month}", cohort_endpoint),
+    ],
+    middleware=[Middleware(GZipMiddleware, minimum_size=1024)],
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API ของรายงานนักเรียน")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--hash-token", metavar="TOKEN", help="แสดงค่า hash ของ token สำหรับใส่ในไฟล์ token แล้วออก")
+    args = parser.parse_args()
+    if args.hash_token is not None:
+        print(hash_token(args.hash_token))
+        return
+    if not os.environ.get(TOKENS_ENV):
+        print(f"ไม่ได้ตั้ง {TOKENS_ENV} ทุก request จะได้ 401")
+    # API ไม่แปลงไฟล์ export ระหว่าง request ให้ watcher แปลงและตรวจไฟล์ใหม่ใน thread เบื้องหลัง
+    global _watcher
+    # สร้างผลการจัดกลุ่มและดัชนีนักเรียนจำลองทันทีหลัง ingest แต่ละไฟล์ request จึงอ่านอย่างเดียว
+    _watcher = data_store.SnapshotWatcher(
+        on_snapshot=lambda level, month, version: report_builder.prepare_level_artifacts(level, month)
+    ).start()
+    # keep-alive ของ HTTP/1.1 เปิดอยู่แล้ว ให้ client ใช้ connection เดิมซ้ำได้
+    uvicorn.run(api, host=args.host, port=args.port, timeout_keep_alive=30)
+
+
+if __name__ == "__main__":
+    main()
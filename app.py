@@ -1,8 +1,48 @@
+import time
+
+# เวลาเริ่มรันสคริปต์ (ใช้วัดเวลา import และเวลาจนแสดงหน้าแรกเสร็จ)
+SCRIPT_STARTED = time.perf_counter()
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from pathlib import Path
+
+import analytics
+import data_store
+import frame_cache
+import instrumentation
+import report_builder
+import shared_cache
+# ข้อมูล ตารางและกราฟของรายงานสร้างใน report_builder (ไม่ใช้ Streamlit) ใช้ร่วมกับ batch_reports.py และ api.py
+from report_builder import (
+    CLASSROOM_TABS,
+    CLASSROOM_TYPE_NAMES,
+    OVERVIEW_SUBJECTS,
+    SUMMARY_SCORE_COLUMNS,
+    create_cohort_figures,
+    create_growth_trajectory_plot,
+    create_level_summary_table,
+    create_overview_metrics,
+    create_single_scatter_plot,
+    create_single_subject_comparison,
+    create_summarize_from_summary_table,
+    create_summary_table,
+    create_teacher_notes,
+    get_cached_student_report,
+    get_classroom_base_figure,
+    level_sheet_names,
+    plot_classroom_cluster,
+    read_level_sheet,
+    read_level_sheets,
+    select_student_rows,
+    summarize_level_summary_table,
+)
+
+IMPORTS_FINISHED = time.perf_counter()
 
 # ตั้งค่า page config
 st.set_page_config(
@@ -12,611 +52,528 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-# ฟังก์ชันเตรียมข้อมูล (นำมาจากโค้ดเดิม)
-def prepare_data_for_analysis(df):
-    """
-    เตรียมข้อมูลสำหรับการทำกราฟ clustering
-    """
-    
-    # สร้างคอลัมน์เพื่อแยกนักเรียนจำลองกับนักเรียนจริง
-    df['IS_SIMULATED'] = df['ALIAS'].str.startswith('Sim')
-    df['STUDENT_CATEGORY'] = df['IS_SIMULATED'].map({True: 'Simulated', False: 'Real'})
-    
-    # คำนวณคะแนนเฉลี่ยในกลุ่มต่างๆ
-    df['STEM_AVG'] = (df['MATH'] + df['SCIENCE']) / 2
-    df['LANGUAGE_AVG'] = (df['ENGLISH'] + df['THAI']) / 2
-    df['OVERALL_AVG'] = (df['MATH'] + df['SCIENCE'] + df['ENGLISH'] + df['THAI']) / 4
-    
-    return df
 
-# ฟังก์ชันสร้าง scatter plot เดี่ยวสำหรับแต่ละห้องเรียน
-def create_single_scatter_plot(df, student_alias, classroom_type, classroom_name):
-    """สร้าง scatter plot สำหรับห้องเรียนเดี่ยว"""
-    comparison_df = prepare_data_for_analysis(df)
-    
-    tier_colors = {
-        'Diamond': "#EF28B0",
-        'Platinum': "#001c9a",
-        'Gold': '#F1C40F',
-        'Sliver': "#51daf9",
-        'Bronze': '#E74C3C'
-    }
-
-    classroom_data = comparison_df[comparison_df['CLASSROOM_TYPE'] == classroom_type]
-    target_student = classroom_data[classroom_data['ALIAS'] == student_alias]
-
-    fig = go.Figure()
-
-    # แสดงนักเรียนจำลอง (Simulated) ทุกคน
-    simulated_data = classroom_data[classroom_data['STUDENT_CATEGORY'] == 'Simulated']
-    for tier in simulated_data['TIER'].unique():
-        tier_data = simulated_data[simulated_data['TIER'] == tier]
-        if len(tier_data) > 0:
-            fig.add_trace(
-                go.Scatter(
-                    x=tier_data['STEM_AVG'],
-                    y=tier_data['LANGUAGE_AVG'],
-                    mode='markers',
-                    marker=dict(
-                        color=tier_colors.get(tier, '#888888'),
-                        size=12,  # ขนาดใหญ่ขึ้นเพื่อดูง่ายบนมือถือ
-                        symbol='circle',
-                        opacity=0.7
-                    ),
-                    name=f'{tier}',
-                    hovertemplate='<b>%{text}</b><br>STEM: %{x:.1f}<br>Language: %{y:.1f}<extra></extra>',
-                    text=tier_data['ALIAS']
-                )
-            )
+# การแสดงผลตารางสรุปใน st.dataframe (ทศนิยม 1 ตำแหน่ง)
+SUMMARY_COLUMN_CONFIG = {
+    name: st.column_config.NumberColumn(name, format="%.1f") for name in SUMMARY_SCORE_COLUMNS.values()
+}
 
-    # แสดงนักเรียนที่เลือก
-    if len(target_student) > 0:
-        fig.add_trace(
-            go.Scatter(
-                x=target_student['STEM_AVG'],
-                y=target_student['LANGUAGE_AVG'],
-                mode='markers',
-                marker=dict(
-                    color='red',
-                    size=25,  # ขนาดใหญ่ขึ้นเพื่อดูง่ายบนมือถือ
-                    symbol='diamond',
-                    line=dict(width=3, color='white')
-                ),
-                name=f'{student_alias}',
-                hovertemplate='<b>%{text}</b><br>STEM: %{x:.1f}<br>Language: %{y:.1f}<extra></extra>',
-                text=target_student['ALIAS']
-            )
-        )
-    
-    # เส้นอ้างอิง
-    fig.add_hline(y=50, line_dash="dash", line_color="red", opacity=0.5)
-    fig.add_vline(x=50, line_dash="dash", line_color="red", opacity=0.5)
-    fig.add_trace(
-        go.Scatter(
-            x=[0, 100], y=[0, 100],
-            mode='lines',
-            line=dict(dash='dot', color='gray', width=1),
-            showlegend=False,
-            hoverinfo='skip'
-        )
-    )
 
-    fig.update_layout(
-        height=500,  # ความสูงที่เหมาะสมกับมือถือ
-        title_text=f"ตำแหน่งนักเรียนในห้องเรียน {classroom_name}",
-        title_x=0.5,
-        showlegend=True,
-        legend=dict(
-            orientation="h",  # แสดง legend แนวนอนเพื่อประหยัดพื้นที่
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        )
-    )
-    
-    fig.update_xaxes(title_text="คะแนนเฉลี่ย STEM (คณิต + วิทยาศาสตร์)", range=[0, 100])
-    fig.update_yaxes(title_text="คะแนนเฉลี่ยภาษา (อังกฤษ + ไทย)", range=[0, 100])
+# True = สร้างกราฟเฉพาะห้องเรียนที่กำลังเปิดดู, False = ใช้ st.tabs แบบเดิม (สร้างกราฟครบทุกห้องทุกครั้ง)
+LAZY_CLASSROOM_TABS = True
 
-    # การตั้งค่าสำหรับมือถือ
-    fig.update_layout(
-        font=dict(size=12),  # ขนาดฟอนต์ที่เหมาะสม
-        margin=dict(l=50, r=50, t=80, b=50)  # margin ที่เหมาะสม
-    )
+def render_classroom_tab(df, student_alias, selected_month, classroom_type, classroom_name, heading, description,
+                         student_index=None, snapshot_key=None, report=None):
+    """แสดงกราฟคะแนนรายวิชาและ scatter plot ของห้องเรียนเดียว (ใช้กราฟจาก report ถ้าสร้างไว้ล่วงหน้า)"""
+    st.markdown(heading)
+    st.markdown(description)
 
-    fig.update_layout(dragmode=False)
-    
-    return fig
+    # Subject comparison
+    if report is not None:
+        subject_fig = report['classroom_figures'][classroom_type]['subject']
+    else:
+        subject_fig = create_single_subject_comparison(df, student_alias, selected_month, classroom_type, classroom_name, student_index)
+    if subject_fig:
+        instrumentation.plotly_chart(subject_fig, use_container_width=True)
 
-# ฟังก์ชันสร้างกราฟเปรียบเทียบคะแนนเดี่ยวสำหรับแต่ละห้องเรียน
-def create_single_subject_comparison(df, student_alias, selected_month, classroom_type, classroom_name):
-    """สร้างกราฟเปรียบเทียบคะแนนสำหรับห้องเรียนเดี่ยว"""
-    student_data = df[(df['ALIAS'] == student_alias) & (df['MONTH'] == selected_month)]
-    
-    if len(student_data) == 0:
-        return None
+    # Scatter plot
+    if report is not None:
+        scatter_fig = report['classroom_figures'][classroom_type]['scatter']
+    else:
+        scatter_fig = create_single_scatter_plot(df, student_alias, classroom_type, classroom_name, student_index, snapshot_key)
+    if scatter_fig:
+        instrumentation.plotly_chart(scatter_fig, use_container_width=True)
+
+@st.fragment
+def render_lazy_classroom_tabs(df, student_alias, selected_month, student_index=None, snapshot_key=None, report=None):
+    """เลือกห้องเรียนด้วยปุ่ม แล้วสร้างกราฟเฉพาะห้องที่เลือก (เปลี่ยนห้องจะ rerun เฉพาะส่วนนี้)"""
+    labels = [tab[0] for tab in CLASSROOM_TABS]
+    selected_label = st.segmented_control(
+        "ห้องเรียน",
+        options=labels,
+        default=labels[0],
+        label_visibility="collapsed",
+        key="classroom_tab",
+    )
+    # segmented_control คืน None เมื่อกดยกเลิกการเลือก ให้กลับไปห้องแรก
+    if selected_label is None:
+        selected_label = labels[0]
 
-    subjects = ['MATH', 'SCIENCE', 'ENGLISH', 'THAI']
-    subject_names = ['คณิตศาสตร์', 'วิทยาศาสตร์', 'ภาษาอังกฤษ', 'ภาษาไทย']
-    
-    classroom_student = student_data[student_data['CLASSROOM_TYPE'] == classroom_type]
+    for label, classroom_type, classroom_name, heading, description in CLASSROOM_TABS:
+        if label == selected_label:
+            render_classroom_tab(df, student_alias, selected_month, classroom_type, classroom_name, heading, description,
+                                 student_index, snapshot_key, report)
 
-    if len(classroom_student) == 0:
-        return None
+def render_classroom_tabs(df, student_alias, selected_month, student_index=None, snapshot_key=None, report=None):
+    """แสดงผลการเรียนในแต่ละห้องเรียนจำลอง"""
+    if LAZY_CLASSROOM_TABS:
+        render_lazy_classroom_tabs(df, student_alias, selected_month, student_index, snapshot_key, report)
+        return
 
-    scores = [classroom_student[subject].iloc[0] for subject in subjects]
+    # ใช้ tabs แทน columns เพื่อให้ดูง่ายบนมือถือ
+    tabs = st.tabs([tab[0] for tab in CLASSROOM_TABS])
 
-    # กำหนดสีรายแท่งตาม logic ที่คุณต้องการ
-    bar_colors = []
-    for i, subject in enumerate(subjects):
-        score = scores[i]
-        
-        # เงื่อนไขการให้สีตามคะแนน
-        if score < 50:
-            color = "#E74C3C"  # แดง
-        elif 50 <= score < 80:
-            color = "#F1C40F"  # เหลือง
-        else:
-            color = "#2ECC71"  # เขียว
+    # แสดงกราฟแต่ละห้องเรียนใน tab แยก
+    for tab, (_, classroom_type, classroom_name, heading, description) in zip(tabs, CLASSROOM_TABS):
+        with tab:
+            render_classroom_tab(df, student_alias, selected_month, classroom_type, classroom_name, heading, description,
+                                 student_index, snapshot_key, report)
 
-        # เงื่อนไขการลบสี (ทำให้ bar โปร่ง) สำหรับบางวิชา
-        if classroom_type == 'stem_focused' and subject not in ['MATH', 'SCIENCE']:
-            color = "lightgray"
-        elif classroom_type == 'language_focused' and subject not in ['ENGLISH', 'THAI']:
-            color = "lightgray"
 
-        bar_colors.append(color)
+# ช่วงของการปรับเวลาเรียน (นาที) ใน what-if
+WHAT_IF_MAX_MINUTES = 60
+WHAT_IF_STEP_MINUTES = 15
+WHAT_IF_TOP_MOVES = 5
 
-    fig = go.Figure()
-    
-    fig.add_trace(
-        go.Bar(
-            x=subject_names,
-            y=scores,
-            name=classroom_name,
-            marker_color=bar_colors,
-            text=[f'{score:.1f}' for score in scores],
-            textposition='auto',
-            textfont=dict(size=14, color='white', family='Arial Black')  # ข้อความชัดเจนขึ้น
-        )
-    )
 
-    fig.update_layout(
-        height=400,  # ความสูงที่เหมาะสมกับมือถือ
-        title_text=f"คะแนนแต่ละวิชาในห้องเรียน {classroom_name}",
-        title_x=0.5,
-        showlegend=False,
-        font=dict(size=12),
-        margin=dict(l=50, r=50, t=80, b=50)
+def create_what_if_table(model, base_scores, base_times):
+    """
+    ตารางการย้ายเวลาเรียนระหว่างวิชา (เวลารวมเท่าเดิม) ที่เพิ่มคะแนนเฉลี่ยรวมได้มากที่สุด
+    ใช้เฉพาะวิชาที่ความชันเรียนรู้จากข้อมูล (model.fitted) วิชาที่ยังเป็นค่า prior ไม่นำมาจัดอันดับ
+    """
+    allocations, moves = analytics.reallocation_grid(
+        base_times, WHAT_IF_STEP_MINUTES * 2 / 60, WHAT_IF_MAX_MINUTES / 60,
+        subjects=np.flatnonzero(model.fitted),
     )
-    
-    fig.update_yaxes(title_text="คะแนน", range=[0, 100])
-    fig.update_xaxes(title_text="วิชา")
-
-    fig.update_layout(dragmode=False)
-
-    return fig
-
-# ฟังก์ชันเดิมที่ยังคงใช้ได้ (สำหรับใครที่ต้องการดูแบบรวม)
-def create_interactive_scatter_plot(df, student_alias):
-    """สร้าง interactive scatter plot ด้วย Plotly (แสดงเฉพาะ target + simulated students)"""
-    comparison_df = prepare_data_for_analysis(df)
-    
-    classroom_types = ['stem_focused', 'language_focused', 'balanced_mixed', 'general']
-    classroom_names = ['STEM-Focused', 'Language-Focused', 'Balanced Mixed', 'General']
-
-    tier_colors = {
-        'Diamond': "#EF28B0",
-        'Platinum': "#001c9a",
-        'Gold': '#F1C40F',
-        'Sliver': "#51daf9",
-        'Bronze': '#E74C3C'
-    }
-
-    fig = make_subplots(
-        rows=2, cols=2,
-        subplot_titles=classroom_names,
-        specs=[[{"secondary_y": False}, {"secondary_y": False}],
-               [{"secondary_y": False}, {"secondary_y": False}]]
+    if not moves:
+        return pd.DataFrame()
+    prediction = model.predict(base_scores, base_times, allocations)
+    current_overall = float(np.mean(base_scores))
+    subject_names = dict(OVERVIEW_SUBJECTS)
+
+    table = pd.DataFrame({
+        'การปรับเวลาเรียน': [
+            f"{subject_names[model.subjects[source]]} → {subject_names[model.subjects[target]]} {hours * 60:.0f} นาที"
+            for source, target, hours in moves
+        ],
+        'คะแนนเฉลี่ยรวม': prediction['OVERALL_AVG'],
+        'เปลี่ยนแปลง': prediction['OVERALL_AVG'] - current_overall,
+        'พื้นที่': prediction['ZONE'],
+    })
+    return table.sort_values('เปลี่ยนแปลง', ascending=False, kind='stable').head(WHAT_IF_TOP_MOVES)
+
+
+def study_time_fit_caption(model):
+    """แสดงจำนวนนักเรียนและความกระจายของเวลาเรียนที่ใช้ประมาณความชันของแต่ละวิชา"""
+    subject_names = dict(OVERVIEW_SUBJECTS)
+    details = ", ".join(
+        f"{subject_names[subject]}: {samples} คน, SD {time_std * 60:.0f} นาที"
+        + ("" if fitted else " (ข้อมูลไม่พอ ใช้ค่าตั้งต้น)")
+        for subject, samples, time_std, fitted in zip(model.subjects, model.samples, model.time_std, model.fitted)
     )
+    st.caption(f"ข้อมูลที่ใช้ประมาณผลของเวลาเรียน: {details}")
+
+
+@st.fragment
+def render_what_if(model, student_row):
+    """ปรับเวลาเรียนแต่ละวิชาด้วย slider แล้วดูคะแนน พื้นที่ และ TIER ที่คาดการณ์ (rerun เฉพาะส่วนนี้)"""
+    base_scores = student_row[model.subjects].to_numpy(dtype=float)
+    base_times = student_row[[f"{subject}_TIME_HR" for subject in model.subjects]].to_numpy(dtype=float)
+    if np.isnan(base_scores).any() or np.isnan(base_times).any():
+        st.info("ℹ️ ไม่มีข้อมูลเวลาเรียนครบทุกวิชาสำหรับการจำลอง")
+        return
+
+    changes = []
+    subject_names = dict(OVERVIEW_SUBJECTS)
+    for col, subject, base_time in zip(st.columns(4), model.subjects, base_times):
+        with col:
+            changes.append(st.slider(
+                f"{subject_names[subject]} (นาที)",
+                min_value=-min(WHAT_IF_MAX_MINUTES, int(base_time * 60) // WHAT_IF_STEP_MINUTES * WHAT_IF_STEP_MINUTES),
+                max_value=WHAT_IF_MAX_MINUTES,
+                value=0,
+                step=WHAT_IF_STEP_MINUTES,
+                key=f"what_if_{subject}",
+                help=f"เวลาเรียนปัจจุบัน {base_time * 60:.0f} นาที",
+            ))
+    study_time_fit_caption(model)
+
+    allocation = base_times + np.array(changes) / 60
+    current = model.predict(base_scores, base_times, base_times)
+    prediction = model.predict(base_scores, base_times, allocation)
+
+    col1, col2, col3 = st.columns(3)
+    for col, (column, label) in zip(
+        [col1, col2, col3],
+        [('OVERALL_AVG', "คะแนนเฉลี่ยรวม"), ('STEM_AVG', "คะแนนเฉลี่ย STEM"), ('LANGUAGE_AVG', "คะแนนเฉลี่ยภาษา")],
+    ):
+        with col:
+            st.metric(label, f"{prediction[column][0]:.1f}", f"{prediction[column][0] - current[column][0]:+.1f}")
+
+    tiers = ", ".join(
+        f"{CLASSROOM_TYPE_NAMES.get(classroom_type, classroom_type)}: {tier[0]}"
+        for classroom_type, tier in prediction['TIER'].items()
+    )
+    st.write(f"📍 พื้นที่ที่คาดการณ์: **{prediction['ZONE'][0]}**" + (f" · TIER ที่ใกล้เคียง: {tiers}" if tiers else ""))
 
-    for idx, (classroom_type, name) in enumerate(zip(classroom_types, classroom_names)):
-        row = idx // 2 + 1
-        col = idx % 2 + 1
-        
-        classroom_data = comparison_df[comparison_df['CLASSROOM_TYPE'] == classroom_type]
-        target_student = classroom_data[classroom_data['ALIAS'] == student_alias]
-
-        # ✅ แสดงนักเรียนจำลอง (Simulated) ทุกคน
-        simulated_data = classroom_data[classroom_data['STUDENT_CATEGORY'] == 'Simulated']
-        for tier in simulated_data['TIER'].unique():
-            tier_data = simulated_data[simulated_data['TIER'] == tier]
-            if len(tier_data) > 0:
-                fig.add_trace(
-                    go.Scatter(
-                        x=tier_data['STEM_AVG'],
-                        y=tier_data['LANGUAGE_AVG'],
-                        mode='markers',
-                        marker=dict(
-                            color=tier_colors.get(tier, '#888888'),
-                            size=8,
-                            symbol='circle',
-                            opacity=0.6
-                        ),
-                        name=f'Simulated - {tier}',
-                        showlegend=True if idx == 0 else False,
-                        hovertemplate='<b>%{text}</b><br>STEM: %{x:.1f}<br>Language: %{y:.1f}<extra></extra>',
-                        text=tier_data['ALIAS']
-                    ),
-                    row=row, col=col
-                )
-
-        # ✅ แสดงเฉพาะนักเรียนที่เลือก
-        if len(target_student) > 0:
-            fig.add_trace(
-                go.Scatter(
-                    x=target_student['STEM_AVG'],
-                    y=target_student['LANGUAGE_AVG'],
-                    mode='markers',
-                    marker=dict(
-                        color='red',
-                        size=20,
-                        symbol='diamond',
-                        line=dict(width=2, color='white')
-                    ),
-                    name=f'{student_alias} (Target)',
-                    hovertemplate='<b>%{text}</b><br>STEM: %{x:.1f}<br>Language: %{y:.1f}<extra></extra>',
-                    text=target_student['ALIAS'],
-                    showlegend=True if idx == 0 else False
-                ),
-                row=row, col=col
+    with st.expander("💡 การย้ายเวลาเรียนที่เพิ่มคะแนนเฉลี่ยรวมได้มากที่สุด (เวลารวมเท่าเดิม)"):
+        if model.fitted.sum() < 2:
+            st.info("ℹ️ ข้อมูลไม่พอสำหรับจัดอันดับ: จำนวนนักเรียนหรือความต่างของเวลาเรียนในระดับชั้นนี้ยังน้อยเกินไป")
+        else:
+            st.dataframe(
+                create_what_if_table(model, base_scores, base_times),
+                hide_index=True,
+                column_config={
+                    'คะแนนเฉลี่ยรวม': st.column_config.NumberColumn(format="%.1f"),
+                    'เปลี่ยนแปลง': st.column_config.NumberColumn(format="%+.1f"),
+                },
             )
-        
-        # เส้นอ้างอิง
-        fig.add_hline(y=50, line_dash="dash", line_color="red", opacity=0.5, row=row, col=col)
-        fig.add_vline(x=50, line_dash="dash", line_color="red", opacity=0.5, row=row, col=col)
-        fig.add_trace(
-            go.Scatter(
-                x=[0, 100], y=[0, 100],
-                mode='lines',
-                line=dict(dash='dot', color='gray', width=1),
-                showlegend=False,
-                hoverinfo='skip'
-            ),
-            row=row, col=col
+    if model.fitted.all():
+        st.caption("ค่าคาดการณ์จากแบบจำลองที่เรียนรู้จากเวลาเรียนและคะแนนของนักเรียนจริงในระดับชั้นนี้ ใช้เป็นแนวทางเท่านั้น")
+    else:
+        st.caption(
+            "ค่าคาดการณ์ของวิชาที่ข้อมูลไม่พอใช้ค่าตั้งต้นของแบบจำลอง ไม่ได้เรียนรู้จากนักเรียนในระดับชั้นนี้"
+            " ใช้เป็นแนวทางเท่านั้น"
         )
 
-    fig.update_layout(
-        height=800,
-        title_text=f"Student Performance Analysis - {student_alias}",
-        title_x=0.5,
-        showlegend=True
-    )
-    
-    fig.update_xaxes(title_text="STEM Average (Math + Science)", range=[0, 100])
-    fig.update_yaxes(title_text="Language Average (English + Thai)", range=[0, 100])
 
-    # ปิด interaction
-    fig.update_layout(dragmode=False)
-    
-    return fig
+def prefetch_level(level, month, snapshot_version):
+    """
+    เตรียม DataFrame ของทั้งสอง sheet ของ snapshot เวอร์ชันนี้ไว้ใน shared_cache ล่วงหน้า
+    (key เดียวกับ load_data_by_level จึงโหลดได้ทันทีเมื่อผู้ใช้เลือกระดับชั้น/เดือนนี้)
+    ไม่ทำอะไรถ้าปิด shared_cache (ไม่มีที่เก็บผลลัพธ์ให้ session อื่น)
+    """
+    cache = shared_cache.get_cache()
+    if cache is None or snapshot_version is None:
+        return
+    sheet_names = level_sheet_names(level)
+    # ตรวจโดยไม่อ่านค่าและไม่อัปเดตเวลาใช้งานล่าสุด
+    if all(cache.contains(cache.make_key("frame", (level, sheet_name, month, snapshot_version))) for sheet_name in sheet_names):
+        return
+    sheets = read_level_sheets(level, month, sheet_names, refresh=not BACKGROUND_INGESTION)
+    for sheet_name, df in sheets.items():
+        shared_cache.cached_frame("frame", (level, sheet_name, month, snapshot_version), lambda df=df: df)
+
+
+PREFETCH_WORKERS = 2
+
+
+class LevelPrefetcher:
+    """ส่งงาน prefetch_level ให้ thread pool ครั้งเดียวต่อ (ระดับชั้น, เดือน, เวอร์ชันของ snapshot)"""
+
+    def __init__(self, max_workers=PREFETCH_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._submitted = {}
+        self._lock = threading.Lock()
+
+    def submit(self, level, month, snapshot_version):
+        key = (level, month, snapshot_version)
+        with self._lock:
+            if key not in self._submitted:
+                self._submitted[key] = self._executor.submit(self._run, level, month, snapshot_version)
+            return self._submitted[key]
+
+    def wait(self, level, month, snapshot_version):
+        """รอ prefetch ของระดับชั้น/เดือนนี้ที่กำลังทำงานอยู่ (ไม่ต้องอ่าน snapshot ซ้ำใน thread ของหน้าเว็บ)"""
+        with self._lock:
+            future = self._submitted.get((level, month, snapshot_version))
+        if future is not None:
+            future.result()
+
+    def discard(self, level, month, snapshot_version):
+        """ลืมงานของ snapshot เวอร์ชันที่ถูกแทนที่แล้ว"""
+        with self._lock:
+            self._submitted.pop((level, month, snapshot_version), None)
+
+    @staticmethod
+    def _run(level, month, snapshot_version):
+        try:
+            prefetch_level(level, month, snapshot_version)
+        except Exception:
+            # prefetch ไม่สำเร็จก็ไม่เป็นไร load_data_by_level จะโหลดและแจ้งข้อผิดพลาดเอง
+            pass
 
-# ฟังก์ชันสร้างกราฟเปรียบเทียบคะแนนในแต่ละวิชา (เดิม)
-def create_subject_comparison(df, student_alias, selected_month):
-    """สร้างกราฟเปรียบเทียบคะแนนในแต่ละวิชา"""
-    student_data = df[(df['ALIAS'] == student_alias) & (df['MONTH'] == selected_month)]
-    
-    if len(student_data) == 0:
-        return None
 
-    subjects = ['MATH', 'SCIENCE', 'ENGLISH', 'THAI']
-    subject_names = ['คณิตศาสตร์', 'วิทยาศาสตร์', 'ภาษาอังกฤษ', 'ภาษาไทย']
-    
-    fig = make_subplots(
-        rows=2, cols=2,
-        subplot_titles=['STEM-Focused', 'Language-Focused', 'Balanced Mixed', 'General'],
-        specs=[[{"type": "bar"}, {"type": "bar"}],
-               [{"type": "bar"}, {"type": "bar"}]]
-    )
+@st.cache_resource
+def get_frame_cache():
+    """FrameCache หนึ่งตัวต่อ process (งบหน่วยความจำตั้งได้ด้วย BEWDAR_FRAME_CACHE_MB)"""
+    return frame_cache.FrameCache()
 
-    classroom_types = ['stem_focused', 'language_focused', 'balanced_mixed', 'general']
-    
-    for idx, classroom_type in enumerate(classroom_types):
-        row = idx // 2 + 1
-        col = idx % 2 + 1
 
-        classroom_student = student_data[student_data['CLASSROOM_TYPE'] == classroom_type]
+@st.cache_resource
+def get_level_prefetcher():
+    """LevelPrefetcher หนึ่งตัวต่อ process (ใช้ร่วมกันทุก session)"""
+    return LevelPrefetcher()
 
-        if len(classroom_student) > 0:
-            scores = [classroom_student[subject].iloc[0] for subject in subjects]
 
-            # กำหนดสีรายแท่งตาม logic ที่คุณต้องการ
-            bar_colors = []
-            for i, subject in enumerate(subjects):
-                score = scores[i]
-                
-                # เงื่อนไขการให้สีตามคะแนน
-                if score < 50:
-                    color = "#E74C3C"  # แดง
-                elif 50 <= score < 80:
-                    color = "#F1C40F"  # เหลือง
-                else:
-                    color = "#2ECC71"  # เขียว
-
-                # เงื่อนไขการลบสี (ทำให้ bar โปร่ง) สำหรับบางวิชา
-                if classroom_type == 'stem_focused' and subject not in ['MATH', 'SCIENCE']:
-                    color = "lightgray"
-                elif classroom_type == 'language_focused' and subject not in ['ENGLISH', 'THAI']:
-                    color = "lightgray"
-
-                bar_colors.append(color)
-
-            fig.add_trace(
-                go.Bar(
-                    x=subject_names,
-                    y=scores,
-                    name=f'{classroom_type.replace("_", " ").title()}',
-                    marker_color=bar_colors,
-                    showlegend=False,
-                    text=[f'{score:.1f}' for score in scores],
-                    textposition='auto',
-                ),
-                row=row, col=col
+def render_cohort_dashboard(cohort_stats, selected_level, selected_month, student_summary=None):
+    """
+    แสดงภาพรวมของทั้งระดับชั้น (สำหรับครูและผู้บริหาร)
+    student_summary: ผลรายคนจาก summarize_level_summary_table (ถ้ามี)
+    """
+    st.markdown("---")
+    st.header(f"🏫 ภาพรวมระดับชั้น {selected_level} (เดือน {selected_month})")
+
+    scores = cohort_stats['scores']
+    real_scores = scores[scores['STUDENT_CATEGORY'] == 'Real']
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("นักเรียนจริง", f"{int(real_scores['STUDENTS'].max()) if len(real_scores) else 0} คน")
+    with col2:
+        st.metric("คะแนนเฉลี่ย STEM", f"{real_scores['STEM_AVG'].mean():.1f}")
+    with col3:
+        st.metric("คะแนนเฉลี่ยภาษา", f"{real_scores['LANGUAGE_AVG'].mean():.1f}")
+
+    figures = create_cohort_figures(cohort_stats)
+    for key in ['scores', 'tiers', 'zones', 'time_vs_score']:
+        if key in figures:
+            instrumentation.plotly_chart(figures[key], use_container_width=True)
+
+    with st.expander("📋 ตารางคะแนนเฉลี่ยแยกตามห้องเรียน"):
+        st.dataframe(scores, hide_index=True, use_container_width=True)
+
+    if student_summary is not None and len(student_summary) > 0:
+        with st.expander("🎯 ห้องเรียนจำลองที่เหมาะสมของนักเรียนแต่ละคน"):
+            st.dataframe(
+                student_summary,
+                hide_index=True,
+                use_container_width=True,
+                column_config={"General Overall Avg": st.column_config.NumberColumn(format="%.1f")},
             )
 
-    fig.update_layout(
-        height=600,
-        title_text=f"Subject Scores Comparison - {student_alias} (Month {selected_month})",
-        title_x=0.5
-    )
-    
-    fig.update_yaxes(title_text="Score", range=[0, 100])
 
-    # ปิด interaction
-    fig.update_layout(dragmode=False)
-    
-    return fig
+def warm_student_reports(level, month, version):
+    """
+    สร้างรายงานของนักเรียนทุกคนล่วงหน้าหลัง ingest (ทำงานใน thread ของ start_snapshot_watcher ไม่ใช่ thread ของ watcher)
+    batch_reports.warm_level ล็อกทั้งเครื่องและข้ามเวอร์ชันที่สร้างแล้ว หลาย replica จึงไม่สร้างซ้ำกัน
+    """
+    # import ตอนเรียกใช้ เพราะ batch_reports import app
+    import batch_reports
+    try:
+        batch_reports.warm_level(level, month, batch_reports.WARM_WORKERS)
+    except Exception:
+        # ไม่มีรายงานล่วงหน้าก็ไม่เป็นไร หน้าเว็บจะสร้างแต่ละส่วนเอง
+        pass
 
-def create_summary_table(df, student_alias, selected_month):
-    """สร้างตารางสรุปผลการประเมิน"""
-    student_data = df[(df['ALIAS'] == student_alias) & (df['MONTH'] == selected_month)]
-    
-    if len(student_data) == 0:
-        return None
-    
-    prepared_data = prepare_data_for_analysis(student_data)
-    
-    summary_data = []
-    for _, row in prepared_data.iterrows():
-        summary_data.append({
-            'Classroom Type': row['CLASSROOM_TYPE'].replace('_', ' ').title(),
-            'Math': f"{row['MATH']:.1f}",
-            'Science': f"{row['SCIENCE']:.1f}",
-            'English': f"{row['ENGLISH']:.1f}",
-            'Thai': f"{row['THAI']:.1f}",
-            'STEM Avg': f"{row['STEM_AVG']:.1f}",
-            'Language Avg': f"{row['LANGUAGE_AVG']:.1f}",
-            'Overall Avg': f"{row['OVERALL_AVG']:.1f}",
-            'Tier': row['TIER'],
-            'Rank': row['RANK']
-        })
-    
-    return pd.DataFrame(summary_data)
-
-def create_summarize_from_summary_table(summary_df):
-    """สร้างข้อความ markdown สำหรับสรุปผล"""
-    if summary_df is None or len(summary_df) == 0:
-        return "⚠️ ไม่พบข้อมูลนักเรียน"
-
-    # คำอธิบายแต่ละระดับ TIER
-    tier_descriptions = {
-        'Diamond': "อยู่ใกล้นักเรียนอัจฉริยะ คาดว่า นักเรียนมีความสามารถเหมาะสมในห้องเรียนนี้",
-        'Platinum': "อยู่ใกล้นักเรียนเก่ง คาดว่า นักเรียนสามารถเรียนในห้องเรียนนี้ได้และจะพัฒนาได้ดีในห้องเรียนนี้",
-        'Gold': "อยู่ใกล้นักเรียนดี คาดว่า  นักเรียนสามารถเรียนในห้องเรียนนี้ได้",
-        'Silver': "อยู่ใกล้นักเรียนพอใช้ คาดว่า นักเรียนสามารถเรียนในห้องเรียนนี้ได้ แต่ต้องพัฒนาตัวเองอย่างสม่ำเสมอ",
-        'Bronze': "อยู่ใกล้นักเรียนที่ต้องพัฒนา คาดว่า นักเรียนต้องพัฒนาตัวเองให้มากกว่าเดิม"
-    }
-
-    # กรองเฉพาะห้องเรียนจำลอง (ไม่รวม 'General')
-    simulated_df = summary_df[summary_df['Classroom Type'] != 'General']
-    
-    # หา Overall Avg สูงสุดในห้องเรียนจำลอง
-    best_row = simulated_df.loc[simulated_df['Rank'].astype(float).idxmin()]
-    best_classroom = best_row['Classroom Type']
-    best_score = best_row['Overall Avg']
-    best_tier = best_row['Tier']
-    detail_best_tier = tier_descriptions.get(best_tier, "ไม่มีคำอธิบาย")
 
-    # หาค่าจากห้องเรียนทั่วไป
-    general_row = summary_df[summary_df['Classroom Type'] == 'General'].iloc[0]
-    general_score = general_row['Overall Avg']
-    general_tier = general_row['Tier']
-    detail_general_tier = tier_descriptions.get(general_tier, "ไม่มีคำอธิบาย")
+# แปลงไฟล์ export ใหม่ใน thread เบื้องหลัง แทนการแปลงระหว่างที่ผู้ใช้เปิดหน้าเว็บ
+BACKGROUND_INGESTION = True
 
-    markdown_text = f"""
-        ### 🧠 สรุปผลการจำลองศักยภาพนักเรียน
+# สร้างรายงานล่วงหน้าหลัง ingest ปิดได้ด้วย BEWDAR_WARM_REPORTS=0 (เช่น เมื่อใช้ python batch_reports.py --warm แทน)
+WARM_REPORTS = os.environ.get("BEWDAR_WARM_REPORTS", "1") != "0"
 
-        1. หากวัดจากในห้องเรียนจำลองทั้งหมด:  
-        นักเรียนมีผลการเรียนที่ดีที่สุดในห้องเรียน **{best_classroom}**  
-        อยู่ในระดับใกล้เคียงกับ **{best_tier}** → _{detail_best_tier}_
 
-        2. หากวัดจากห้องเรียนทั่วไปตามมาตรฐาน:  
-        นักเรียนจะมีคะแนนเฉลี่ย **{general_score}**  
-        อยู่ในระดับใกล้เคียงกับ **{general_tier}** → _{detail_general_tier}_
-        """
-    return markdown_text
+@st.cache_resource
+def start_snapshot_watcher():
+    """
+    เริ่ม SnapshotWatcher หนึ่งตัวต่อ process (ใช้ร่วมกันทุก session)
+    การสร้างรายงานล่วงหน้าถูกส่งต่อให้ thread แยกหนึ่ง thread (watcher ไม่ต้องรอจนสร้างเสร็จ)
+    """
+    on_snapshot = None
+    if WARM_REPORTS:
+        warm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-reports")
+
+        def on_snapshot(level, month, version):
+            warm_executor.submit(warm_student_reports, level, month, version)
 
+    return data_store.SnapshotWatcher(on_snapshot=on_snapshot).start()
 
 
-# Zoning
+def get_ingestion_problems(level, month):
+    """ปัญหาที่ SnapshotWatcher พบตอนแปลงไฟล์ export ของระดับชั้น/เดือนนี้ครั้งล่าสุด (รายการว่างถ้าไม่มี)"""
+    if not BACKGROUND_INGESTION:
+        return []
+    return start_snapshot_watcher().errors.get(data_store.export_path(level, month).name, [])
 
-# ฟังก์ชันเดิมที่ปรับปรุงเล็กน้อย (สำหรับใครที่ยังต้องการใช้)
-def plot_classroom_cluster(df):
-    """Interactive Scatter Plot (Plotly) แสดง STEM vs Language พร้อม Zoning และ Cluster ถ้ามี"""
-    
-    cluster_df = prepare_data_for_analysis(df)
-
-    cluster_colors = {
-        'Very High': "#00ff2f",
-        'High': "#8e44ad",
-        'Medium': "#f1c40f",
-        'Low': "#5dade2",
-        'Very Low': "#c0392b"
-    }
-
-    zones = [
-        (0, 50, 0, 50, "Warning Zone", "#f9ebea"),
-        (0, 50, 50, 80, "STEM Support", "#fef9e7"),
-        (0, 50, 80, 100, "Language Expert", "#eafaf1"),
-        (50, 80, 0, 50, "Language Support", "#fef5e7"),
-        (50, 80, 50, 80, "Development Zone", "#e8f8f5"),
-        (80, 100, 0, 50, "STEM Expert", "#f4ecf7"),
-        (80, 100, 50, 80, "STEM Strong", "#e8daef"),
-        (50, 80, 80, 100, "Language Strong", "#eaf2f8"),
-        (80, 100, 80, 100, "Perfect Zone", "#d4efdf")
-    ]
-
-    fig = go.Figure()
-
-    # วาด zoning พื้นหลัง
-    for xmin, xmax, ymin, ymax, label, color in zones:
-        fig.add_shape(
-            type="rect",
-            x0=xmin, x1=xmax,
-            y0=ymin, y1=ymax,
-            fillcolor=color,
-            opacity=0.3,
-            line_width=0
-        )
-        fig.add_annotation(
-            x=(xmin + xmax)/2,
-            y=(ymin + ymax)/2,
-            text=label,
-            showarrow=False,
-            font=dict(size=10, color="black")
-        )
 
-    # ตรวจสอบว่ามี column CLUSTER และมีค่าไม่ใช่ NaN หรือไม่
-    use_cluster = 'CLUSTER' in cluster_df.columns and cluster_df['CLUSTER'].notna().sum() > 0
-
-    if use_cluster:
-        # วาดตาม cluster
-        for cluster, group in cluster_df.groupby('CLUSTER'):
-            fig.add_trace(go.Scatter(
-                x=group['STEM_AVG'],
-                y=group['LANGUAGE_AVG'],
-                mode='markers',
-                name=cluster,
-                marker=dict(
-                    size=20,
-                    color=cluster_colors.get(cluster, "#888888"),
-                    symbol='diamond',
-                    line=dict(width=1, color='white')
-                ),
-                text=group.get('STUDENT_NAME', None),
-                hoverinfo='text+x+y'
-            ))
+def render_ingestion_problems(level, month, problems, has_snapshot):
+    """แจ้งว่าไฟล์ export ไม่ผ่านการตรวจ พร้อมรายการปัญหา (แทนข้อความกำลังเตรียมข้อมูลที่ไม่มีวันเสร็จ)"""
+    details = "\n".join(f"- {problem}" for problem in problems)
+    if has_snapshot:
+        st.warning(f"⚠️ ไฟล์ export ใหม่ของระดับชั้น {level} เดือน {month} ใช้ไม่ได้ ยังแสดงข้อมูลเวอร์ชันเดิม\n\n{details}")
     else:
-        # ไม่มี cluster — วาดแบบปกติ
-        fig.add_trace(go.Scatter(
-            x=cluster_df['STEM_AVG'],
-            y=cluster_df['LANGUAGE_AVG'],
-            mode='markers',
-            name="Students",
-            marker=dict(
-                color='red',
-                size=20,
-                symbol='diamond',
-                line=dict(width=1, color='white')
-            ),
-            text=cluster_df.get('STUDENT_NAME', None),
-            hoverinfo='text+x+y'
-        ))
-
-    # เส้นแบ่ง
-    fig.add_shape(type="line", x0=50, x1=50, y0=0, y1=100,
-                  line=dict(color="red", dash="dash", width=1))
-    fig.add_shape(type="line", x0=80, x1=80, y0=0, y1=100,
-                  line=dict(color="gray", dash="dot", width=1))
-    fig.add_shape(type="line", x0=0, x1=100, y0=50, y1=50,
-                  line=dict(color="red", dash="dash", width=1))
-    fig.add_shape(type="line", x0=0, x1=100, y0=80, y1=80,
-                  line=dict(color="gray", dash="dot", width=1))
-    fig.add_shape(type="line", x0=0, x1=100, y0=0, y1=100,
-                  line=dict(color="gray", dash="dot", width=1))
-
-    fig.update_layout(
-        title='Student Performance by Zone' + (" and Cluster" if use_cluster else ""),
-        xaxis=dict(title='STEM Average (Math + Science)', range=[0, 100]),
-        yaxis=dict(title='Language Average (English + Thai)', range=[0, 100]),
-        plot_bgcolor='white',
-        legend_title='Cluster' if use_cluster else 'Students',
-        height=700
-    )
+        st.error(f"❌ ไฟล์ export ของระดับชั้น {level} เดือน {month} ใช้ไม่ได้ กรุณาตรวจไฟล์แล้วบันทึกใหม่\n\n{details}")
+
+
+def get_history_version(level):
+    """เวอร์ชันของข้อมูลย้อนหลังระดับชั้น สำหรับใช้เป็น cache key (อัปเดตเดือนใหม่ถ้าไม่มี watcher)"""
+    try:
+        if BACKGROUND_INGESTION:
+            return data_store.read_history_index(level)["version"]
+        return data_store.update_history(level)["version"]
+    except Exception:
+        return None
 
-    # ปิด interaction
-    fig.update_layout(dragmode=False)
 
-    return fig
+def get_snapshot_version(level, month):
+    """
+    คืนเวอร์ชันของ snapshot ที่ใช้งานอยู่
+    ถ้ามี watcher จะไม่แปลงไฟล์ระหว่าง request เลย คืน None จนกว่า watcher จะสร้างและตรวจ snapshot เสร็จ
+    """
+    file_path = data_store.export_path(level, month)
+    if not file_path.exists():
+        return None
+    try:
+        if BACKGROUND_INGESTION:
+            manifest = data_store.current_snapshot(file_path)
+        else:
+            manifest = data_store.ensure_snapshot(file_path)
+        return None if manifest is None else manifest["version"]
+    except Exception:
+        # ให้ load_data_by_level เป็นผู้แจ้งข้อผิดพลาด
+        return None
+
+
+# โลโก้ที่ย่อขนาดแล้ว (static/bd-logo.png สร้างจาก bd-logo.png กว้าง 1600px) เสิร์ฟผ่าน static file ของ Streamlit
+LOGO_HTML = '<img src="app/static/bd-logo.png" alt="Bewdar Academy" style="width:100%;max-width:1600px">'
 
 
 # Main Streamlit App
 def main():
     # Header
-    st.image("bd-logo.png", width=2000)  # ใส่ชื่อไฟล์และกำหนดขนาด
+    # โลโก้ย่อขนาดไว้แล้วใน static/ ให้ browser โหลดและ cache เอง (ไม่ต้องอ่านและย่อภาพทุก rerun)
+    st.markdown(LOGO_HTML, unsafe_allow_html=True)
     st.title("Bewdar Academy Lamphun: Student Growth Profile")
     
     # โหลดข้อมูลจากทุกระดับชั้น
-    @st.cache_data
-    def load_data_by_level(levels, sheet_name, month):
+    # snapshot_version อยู่ใน key เพื่อให้ cache หมดอายุเมื่อไฟล์ export เปลี่ยน
+    # ทุกอย่างที่คำนวณต่อ snapshot (DataFrame, ดัชนี, แบบจำลอง, ตารางสรุป) เก็บใน FrameCache ของ process เดียวกัน
+    # (จำกัดขนาดรวม, ลบระดับชั้นที่ไม่ได้ใช้นานที่สุดก่อน) ไม่มีฟังก์ชันไหนแก้ไขค่าที่โหลดมา
+    def load_data_by_level(levels, sheet_name, month, snapshot_version=None):
+        def load():
+            instrumentation.record_cache_miss("load_data_by_level")
+            get_level_prefetcher().wait(levels, month, snapshot_version)
+            # DataFrame ที่เตรียมแล้วใช้ร่วมกันทุก process ผ่าน shared_cache (key รวม snapshot_version)
+            return shared_cache.cached_frame(
+                "frame",
+                (levels, sheet_name, month, snapshot_version),
+                lambda: read_level_sheet(levels, sheet_name, month, refresh=not BACKGROUND_INGESTION),
+            )
+
         try:
-            # หาตำแหน่งไฟล์ที่แน่นอน
-            current_dir = Path(__file__).parent
-            file_path = current_dir / "mock_data" / f"export_all_outputs_{levels}_{month}.xlsx"
-            
-            # Debug: แสดงข้อมูล path
-            # st.write(f"Current directory: {current_dir}")
-            # st.write(f"Looking for file at: {file_path}")
-            # st.write(f"File exists: {file_path.exists()}")
-            
-            if not file_path.exists():
-                st.error(f"❌ ไม่พบไฟล์: {file_path}")
-                return pd.DataFrame()
-                
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            df["LEVEL"] = sheet_name
-            return df
-            
+            return get_frame_cache().get_or_load((levels, "frame", month, snapshot_version, sheet_name), load)
+
+        except FileNotFoundError as e:
+            st.error(f"❌ ไม่พบไฟล์: {e.filename}")
+            return pd.DataFrame()
+
+        except data_store.SnapshotNotReady:
+            # main แจ้งผู้ใช้แล้วว่ากำลังเตรียมข้อมูล
+            return pd.DataFrame()
+
         except Exception as e:
             st.error(f"❌ เกิดข้อผิดพลาด: {str(e)}")
             st.error(f"❌ ระดับชั้น {levels} ยังไม่พร้อมสำหรับการประเมินผล")
             return pd.DataFrame()
 
+    # นับ cache hit/miss เมื่อเปิดการวัดเวลา (instrumentation)
+    load_data_by_level = instrumentation.track_cache("load_data_by_level", load_data_by_level)
+
+    # ดัชนีนักเรียนสร้างครั้งเดียวต่อ snapshot และใช้ร่วมกันทุก session (อ่านอย่างเดียว)
+    def load_student_index(levels, sheet_name, month, snapshot_version=None):
+        return get_frame_cache().get_or_load(
+            (levels, "student_index", month, snapshot_version, sheet_name),
+            lambda: data_store.StudentIndex(load_data_by_level(levels, sheet_name, month, snapshot_version)),
+        )
+
+    # สรุปจำนวนนักเรียนและคะแนนเฉลี่ยแต่ละพื้นที่ของทั้งระดับชั้น
+    def load_zone_statistics(levels, sheet_name, month, snapshot_version=None):
+        return get_frame_cache().get_or_load(
+            (levels, "zone_statistics", month, snapshot_version, sheet_name),
+            lambda: analytics.zone_statistics(load_data_by_level(levels, sheet_name, month, snapshot_version)),
+        )
+
+    # ดัชนีนักเรียนจำลองที่ใกล้ที่สุดต่อห้องเรียน (บันทึกไว้คู่กับ snapshot ด้วย)
+    def load_neighbor_index(levels, sheet_name, month, snapshot_version=None):
+        def load():
+            df = load_data_by_level(levels, sheet_name, month, snapshot_version)
+            return analytics.load_neighbor_index(data_store.export_path(levels, month), sheet_name, df)
+
+        return get_frame_cache().get_or_load((levels, "neighbor_index", month, snapshot_version, sheet_name), load)
+
+    # แบบจำลองเวลาเรียน -> คะแนน สร้างครั้งเดียวต่อ snapshot (ใช้ดัชนี TIER ของนักเรียนจำลองชุดเดียวกับตารางสรุป)
+    def load_study_time_model(levels, month, snapshot_version=None):
+        def load():
+            df_our_students = load_data_by_level(levels, "OurStudent_" + levels, month, snapshot_version)
+            neighbor_index = load_neighbor_index(levels, "Analysis_" + levels, month, snapshot_version)
+            return analytics.StudyTimeModel(df_our_students, neighbor_index, version=snapshot_version)
+
+        return get_frame_cache().get_or_load((levels, "study_time_model", month, snapshot_version), load)
+
+    # ข้อมูลย้อนหลังทุกเดือนของนักเรียนหนึ่งคน (อ่านเฉพาะแถวของนักเรียนจากดัชนี)
+    def load_student_history(levels, student_alias, history_version=None):
+        return get_frame_cache().get_or_load(
+            (levels, "history", student_alias, history_version),
+            lambda: data_store.read_student_history(levels, student_alias),
+        )
+
+    # ล้าง cache ของ snapshot เวอร์ชันที่ถูกแทนที่แล้ว (เฉพาะระดับชั้น/เดือนที่เปลี่ยน)
+    if BACKGROUND_INGESTION:
+        for level, month, old_version, _ in start_snapshot_watcher().pop_retired():
+            get_level_prefetcher().discard(level, month, old_version)
+            get_frame_cache().discard_snapshot(level, month, old_version)
+            report_builder.discard_base_figures((level, month, old_version))
+
+    # ภาพรวมทั้งระดับชั้น คำนวณครั้งเดียวต่อ snapshot
+    def load_cohort_statistics(levels, month, snapshot_version=None):
+        def load():
+            df = load_data_by_level(levels, "Analysis_" + levels, month, snapshot_version)
+            df_our_students = load_data_by_level(levels, "OurStudent_" + levels, month, snapshot_version)
+            return analytics.cohort_statistics(df, df_our_students)
+
+        return get_frame_cache().get_or_load((levels, "cohort_statistics", month, snapshot_version), load)
+
+    # ห้องเรียนจำลองที่ดีที่สุดของนักเรียนจริงทุกคน (ตารางสรุปทั้งระดับชั้นสร้างครั้งเดียว ไม่วนทีละคน)
+    def load_student_summary(levels, month, snapshot_version=None):
+        def load():
+            df = load_data_by_level(levels, "Analysis_" + levels, month, snapshot_version)
+            neighbor_index = load_neighbor_index(levels, "Analysis_" + levels, month, snapshot_version)
+            return summarize_level_summary_table(create_level_summary_table(df, neighbor_index=neighbor_index))
+
+        return get_frame_cache().get_or_load((levels, "student_summary", month, snapshot_version), load)
+
     # รายการระดับชั้นที่มี
     levels = ["Primary1", "Primary2", "Primary3", "Primary4", "Primary5", "Primary6"]
-    evaluate_month = ["JULY"]
 
     # Sidebar Input
+    instrumentation.section("load")
     with st.sidebar:
         st.header("🔍 Student Information")
+        selected_view = st.radio("📄 มุมมอง", options=["รายบุคคล", "ภาพรวมระดับชั้น"], horizontal=True)
         st.markdown("กรุณาเลือกระดับชั้นและชื่อนักเรียน")
 
         selected_level = st.selectbox("🏫 ระดับชั้น", options=[""] + levels)
+        # เดือนที่มีไฟล์ export ของระดับชั้นนี้ (ถ้ายังไม่มีไฟล์ ให้เลือก JULY เพื่อแสดงข้อความแจ้งว่าไม่พบไฟล์)
+        evaluate_month = (data_store.available_months(selected_level) if selected_level else []) or ["JULY"]
+        # ระหว่างที่ผู้ใช้เลือกเดือน/นักเรียน โหลดทุกเดือนของระดับชั้นนี้ และระดับชั้นข้างเคียงไว้ล่วงหน้าใน shared_cache
+        # (ส่งงานครั้งเดียวต่อเวอร์ชันของ snapshot ไม่ใช่ทุก rerun)
+        if selected_level and shared_cache.get_cache() is not None:
+            prefetcher = get_level_prefetcher()
+            level_position = levels.index(selected_level)
+            for prefetch_level_name in levels[max(level_position - 1, 0):level_position + 2]:
+                months = evaluate_month if prefetch_level_name == selected_level else data_store.available_months(prefetch_level_name)
+                for month in months:
+                    version = get_snapshot_version(prefetch_level_name, month)
+                    if version is not None:
+                        prefetcher.submit(prefetch_level_name, month, version)
         selected_month = st.selectbox("⏱️ เดือนที่ประเมินผล", options=[""] + evaluate_month)
 
         if selected_level and selected_month:
             load_analysis_sheet_name = "Analysis_" + selected_level
             load_analysis_our_students_name = "OurStudent_" + selected_level
 
-            df = load_data_by_level(selected_level, load_analysis_sheet_name, selected_month)
-            df_our_students = load_data_by_level(selected_level, load_analysis_our_students_name, selected_month)
-
+            snapshot_version = get_snapshot_version(selected_level, selected_month)
+            ingestion_problems = get_ingestion_problems(selected_level, selected_month)
+            if ingestion_problems:
+                render_ingestion_problems(selected_level, selected_month, ingestion_problems, snapshot_version is not None)
+            elif snapshot_version is None and BACKGROUND_INGESTION and data_store.export_path(selected_level, selected_month).exists():
+                st.info(f"⏳ กำลังเตรียมข้อมูลระดับชั้น {selected_level} เดือน {selected_month} กรุณาลองใหม่อีกครั้งในอีกสักครู่")
+            df = load_data_by_level(selected_level, load_analysis_sheet_name, selected_month, snapshot_version)
+            df_our_students = load_data_by_level(selected_level, load_analysis_our_students_name, selected_month, snapshot_version)
+            student_index = load_student_index(selected_level, load_analysis_sheet_name, selected_month, snapshot_version)
+            our_student_index = load_student_index(selected_level, load_analysis_our_students_name, selected_month, snapshot_version)
+            snapshot_key = (selected_level, selected_month, snapshot_version)
+            # เดือนของไฟล์ export (selected_month อาจถูกแทนด้วยเดือนที่ประเมินของนักเรียนด้านล่าง)
+            export_month = selected_month
 
             if df.empty:
-                st.warning("⚠️ ไม่พบข้อมูลในระดับนี้")
+                # snapshot_version เป็น None: load_data_by_level แจ้งแล้ว (ไม่พบไฟล์ / กำลังเตรียมข้อมูล / ผิดพลาด)
+                if snapshot_version is not None:
+                    st.warning("⚠️ ไม่พบข้อมูลในระดับนี้")
+            elif selected_view == "ภาพรวมระดับชั้น":
+                st.info(f"📚 ระดับชั้น: {selected_level}")
             else:
-                available_aliases = df['ALIAS'].unique()
-                real_students = [alias for alias in available_aliases if not alias.startswith('Sim')]
+                real_students = student_index.real_aliases
 
                 student_alias = st.selectbox(
                     "🎓 Student Name (ALIAS)",
@@ -625,7 +582,7 @@ def main():
                 )
 
                 if student_alias:
-                    available_months = sorted(df[df['ALIAS'] == student_alias]['MONTH'].unique())
+                    available_months = student_index.months_for(student_alias)
                     selected_month = st.selectbox(
                         "📅 Assessment Month",
                         options=available_months,
@@ -633,7 +590,7 @@ def main():
                     )
 
                     if selected_month:
-                        student_info = df[(df['ALIAS'] == student_alias) & (df['MONTH'] == selected_month)]
+                        student_info = select_student_rows(df, student_alias, selected_month, student_index)
                         if not student_info.empty:
                             st.success(f"✅ พบข้อมูลของ {student_alias} ในเดือน {selected_month}")
                             st.info(f"📚 ระดับชั้น: {selected_level}")
@@ -646,61 +603,84 @@ def main():
         
     
     # Main content
+    instrumentation.set_context(
+        view=selected_view,
+        level=selected_level,
+        month=selected_month,
+        student=locals().get('student_alias'),
+    )
+    instrumentation.record_stats("frame_cache", get_frame_cache().stats())
+    if selected_view == "ภาพรวมระดับชั้น" and selected_level and selected_month and not df.empty:
+        instrumentation.section("cohort")
+        cohort_stats = load_cohort_statistics(selected_level, selected_month, snapshot_version)
+        student_summary = load_student_summary(selected_level, selected_month, snapshot_version)
+        render_cohort_dashboard(cohort_stats, selected_level, selected_month, student_summary)
+        return
+
     if 'student_alias' in locals() and student_alias and 'selected_month' in locals() and selected_month:
-        student_data = df[(df['ALIAS'] == student_alias) & (df['MONTH'] == selected_month)]
-        student_data_in_class = df_our_students[(df_our_students['ALIAS'] == student_alias) & (df_our_students['MONTH'] == selected_month)]
+        student_data = select_student_rows(df, student_alias, selected_month, student_index)
+        student_data_in_class = select_student_rows(df_our_students, student_alias, selected_month, our_student_index)
         
         if len(student_data) == 0:
             st.error("❌ ไม่พบข้อมูลสำหรับนักเรียนและเดือนที่เลือก")
             return
+
+        # รายงานที่สร้างไว้ล่วงหน้าหลัง ingest (ถ้ายังไม่มี จะสร้างแต่ละส่วนตามปกติ)
+        report = get_cached_student_report(
+            selected_level, export_month, snapshot_version, student_alias, selected_month,
+            lambda classroom_type, classroom_name: get_classroom_base_figure(
+                snapshot_key, classroom_type, classroom_name, df, student_index
+            ),
+        )
         
         # Section 1: Overview
+        instrumentation.section("overview")
         st.markdown("---")
         st.header("📊 สรุปผลคะแนนและเวลาเรียนทั้งหมด")
         
         col1, col2, col3 = st.columns(3)
         
-        prepared_data = prepare_data_for_analysis(student_data)
-        avg_overall = prepared_data['OVERALL_AVG'].mean()
-        avg_stem = prepared_data['STEM_AVG'].mean()
-        avg_language = prepared_data['LANGUAGE_AVG'].mean()
-
-        math_learning_period = student_data['MATH_TIME_HR'].unique()[0] * 60
-        science_learning_period = student_data['SCIENCE_TIME_HR'].unique()[0] * 60
-        english_learning_period = student_data['ENGLISH_TIME_HR'].unique()[0] * 60
-        thai_learning_period = student_data['THAI_TIME_HR'].unique()[0] * 60 
-
-        math_learning_topic = student_data['MATH_TOPICS'].unique()[0]
-        science_learning_topic = student_data['SCIENCE_TOPICS'].unique()[0]
-        english_learning_topic = student_data['ENGLISH_TOPICS'].unique()[0]
-        thai_learning_topic = student_data['THAI_TOPICS'].unique()[0]
-        
+        overview = report['overview'] if report is not None else create_overview_metrics(student_data)
+
         with col1:
-            st.metric("คะแนนเฉลี่ยรวม", f"{avg_overall:.1f}", help="คะแนนเฉลี่ยทุกวิชาในทุกสภาพแวดล้อมห้องเรียน")
+            st.metric("คะแนนเฉลี่ยรวม", f"{overview['avg_overall']:.1f}", help="คะแนนเฉลี่ยทุกวิชาในทุกสภาพแวดล้อมห้องเรียน")
         with col2:
-            st.metric("คะแนนเฉลี่ย STEM", f"{avg_stem:.1f}", help="คะแนนเฉลี่ยวิชาคณิตศาสตร์และวิทยาศาสตร์")
+            st.metric("คะแนนเฉลี่ย STEM", f"{overview['avg_stem']:.1f}", help="คะแนนเฉลี่ยวิชาคณิตศาสตร์และวิทยาศาสตร์")
         with col3:
-            st.metric("คะแนนเฉลี่ยภาษา", f"{avg_language:.1f}", help="คะแนนเฉลี่ยวิชาภาษาอังกฤษและภาษาไทย")
+            st.metric("คะแนนเฉลี่ยภาษา", f"{overview['avg_language']:.1f}", help="คะแนนเฉลี่ยวิชาภาษาอังกฤษและภาษาไทย")
         
         st.markdown("---")
 
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.write(f"ทดสอบเรื่อง {math_learning_topic}")
-            st.metric("เวลาเรียน ", f"{math_learning_period:.1f} นาที", help="เวลาเรียนวิชาคณิตศาสตร์(นาที)")
-        with col2:
-            st.write(f"ทดสอบเรื่อง {science_learning_topic}")
-            st.metric("เวลาเรียน ", f"{science_learning_period:.1f} นาที", help="เวลาเรียนวิทยาศาสตร์(นาที)")
-        with col3:
-            st.write(f"ทดสอบเรื่อง {english_learning_topic}")
-            st.metric("เวลาเรียน ", f"{english_learning_period:.1f} นาที", help="เวลาเรียนภาษาอังกฤษ(นาที)")
-        with col4:
-            st.write(f"ทดสอบเรื่อง {thai_learning_topic}")
-            st.metric("เวลาเรียน ", f"{thai_learning_period:.1f} นาที", help="เวลาเรียนภาษาไทย(นาที)")
+        for col, (subject, subject_name) in zip(st.columns(4), OVERVIEW_SUBJECTS):
+            with col:
+                st.write(f"ทดสอบเรื่อง {overview['subjects'][subject]['topic']}")
+                st.metric("เวลาเรียน ", f"{overview['subjects'][subject]['minutes']:.1f} นาที", help=f"เวลาเรียน{subject_name}(นาที)")
         
         st.markdown("---")
 
+        # Section 1.1: Growth trajectory
+        instrumentation.section("growth")
+        history = load_student_history(selected_level, student_alias, get_history_version(selected_level))
+        st.subheader("📈 พัฒนาการตามช่วงเวลา")
+        if history['PERIOD'].nunique() > 1:
+            instrumentation.plotly_chart(create_growth_trajectory_plot(history, student_alias), use_container_width=True)
+        else:
+            st.info("ℹ️ มีผลการประเมินเพียงเดือนเดียว กราฟพัฒนาการจะแสดงเมื่อมีผลการประเมินมากกว่าหนึ่งเดือน")
+
+        st.markdown("---")
+
+        # Section 1.2: What-if
+        instrumentation.section("what_if")
+        st.subheader("🔮 ถ้าปรับเวลาเรียน คะแนนจะเปลี่ยนไปอย่างไร")
+        if len(student_data_in_class) > 0:
+            render_what_if(load_study_time_model(selected_level, export_month, snapshot_version), student_data_in_class.iloc[0])
+        else:
+            st.info("ℹ️ ไม่พบข้อมูลเวลาเรียนของนักเรียนในห้องเรียนจริง")
+
+        st.markdown("---")
+
         # Section 2: Classroom Analysis
+        instrumentation.section("zoning")
         st.header("🧩 ผลการวิเคราะห์: Zoning analysis for Student development")
         
         # แสดงคำอธิบาย
@@ -753,13 +733,35 @@ def main():
                         - แผนพัฒนาขั้นต่อไป: พยายามประคับประคองให้รักษามาตรฐาน และจับตาดูอย่างใกล้ชิดถ้าหากน้องออกจากพื้นที่นี้ในอนาคต
                         - เป้าหมายต่อไป: เพิ่มเติมให้นักเรียนมีความสามารถด้านอื่นนอกจากด้านวิชาการ รวมถึงยกระดับด้านจิตใจให้อดทน ขยัน และมี winning mindset อยู่ตลอด""")
         
-        fig = plot_classroom_cluster(student_data_in_class)
-        st.plotly_chart(fig, use_container_width=True)
+        fig = report['zoning_figure'] if report is not None else plot_classroom_cluster(student_data_in_class)
+        instrumentation.plotly_chart(fig, use_container_width=True)
+
+        if len(student_data_in_class) > 0 and pd.notna(student_data_in_class['ZONE'].iloc[0]):
+            st.info(f"📍 นักเรียนอยู่ในพื้นที่ **{student_data_in_class['ZONE'].iloc[0]}**")
+
+        # การกระจายตัวของนักเรียนทั้งระดับชั้นในแต่ละพื้นที่ (สำหรับคุณครู)
+        with st.expander("🏫 ดูการกระจายตัวของนักเรียนทั้งระดับชั้นในแต่ละพื้นที่"):
+            zone_stats = load_zone_statistics(selected_level, load_analysis_our_students_name, export_month, snapshot_version)
+            st.dataframe(
+                zone_stats,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "ZONE": "Zone",
+                    "STUDENTS": st.column_config.NumberColumn("Students"),
+                    "SHARE": st.column_config.ProgressColumn("Share", format="percent", min_value=0, max_value=1),
+                    **{
+                        column: st.column_config.NumberColumn(column.replace("_", " ").title(), format="%.1f")
+                        for column in analytics.ZONE_STAT_COLUMNS
+                    },
+                },
+            )
 
         st.markdown("---")
 
         
         # Section 3: Simulation Analysis
+        instrumentation.section("simulation_tabs")
         st.header("🎯 ผลการวิเคราะห์: Simulations to Impact the Learning Environment") 
         with st.expander("🧭 ดูคำอธิบายการวิเคราะห์"):
             st.markdown("""**การวิเคราะห์นี้แสดงให้เห็นว่า นักเรียนมีผลการเรียนเป็นอย่างไรในสภาพแวดล้อมห้องเรียนที่แตกต่างกัน เมื่อเปรียบเทียบกับนักเรียนจำลองทั้งหมด 100 คน**
@@ -784,94 +786,39 @@ def main():
         # เพิ่มส่วนเลือกห้องเรียนสำหรับการแสดงผล
         st.markdown("### 📊 เลือกดูผลการเรียนในแต่ละห้องเรียน")
         
-        # สร้างปุ่มเลือกห้องเรียน
-        classroom_options = {
-            "🔬 STEM-Focused": "stem_focused",
-            "📚 Language-Focused": "language_focused", 
-            "⚖️ Balanced Mixed": "balanced_mixed",
-            "🏫 General": "general"
-        }
-        
-        # ใช้ tabs แทน columns เพื่อให้ดูง่ายบนมือถือ
-        tab1, tab2, tab3, tab4 = st.tabs(list(classroom_options.keys()))
-        
-        # แสดงกราฟแต่ละห้องเรียนใน tab แยก
-        with tab1:
-            st.markdown("#### 🔬 ห้องเรียน STEM-Focused")
-            st.markdown("**เน้นพัฒนาด้านการคิดวิเคราะห์และแก้ปัญหาจากการทดลอง**")
-            
-            # Subject comparison for STEM
-            subject_fig_stem = create_single_subject_comparison(df, student_alias, selected_month, "stem_focused", "STEM-Focused")
-            if subject_fig_stem:
-                st.plotly_chart(subject_fig_stem, use_container_width=True)
-            
-            # Scatter plot for STEM
-            scatter_fig_stem = create_single_scatter_plot(df, student_alias, "stem_focused", "STEM-Focused")
-            if scatter_fig_stem:
-                st.plotly_chart(scatter_fig_stem, use_container_width=True)
-                
-        with tab2:
-            st.markdown("#### 📚 ห้องเรียน Language-Focused")
-            st.markdown("**เน้นพัฒนาด้านภาษาและการใช้เหตุผล**")
-            
-            # Subject comparison for Language
-            subject_fig_lang = create_single_subject_comparison(df, student_alias, selected_month, "language_focused", "Language-Focused")
-            if subject_fig_lang:
-                st.plotly_chart(subject_fig_lang, use_container_width=True)
-            
-            # Scatter plot for Language
-            scatter_fig_lang = create_single_scatter_plot(df, student_alias, "language_focused", "Language-Focused")
-            if scatter_fig_lang:
-                st.plotly_chart(scatter_fig_lang, use_container_width=True)
-                
-        with tab3:
-            st.markdown("#### ⚖️ ห้องเรียน Balanced Mixed")
-            st.markdown("**เน้นการบูรณาการความรู้จากหลายวิชา**")
-            
-            # Subject comparison for Balanced
-            subject_fig_balanced = create_single_subject_comparison(df, student_alias, selected_month, "balanced_mixed", "Balanced Mixed")
-            if subject_fig_balanced:
-                st.plotly_chart(subject_fig_balanced, use_container_width=True)
-            
-            # Scatter plot for Balanced
-            scatter_fig_balanced = create_single_scatter_plot(df, student_alias, "balanced_mixed", "Balanced Mixed")
-            if scatter_fig_balanced:
-                st.plotly_chart(scatter_fig_balanced, use_container_width=True)
-                
-        with tab4:
-            st.markdown("#### 🏫 ห้องเรียน General")
-            st.markdown("**ห้องเรียนตามมาตรฐาน (มีนักเรียนเรียนเก่ง, เรียนปานกลาง และ เรียนพอใช้ ปนกันไป)**")
-            
-            # Subject comparison for General
-            subject_fig_general = create_single_subject_comparison(df, student_alias, selected_month, "general", "General")
-            if subject_fig_general:
-                st.plotly_chart(subject_fig_general, use_container_width=True)
-            
-            # Scatter plot for General
-            scatter_fig_general = create_single_scatter_plot(df, student_alias, "general", "General")
-            if scatter_fig_general:
-                st.plotly_chart(scatter_fig_general, use_container_width=True)
+        render_classroom_tabs(df, student_alias, selected_month, student_index, snapshot_key, report)
 
         st.markdown("---")
 
         # แสดงตารางสรุปผลแบบเปรียบเทียบ
+        instrumentation.section("summary")
         st.markdown("### 📋 สรุปผลการเรียนในแต่ละห้องเรียน")
-        summary_df = create_summary_table(df, student_alias, selected_month)
+        if report is not None:
+            summary_df = report['summary_table']
+        else:
+            neighbor_index = load_neighbor_index(selected_level, load_analysis_sheet_name, export_month, snapshot_version)
+            summary_df = shared_cache.cached_frame(
+                "summary",
+                (selected_level, export_month, snapshot_version, student_alias, selected_month),
+                lambda: create_summary_table(df, student_alias, selected_month, student_index, neighbor_index),
+            )
         if summary_df is not None:
             st.dataframe(
                 summary_df,
                 use_container_width=True,
-                hide_index=True
+                hide_index=True,
+                column_config=SUMMARY_COLUMN_CONFIG
             )
 
         # สรุปผล simulation
-        summary_text = create_summarize_from_summary_table(summary_df)
+        summary_text = report['summary_text'] if report is not None else create_summarize_from_summary_table(summary_df)
         st.markdown(summary_text)
         
         
         st.markdown("---")
         
         # Section 4: Teacher's Assessment
+        instrumentation.section("teacher")
         st.header("👨‍🏫 การประเมินจากครูผู้สอน")
         st.markdown("""**ผลประเมินจากคุณครูเป็นการวิเคราะห์มุมมองที่มาจากมนุษย์ ซึ่งจะแตกต่างจากมุมมองของระบบประดิษฐ์ (AI)**
                     
@@ -880,21 +827,21 @@ def main():
         - มุมองของคุณครูจะเป็นการประเมินที่อาจจะมีความรู้สึกเข้ามาเกี่ยวข้อง
         """)
         
-        teacher_data = student_data.iloc[0]  # เอาแค่ row แรก
+        teacher_notes = report['teacher_notes'] if report is not None else create_teacher_notes(student_data)
         
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("✅ จุดแข็ง")
-            if pd.notna(teacher_data['GOOD_AT']):
-                st.success(teacher_data['GOOD_AT'])
+            if teacher_notes['GOOD_AT'] is not None:
+                st.success(teacher_notes['GOOD_AT'])
             else:
                 st.write("ไม่มีข้อมูลการประเมินเฉพาะ")
         
         with col2:
             st.subheader("📈 ด้านที่ควรพัฒนา")
-            if pd.notna(teacher_data['IMPROVE_ON']):
-                st.warning(teacher_data['IMPROVE_ON'])
+            if teacher_notes['IMPROVE_ON'] is not None:
+                st.warning(teacher_notes['IMPROVE_ON'])
             else:
                 st.write("ไม่มีข้อมูลการประเมินเฉพาะ")
 
@@ -932,4 +879,5 @@ def main():
                 """)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    instrumentation.run_profiled(main)
+    instrumentation.record_startup(SCRIPT_STARTED, IMPORTS_FINISHED)
\ No newline at end of file
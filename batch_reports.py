@@ -0,0 +1,298 @@
+"""
+สร้างรายงานของนักเรียนจริงทุกคนในระดับชั้น/เดือนที่เลือกเป็นไฟล์ static ครั้งเดียว (ไม่ต้องเปิด Streamlit)
+
+ตัวอย่าง:
+    python batch_reports.py --levels Primary2 Primary3 --month JULY --format html --workers 4
+"""
+import argparse
+import html
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import data_store
+import report_builder
+import shared_cache
+
+OUTPUT_DIR = Path(__file__).parent / "reports"
+REPORT_FORMATS = ["html", "png", "pdf"]
+# ตารางสรุปของทั้งระดับชั้น (หนึ่งแถวต่อนักเรียนต่อเดือน) ในโฟลเดอร์ของระดับชั้น
+LEVEL_SUMMARY_NAME = "summary.csv"
+
+# จำนวน process ที่หน้าเว็บใช้สร้างรายงานล่วงหน้า (ไม่ใช้ทุก CPU เพื่อไม่แย่งกับผู้ใช้)
+WARM_WORKERS = 2
+# ล็อกทั้งเครื่อง ให้สร้างรายงานล่วงหน้าได้ทีละที่ (replica หรือ CLI)
+WARM_LOCK_PATH = shared_cache.CACHE_PATH.parent / data_store.LOCK_DIR_NAME / "warm_reports.lock"
+# เครื่องหมายว่าสร้างรายงานของ (ระดับชั้น, เดือน, เวอร์ชัน) ครบแล้ว
+WARM_DONE_NAMESPACE = "warm_done"
+
+# ข้อมูลของระดับชั้นที่ worker แต่ละตัวได้รับครั้งเดียวตอนเริ่ม (ไม่ส่งซ้ำทุกงาน)
+_worker_level = None
+
+
+def _figures(report):
+    """รายการกราฟในรายงาน (ชื่อไฟล์, figure) ตามลำดับที่แสดงในหน้าเว็บ"""
+    figures = [("zoning", report["zoning_figure"])]
+    for classroom_type, classroom_figures in report["classroom_figures"].items():
+        for kind, fig in classroom_figures.items():
+            if fig is not None:
+                figures.append((f"{classroom_type}_{kind}", fig))
+    return figures
+
+
+def render_html(report, level):
+    """แปลงรายงานเป็นไฟล์ HTML หน้าเดียว (โหลด plotly.js จาก CDN ครั้งเดียว)"""
+    overview = report["overview"]
+    notes = report["teacher_notes"]
+
+    subject_rows = "".join(
+        f"<tr><td>{html.escape(subject_name)}</td>"
+        f"<td>{html.escape(str(overview['subjects'][subject]['topic']))}</td>"
+        f"<td>{overview['subjects'][subject]['minutes']:.1f} นาที</td></tr>"
+        for subject, subject_name in report_builder.OVERVIEW_SUBJECTS
+    )
+
+    figure_html = []
+    for position, (_, fig) in enumerate(_figures(report)):
+        figure_html.append(fig.to_html(full_html=False, include_plotlyjs="cdn" if position == 0 else False))
+
+    summary_table = ""
+    if report["summary_table"] is not None:
+        summary_table = report["summary_table"].to_html(index=False, border=0, classes="summary", float_format="{:.1f}".format)
+
+    zone = html.escape(str(report["zone"])) if report["zone"] is not None else "-"
+
+    return f"""<!DOCTYPE html>
+<html lang="th">
+<head>
+<meta charset="utf-8">
+<title>Student Growth Profile - {html.escape(report['alias'])}</title>
+<style>
+body {{ font-family: sans-serif; max-width: 1100px; margin: auto; padding: 16px; }}
+table {{ border-collapse: collapse; }}
+td, th {{ padding: 4px 10px; border-bottom: 1px solid #ddd; }}
+.summary-text {{ white-space: pre-line; }}
+</style>
+</head>
+<body>
+<h1>Bewdar Academy Lamphun: Student Growth Profile</h1>
+<p>🎓 {html.escape(report['alias'])} · 📚 {html.escape(level)} · 📅 {html.escape(str(report['month']))}</p>
+<h2>📊 สรุปผลคะแนนและเวลาเรียนทั้งหมด</h2>
+<table>
+<tr><td>คะแนนเฉลี่ยรวม</td><td>{overview['avg_overall']:.1f}</td></tr>
+<tr><td>คะแนนเฉลี่ย STEM</td><td>{overview['avg_stem']:.1f}</td></tr>
+<tr><td>คะแนนเฉลี่ยภาษา</td><td>{overview['avg_language']:.1f}</td></tr>
+</table>
+<table>{subject_rows}</table>
+<h2>🧩 Zoning analysis for Student development</h2>
+<p>📍 นักเรียนอยู่ในพื้นที่ <b>{zone}</b></p>
+{''.join(figure_html)}
+<h2>📋 สรุปผลการเรียนในแต่ละห้องเรียน</h2>
+{summary_table}
+<div class="summary-text">{html.escape(report['summary_text'].strip())}</div>
+<h2>👨‍🏫 การประเมินจากครูผู้สอน</h2>
+<p>✅ จุดแข็ง: {html.escape(notes['GOOD_AT'] or 'ไม่มีข้อมูลการประเมินเฉพาะ')}</p>
+<p>📈 ด้านที่ควรพัฒนา: {html.escape(notes['IMPROVE_ON'] or 'ไม่มีข้อมูลการประเมินเฉพาะ')}</p>
+</body>
+</html>
+"""
+
+
+def report_name(report):
+    return f"{report['alias']}_{report['month']}"
+
+
+def write_report(report, level, output_dir, report_format):
+    """บันทึกรายงานของนักเรียนหนึ่งคน คืนค่า path ที่บันทึก"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if report_format == "html":
+        path = output_dir / f"{report_name(report)}.html"
+        path.write_text(render_html(report, level), encoding="utf-8")
+        return path
+
+    # png / pdf: หนึ่งไฟล์ต่อกราฟ (ต้องติดตั้ง kaleido) พร้อมตารางสรุป (csv) และข้อความสรุป (markdown)
+    student_dir = output_dir / report_name(report)
+    student_dir.mkdir(parents=True, exist_ok=True)
+    for name, fig in _figures(report):
+        fig.write_image(student_dir / f"{name}.{report_format}")
+    if report["summary_table"] is not None:
+        report["summary_table"].to_csv(student_dir / "summary.csv", index=False)
+    (student_dir / "summary.md").write_text(report["summary_text"].strip(), encoding="utf-8")
+    return student_dir
+
+
+def _init_worker(level_data):
+    global _worker_level
+    _worker_level = level_data
+
+
+def _build_report(task):
+    level_data = _worker_level
+    student_alias, student_month = task
+    return report_builder.build_student_report(
+        level_data["df"],
+        level_data["df_our_students"],
+        student_alias,
+        student_month,
+        level_data["student_index"],
+        level_data["our_student_index"],
+        level_data["neighbor_index"],
+        level_data["snapshot_key"],
+        level_data["summary_tables"].get((str(student_alias), str(student_month))),
+    )
+
+
+def _render_student(task, output_dir, report_format):
+    report = _build_report(task)
+    if report is None:
+        return None
+    return write_report(report, _worker_level["level"], output_dir, report_format)
+
+
+def _with_level_summary(level_data):
+    """
+    เพิ่มตารางสรุปของนักเรียนจริงทุกคน (create_level_summary_table ครั้งเดียวต่อระดับชั้น)
+    worker แต่ละตัวใช้ตารางของนักเรียนจากชุดนี้แทนการสร้างทีละคน
+    """
+    level_summary = report_builder.create_level_summary_table(level_data["df"], neighbor_index=level_data["neighbor_index"])
+    return {
+        **level_data,
+        "level_summary": level_summary,
+        "summary_tables": report_builder.split_level_summary_table(level_summary),
+    }
+
+
+def render_level(level, month, output_dir=OUTPUT_DIR, report_format="html", workers=None):
+    """สร้างรายงานของนักเรียนจริงทุกคนในระดับชั้น คืนค่ารายการ path ที่สร้าง"""
+    level_data = _with_level_summary(report_builder.load_level(level, month))
+    # นักเรียนจริงทุกคน ทุกเดือนประเมินที่อยู่ในไฟล์ export นี้
+    student_index = level_data["student_index"]
+    tasks = [(alias, student_month) for alias in student_index.real_aliases for student_month in student_index.months_for(alias)]
+    level_output_dir = Path(output_dir) / level / month
+
+    if workers == 1 or len(tasks) <= 1:
+        _init_worker(level_data)
+        paths = [_render_student(task, level_output_dir, report_format) for task in tasks]
+    else:
+        # ส่งข้อมูลระดับชั้นให้ worker ครั้งเดียวผ่าน initializer
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(level_data,)) as executor:
+            paths = list(executor.map(
+                _render_student,
+                tasks,
+                [level_output_dir] * len(tasks),
+                [report_format] * len(tasks),
+            ))
+
+    paths = [path for path in paths if path is not None]
+    # ห้องเรียนจำลองที่ดีที่สุดและผลในห้องเรียน General ของทุกคนในไฟล์เดียว
+    level_output_dir.mkdir(parents=True, exist_ok=True)
+    report_builder.summarize_level_summary_table(level_data["level_summary"]).to_csv(
+        level_output_dir / LEVEL_SUMMARY_NAME, index=False
+    )
+    if report_format == "html":
+        _write_index(level_output_dir, level, month, paths)
+    return paths
+
+
+def _warm_student(task):
+    level_data = _worker_level
+    student_alias, student_month = task
+    report = _build_report(task)
+    if report is None:
+        return False
+    shared_cache.write_json(
+        report_builder.REPORT_CACHE_NAMESPACE,
+        report_builder.student_report_key(*level_data["snapshot_key"], student_alias, student_month),
+        report_builder.serialize_student_report(report),
+    )
+    return True
+
+
+def warm_level(level, month, workers=None):
+    """
+    สร้างรายงานของนักเรียนจริงทุกคนล่วงหน้าแล้วเก็บใน shared_cache (ข้ามคนที่มีอยู่แล้ว)
+    หน้าเว็บจะอ่านรายงานจาก cache แทนการสร้างใหม่ในครั้งแรกที่ผู้ปกครองเปิด คืนจำนวนรายงานที่สร้าง
+    ทำงานทีละที่ทั้งเครื่อง (WARM_LOCK_PATH) และข้ามทั้งระดับชั้นถ้าเวอร์ชันนี้ถูกสร้างครบแล้ว
+    """
+    if shared_cache.get_cache() is None:
+        # ไม่มีที่เก็บรายงาน
+        return 0
+
+    with data_store.file_lock(WARM_LOCK_PATH):
+        snapshot_version = data_store.ensure_snapshot(data_store.export_path(level, month))["version"]
+        if shared_cache.read_json(WARM_DONE_NAMESPACE, (level, month, snapshot_version)) is not None:
+            return 0
+
+        level_data = report_builder.load_level(level, month)
+        student_index = level_data["student_index"]
+        tasks = [
+            (alias, student_month)
+            for alias in student_index.real_aliases
+            for student_month in student_index.months_for(alias)
+            if shared_cache.read_json(
+                report_builder.REPORT_CACHE_NAMESPACE,
+                report_builder.student_report_key(*level_data["snapshot_key"], alias, student_month),
+            ) is None
+        ]
+        if tasks:
+            level_data = _with_level_summary(level_data)
+
+        if workers == 1 or len(tasks) <= 1:
+            _init_worker(level_data)
+            count = sum(_warm_student(task) for task in tasks)
+        else:
+            # spawn แทน fork เพราะอาจถูกเรียกจาก thread เบื้องหลังของ Streamlit
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(level_data,),
+            ) as executor:
+                count = sum(executor.map(_warm_student, tasks))
+
+        shared_cache.write_json(WARM_DONE_NAMESPACE, level_data["snapshot_key"], True)
+    return count
+
+
+def _write_index(level_output_dir, level, month, paths):
+    level_output_dir.mkdir(parents=True, exist_ok=True)
+    links = "".join(
+        f'<li><a href="{html.escape(path.name)}">{html.escape(path.stem)}</a></li>' for path in sorted(paths)
+    )
+    (level_output_dir / "index.html").write_text(
+        f'<!DOCTYPE html><html lang="th"><head><meta charset="utf-8"><title>{html.escape(level)} {html.escape(month)}</title></head>'
+        f"<body><h1>{html.escape(level)} · {html.escape(month)}</h1>"
+        f'<p><a href="{LEVEL_SUMMARY_NAME}">ตารางสรุปทั้งระดับชั้น (CSV)</a></p><ul>{links}</ul></body></html>',
+        encoding="utf-8",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="สร้างรายงานนักเรียนทั้งระดับชั้นแบบ batch")
+    parser.add_argument("--levels", nargs="+", default=["Primary1", "Primary2", "Primary3", "Primary4", "Primary5", "Primary6"])
+    parser.add_argument("--month", default="JULY")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="html")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--warm", action="store_true", help="สร้างรายงานเก็บใน cache ของหน้าเว็บแทนการเขียนไฟล์")
+    args = parser.parse_args()
+
+    for level in args.levels:
+        started = time.perf_counter()
+        try:
+            if args.warm:
+                count = warm_level(level, args.month, args.workers)
+            else:
+                count = len(render_level(level, args.month, args.output_dir, args.format, args.workers))
+        except FileNotFoundError as e:
+            print(f"{level}: ข้าม (ไม่พบไฟล์ {e.filename})")
+            continue
+        print(f"{level}: {count} รายงาน ({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+วัดเวลาของแต่ละขั้นตอนในการโหลดข้อมูลและสร้างกราฟ (ไม่ต้องเปิด Streamlit หรือ browser)
+โดยสร้างไฟล์ export จำลองที่มีนักเรียนจำลอง (Sim) มากกว่าข้อมูลจริง 10x / 100x (ค่าเริ่มต้น)
+scale ที่ใหญ่กว่านี้ (เช่น 1000) ใช้เวลาสร้างไฟล์ .xlsx นานมาก ให้ระบุเองเมื่อต้องการ
+
+ตัวอย่าง:
+    python benchmark.py
+    python benchmark.py --scales 10 100 1000
+    python benchmark.py --scales 10 --repeat 3
+
+ผลลัพธ์ถูกเพิ่มต่อท้ายไฟล์ (JSON หนึ่งบรรทัดต่อหนึ่ง scale) และเทียบกับผลครั้งก่อนของ scale เดียวกัน
+"""
+import argparse
+import json
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import analytics
+import data_store
+import report_builder
+
+BENCHMARK_DIR = Path(__file__).parent / "reports" / "benchmarks"
+RESULTS_PATH = BENCHMARK_DIR / "results.jsonl"
+TEMPLATE_LEVEL = "Primary6"
+TEMPLATE_MONTH = "JULY"
+
+# ห้องเรียนที่ใช้วัดเวลาสร้าง scatter plot
+BENCHMARK_CLASSROOM = ("stem_focused", "STEM-Focused")
+
+
+def build_synthetic_export(scale, output_dir, seed=0, template_dir=data_store.DEFAULT_DATA_DIR):
+    """
+    สร้างไฟล์ export จำลองจากไฟล์ของ TEMPLATE_LEVEL โดยคูณจำนวนนักเรียนจำลองด้วย scale
+    คะแนนของนักเรียนจำลองที่เพิ่มขึ้นถูกสุ่มเลื่อนเล็กน้อยจากของเดิม (นักเรียนจริงเหมือนเดิม)
+    คืน path ของไฟล์ (สร้างครั้งเดียว ครั้งต่อไปใช้ไฟล์เดิม)
+    """
+    source_path = data_store.export_path(TEMPLATE_LEVEL, TEMPLATE_MONTH, template_dir)
+    target_path = synthetic_export_path(scale, output_dir)
+    if target_path.exists():
+        return target_path
+
+    rng = np.random.default_rng(seed)
+    sheets = pd.read_excel(source_path, sheet_name=None)
+    analysis_sheet = "Analysis_" + TEMPLATE_LEVEL
+    analysis = sheets[analysis_sheet]
+    is_simulated = analysis["ALIAS"].astype(str).str.startswith("Sim")
+    simulated = analysis[is_simulated]
+
+    copies = []
+    for copy_number in range(scale):
+        copy = simulated.copy()
+        if copy_number > 0:
+            copy["ALIAS"] = copy["ALIAS"].astype(str) + f"_{copy_number}"
+            for column in data_store.SCORE_COLUMNS:
+                jitter = rng.normal(0, 5, len(copy))
+                copy[column] = np.clip(np.round(copy[column] + jitter), 0, 100)
+        copies.append(copy)
+    sheets[analysis_sheet] = pd.concat([analysis[~is_simulated]] + copies, ignore_index=True)
+
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target_path.with_suffix(".tmp.xlsx")
+    with pd.ExcelWriter(tmp_path) as writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    tmp_path.replace(target_path)
+    return target_path
+
+
+def synthetic_export_path(scale, output_dir):
+    return data_store.export_path(TEMPLATE_LEVEL, TEMPLATE_MONTH, Path(output_dir) / f"x{scale}")
+
+
+def _timed(timings, stage, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    timings[stage] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def run_stages(source_path, snapshot_dir, history_dir):
+    """วัดเวลาแต่ละขั้นตอนกับไฟล์ export หนึ่งไฟล์ คืนค่า (timings, sizes)"""
+    timings = {}
+    sizes = {}
+    analysis_sheet = "Analysis_" + TEMPLATE_LEVEL
+    our_student_sheet = "OurStudent_" + TEMPLATE_LEVEL
+    classroom_type, classroom_name = BENCHMARK_CLASSROOM
+
+    # parse: แปลง .xlsx เป็น snapshot (สิ่งที่เกิดเมื่อ load_data_by_level เจอไฟล์ใหม่)
+    _timed(timings, "parse", data_store.build_snapshot, source_path, snapshot_dir)
+    df = _timed(timings, "load_snapshot", data_store.read_snapshot_sheet, source_path, analysis_sheet, snapshot_dir)
+    sizes["rows"] = len(df)
+
+    # enrich: คอลัมน์ที่คำนวณแล้ว และพื้นที่ (Zoning)
+    df = _timed(timings, "enrich", lambda frame: analytics.add_zone_column(data_store.enrich_frame(frame)), df)
+
+    # filter: ดัชนีนักเรียน และตารางสรุปของนักเรียนจริงหนึ่งคน
+    student_index = _timed(timings, "student_index", data_store.StudentIndex, df)
+    student_alias = student_index.real_aliases[0]
+    student_month = student_index.months_for(student_alias)[0]
+    _timed(timings, "summary_table", report_builder.create_summary_table, df, student_alias, student_month, student_index)
+
+    # figure build + serialization
+    scatter = _timed(
+        timings, "scatter_figure", report_builder.create_single_scatter_plot,
+        df, student_alias, classroom_type, classroom_name, student_index,
+    )
+    # กราฟ Zoning ใช้เฉพาะแถวของนักเรียนใน sheet OurStudent (เหมือน build_student_report) ไม่ใช่ทั้ง sheet Analysis
+    clusters = data_store.ensure_clusters(source_path, snapshot_dir, history_dir)
+    our_students = data_store.apply_clusters(
+        data_store.read_snapshot_sheet(source_path, our_student_sheet, snapshot_dir), clusters
+    )
+    our_students = analytics.add_zone_column(data_store.enrich_frame(our_students))
+    our_student_index = data_store.StudentIndex(our_students)
+    student_data_in_class = report_builder.select_student_rows(our_students, student_alias, student_month, our_student_index)
+    cluster = _timed(timings, "cluster_figure", report_builder.plot_classroom_cluster, student_data_in_class)
+    for name, fig in [("scatter", scatter), ("cluster", cluster)]:
+        payload = _timed(timings, f"{name}_to_json", fig.to_json)
+        sizes[f"{name}_json_bytes"] = len(payload.encode("utf-8"))
+
+    return timings, sizes
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _previous_results(results_path):
+    previous = {}
+    if results_path.exists():
+        for line in results_path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                record = json.loads(line)
+                previous[record["scale"]] = record
+    return previous
+
+
+def run_benchmark(scales, repeat=1, benchmark_dir=BENCHMARK_DIR, results_path=RESULTS_PATH):
+    """วัดทุก scale (ใช้ค่าที่น้อยที่สุดจาก repeat รอบ) บันทึกผลต่อท้าย results_path และคืนรายการผล"""
+    benchmark_dir = Path(benchmark_dir)
+    results_path = Path(results_path)
+    previous = _previous_results(results_path)
+    commit = _git_commit()
+    records = []
+
+    for scale in scales:
+        source_path = build_synthetic_export(scale, benchmark_dir / "data")
+        runs = [
+            run_stages(source_path, benchmark_dir / "snapshots" / f"x{scale}", benchmark_dir / "history" / f"x{scale}")
+            for _ in range(repeat)
+        ]
+        timings = {stage: min(run[0][stage] for run in runs) for stage in runs[0][0]}
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit,
+            "scale": scale,
+            "repeat": repeat,
+            "timings": timings,
+            "sizes": runs[0][1],
+        }
+        records.append(record)
+        _print_record(record, previous.get(scale))
+
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return records
+
+
+def _print_record(record, previous):
+    print(f"scale {record['scale']}x ({record['sizes']['rows']} แถว)")
+    for stage, seconds in record["timings"].items():
+        change = ""
+        if previous is not None and stage in previous["timings"] and previous["timings"][stage] > 0:
+            ratio = seconds / previous["timings"][stage]
+            change = f"  ({ratio:.2f}x เทียบกับ {previous['commit'] or 'ครั้งก่อน'})"
+        print(f"  {stage:<18}{seconds * 1000:>10.1f} ms{change}")
+    for name, size in record["sizes"].items():
+        if name.endswith("_bytes"):
+            print(f"  {name:<18}{size / 1024:>10.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="วัดเวลาการโหลดข้อมูลและสร้างกราฟด้วยข้อมูลจำลองขนาดต่างๆ")
+    parser.add_argument("--scales", nargs="+", type=int, default=[10, 100])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    args = parser.parse_args()
+    run_benchmark(args.scales, args.repeat, results_path=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1065 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# ตำแหน่งไฟล์ข้อมูล export และ snapshot ที่แปลงแล้ว (เปลี่ยนได้ด้วย BEWDAR_DATA_DIR เช่น ตอนทดสอบด้วยข้อมูลจำลอง)
+DEFAULT_DATA_DIR = Path(__file__).parent / "mock_data"
+DATA_DIR = Path(os.environ.get("BEWDAR_DATA_DIR") or DEFAULT_DATA_DIR)
+SNAPSHOT_DIR = DATA_DIR / ".snapshots"
+HISTORY_DIR = DATA_DIR / ".history"
+MANIFEST_NAME = "manifest.json"
+LOCK_DIR_NAME = ".locks"
+HISTORY_INDEX_NAME = "index.json"
+
+# คอลัมน์ที่มีค่าซ้ำกันมาก เก็บเป็น categorical เพื่อลดขนาดและเร่งการกรอง
+CATEGORICAL_COLUMNS = ["ALIAS", "CLASSROOM_TYPE", "TIER", "MONTH"]
+# คอลัมน์ข้อความอื่นที่มีค่าต่างกันไม่เกินสัดส่วนนี้ของจำนวนแถว จะถูกเก็บเป็น categorical ด้วย
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+SCORE_COLUMNS = ["MATH", "SCIENCE", "ENGLISH", "THAI"]
+
+# เดือนตามปฏิทิน
+MONTH_ORDER = [
+    "JANUARY", "FEBRUARY", "MARCH", "APRIL", "MAY", "JUNE",
+    "JULY", "AUGUST", "SEPTEMBER", "OCTOBER", "NOVEMBER", "DECEMBER",
+]
+# ปีการศึกษาเริ่มเดือนพฤษภาคม ใช้ลำดับนี้เรียงข้อมูลตามช่วงเวลา (MAY ... APRIL)
+SCHOOL_YEAR_START_MONTH = "MAY"
+SCHOOL_MONTH_ORDER = (
+    MONTH_ORDER[MONTH_ORDER.index(SCHOOL_YEAR_START_MONTH):] + MONTH_ORDER[:MONTH_ORDER.index(SCHOOL_YEAR_START_MONTH)]
+)
+
+# คอลัมน์ที่ enrich_frame เพิ่มให้ตอนโหลดข้อมูล
+DERIVED_COLUMNS = ["IS_SIMULATED", "STUDENT_CATEGORY", "STEM_AVG", "LANGUAGE_AVG", "OVERALL_AVG"]
+
+
+# schema ของ sheet ในไฟล์ export (ตามคำนำหน้าชื่อ sheet)
+# columns: คอลัมน์ -> dtype ที่ใช้อ่าน, required: คอลัมน์ที่ต้องมี, categories: ค่าที่อนุญาต
+# คอลัมน์อื่นนอกจากนี้ไม่ถูกอ่าน (เช่น คอลัมน์ที่คำนวณไว้แล้วใน sheet ซึ่ง enrich_frame คำนวณใหม่)
+# SCHEMA_VERSION เป็นส่วนหนึ่งของเวอร์ชัน snapshot (cache ทุกชั้นหมดอายุเมื่อเปลี่ยน)
+# 2: snapshot ของ OurStudent มีผลการจัดกลุ่ม (CLUSTER) ที่คำนวณตอน ingest
+# 3: snapshot เก็บ dtype ที่ลดขนาดแล้ว (compact_frame) ผู้อ่านไม่ต้องแปลงซ้ำ
+SCHEMA_VERSION = 3
+
+_STUDENT_COLUMNS = {
+    "LEVEL": "str",
+    "ALIAS": "str",
+    "MATH": "float64",
+    "SCIENCE": "float64",
+    "ENGLISH": "float64",
+    "THAI": "float64",
+    "MONTH": "str",
+    "MATH_TIME_HR": "float64",
+    "SCIENCE_TIME_HR": "float64",
+    "ENGLISH_TIME_HR": "float64",
+    "THAI_TIME_HR": "float64",
+    "MATH_TOPICS": "str",
+    "SCIENCE_TOPICS": "str",
+    "ENGLISH_TOPICS": "str",
+    "THAI_TOPICS": "str",
+    "GOOD_AT": "str",
+    "IMPROVE_ON": "str",
+}
+
+EXPORT_SCHEMA = {
+    "Analysis_": {
+        "columns": {
+            **_STUDENT_COLUMNS,
+            "CLASSROOM_TYPE": "str",
+            "TALENT_SCORE": "float64",
+            "TIER": "str",
+            "RANK": "Int64",
+        },
+        "required": ["ALIAS", "CLASSROOM_TYPE", *SCORE_COLUMNS, "MONTH", "TIER", "RANK"],
+        "categories": {
+            "CLASSROOM_TYPE": ["stem_focused", "language_focused", "balanced_mixed", "general"],
+            "TIER": ["Diamond", "Platinum", "Gold", "Silver", "Bronze"],
+        },
+    },
+    "OurStudent_": {
+        "columns": {
+            **_STUDENT_COLUMNS,
+            "CLUSTER": "str",
+            "CLUSTER_ORIGINAL": "Int64",
+        },
+        "required": [
+            "ALIAS", *SCORE_COLUMNS, "MONTH",
+            "MATH_TIME_HR", "SCIENCE_TIME_HR", "ENGLISH_TIME_HR", "THAI_TIME_HR",
+            "MATH_TOPICS", "SCIENCE_TOPICS", "ENGLISH_TOPICS", "THAI_TOPICS",
+            "GOOD_AT", "IMPROVE_ON",
+        ],
+        "categories": {},
+    },
+}
+
+
+class SnapshotValidationError(ValueError):
+    """
+    ไฟล์ export ไม่ผ่านการตรวจ (schema หรือ validator) snapshot เดิมไม่ถูกแทนที่
+    problems เป็นรายการปัญหาทั้งหมดของไฟล์ (รายงานการตรวจหนึ่งชุดต่อไฟล์)
+    """
+
+    def __init__(self, source_name, problems):
+        self.source_name = source_name
+        self.problems = list(problems)
+        super().__init__(f"{source_name} ไม่ผ่านการตรวจ:\n- " + "\n- ".join(self.problems))
+
+
+def sheet_schema(sheet_name):
+    """schema ของ sheet ตามคำนำหน้าชื่อ (None ถ้าไม่มี schema)"""
+    for prefix, schema in EXPORT_SCHEMA.items():
+        if str(sheet_name).startswith(prefix):
+            return schema
+    return None
+
+
+def read_export_sheets(source_path):
+    """
+    เปิดไฟล์ export ครั้งเดียวแล้วอ่านทุก sheet
+    sheet ที่มี schema อ่านเฉพาะคอลัมน์ใน schema ด้วย dtype ที่กำหนด
+    คืนค่า (sheets, problems) โดย problems เป็นรายการปัญหาที่พบ (ว่างถ้าถูกต้อง)
+    """
+    sheets = {}
+    problems = []
+    with pd.ExcelFile(source_path) as workbook:
+        for sheet_name in workbook.sheet_names:
+            schema = sheet_schema(sheet_name)
+            if schema is None:
+                sheets[sheet_name] = workbook.parse(sheet_name)
+                continue
+
+            columns = schema["columns"]
+            try:
+                df = workbook.parse(sheet_name, usecols=lambda column: column in columns, dtype=columns)
+            except (TypeError, ValueError):
+                # แปลง dtype ไม่ได้ อ่านใหม่แบบไม่กำหนด dtype เพื่อหาว่าคอลัมน์ไหนผิด
+                df = workbook.parse(sheet_name, usecols=lambda column: column in columns)
+                for column, dtype in columns.items():
+                    if column in df.columns:
+                        try:
+                            df[column].astype(dtype)
+                        except (TypeError, ValueError):
+                            problems.append(f"{sheet_name}: คอลัมน์ {column} ไม่ใช่ชนิด {dtype}")
+
+            problems.extend(f"{sheet_name}: {problem}" for problem in validate_sheet(df, schema))
+            sheets[sheet_name] = df
+
+    return sheets, problems
+
+
+def validate_sheet(df, schema):
+    """ตรวจ DataFrame ตาม schema คืนรายการปัญหาที่พบ"""
+    problems = []
+    missing = [column for column in schema["required"] if column not in df.columns]
+    if missing:
+        problems.append("ไม่พบคอลัมน์ " + ", ".join(missing))
+
+    if "ALIAS" in df.columns and df["ALIAS"].isna().any():
+        problems.append(f"ALIAS ว่าง {int(df['ALIAS'].isna().sum())} แถว")
+
+    for column, allowed in schema["categories"].items():
+        if column not in df.columns:
+            continue
+        unknown = sorted(set(df[column].dropna().astype(str)) - set(allowed))
+        if unknown:
+            problems.append(f"{column} มีค่าที่ไม่รู้จัก: " + ", ".join(unknown))
+
+    return problems
+
+
+def export_path(level, month, data_dir=DATA_DIR):
+    """คืน path ของไฟล์ export ตามระดับชั้นและเดือน"""
+    return Path(data_dir) / f"export_all_outputs_{level}_{month}.xlsx"
+
+
+def parse_export_name(source_path):
+    """แยกระดับชั้นและเดือนจากชื่อไฟล์ export คืนค่า (level, month) หรือ None ถ้าชื่อไม่ตรงรูปแบบ"""
+    parts = Path(source_path).stem.split("_")
+    if len(parts) < 5 or parts[:3] != ["export", "all", "outputs"]:
+        return None
+    return "_".join(parts[3:-1]), parts[-1]
+
+
+def month_sort_key(month):
+    # เรียงตามปีการศึกษา (เริ่ม MAY) เดือนที่ไม่รู้จักไปอยู่ท้ายสุด
+    month = str(month).upper()
+    return (SCHOOL_MONTH_ORDER.index(month) if month in SCHOOL_MONTH_ORDER else len(SCHOOL_MONTH_ORDER), month)
+
+
+def export_year(month, mtime_ns):
+    """
+    ปี (ค.ศ.) ของไฟล์ export เดือน month โดยดูจากเวลาที่ไฟล์ถูกแก้ไข
+    ไฟล์ถูกสร้างในหรือหลังเดือนนั้นเสมอ ถ้าเดือนของไฟล์อยู่หลังเดือนที่แก้ไขไฟล์ แปลว่าเป็นเดือนของปีก่อน
+    """
+    modified = datetime.fromtimestamp(mtime_ns / 1e9)
+    month = str(month).upper()
+    if month not in MONTH_ORDER:
+        return modified.year
+    return modified.year if MONTH_ORDER.index(month) + 1 <= modified.month else modified.year - 1
+
+
+def school_year(year, month):
+    """ปีการศึกษา (ค.ศ. ของเดือนพฤษภาคมที่เริ่มปี) ของเดือน month ในปี year"""
+    month = str(month).upper()
+    if month in MONTH_ORDER and MONTH_ORDER.index(month) < MONTH_ORDER.index(SCHOOL_YEAR_START_MONTH):
+        return year - 1
+    return year
+
+
+def available_months(level, data_dir=DATA_DIR):
+    """เดือนที่มีไฟล์ export ของระดับชั้นนี้ (เรียงตามปีการศึกษา)"""
+    months = []
+    for source_path in Path(data_dir).glob(f"export_all_outputs_{level}_*.xlsx"):
+        parsed = parse_export_name(source_path)
+        if parsed is not None and parsed[0] == level:
+            months.append(parsed[1])
+    return sorted(months, key=month_sort_key)
+
+
+def _snapshot_path(source_path, snapshot_dir=SNAPSHOT_DIR):
+    # symlink ที่ชี้ไปยังโฟลเดอร์ของ snapshot รุ่นปัจจุบัน (<ชื่อไฟล์>.<รหัส>)
+    return Path(snapshot_dir) / Path(source_path).stem
+
+
+@contextmanager
+def file_lock(lock_path, blocking=True):
+    """
+    ล็อกแบบ fcntl.flock ที่กันกันได้ทั้งระหว่าง thread และระหว่าง process บนเครื่องเดียวกัน
+    blocking=False จะไม่รอ ถ้ามีผู้อื่นถือล็อกอยู่จะได้ค่า False แทน True
+    """
+    lock_path = Path(lock_path)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _snapshot_lock(source_path, snapshot_dir=SNAPSHOT_DIR):
+    """ล็อกของไฟล์ export หนึ่งไฟล์ (ให้สร้าง snapshot ได้ทีละผู้สร้าง)"""
+    return file_lock(Path(snapshot_dir) / LOCK_DIR_NAME / f"{Path(source_path).stem}.lock")
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(snapshot_path):
+    try:
+        with open(snapshot_path / MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(snapshot_path, manifest):
+    # เขียนไฟล์ชั่วคราวก่อนแล้วค่อย replace เพื่อไม่ให้ manifest เสียครึ่งทาง
+    tmp_path = snapshot_path / (MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, snapshot_path / MANIFEST_NAME)
+
+
+def compact_frame(df, columns=None, max_unique_ratio=CATEGORY_MAX_UNIQUE_RATIO):
+    """
+    ลดขนาด DataFrame (แก้ไข df ที่ส่งเข้ามาโดยตรง)
+    - ทศนิยม (คะแนน, เวลาเรียน) เป็น float32
+    - CATEGORICAL_COLUMNS และข้อความที่ซ้ำกันมาก (เช่น TOPICS, GOOD_AT, IMPROVE_ON) เป็น categorical
+    ใช้ตอนสร้าง snapshot และ partition ของข้อมูลย้อนหลัง columns: เฉพาะคอลัมน์เหล่านี้ (เช่น คอลัมน์ที่คำนวณเพิ่มหลังอ่าน)
+    """
+    for column in df.columns if columns is None else columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_float_dtype(series.dtype):
+            if series.dtype != np.float32:
+                df[column] = series.astype(np.float32)
+        elif column in CATEGORICAL_COLUMNS:
+            df[column] = series.astype("category")
+        elif pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+            if series.nunique(dropna=True) <= max(1, len(series) * max_unique_ratio):
+                df[column] = series.astype("category")
+    return df
+
+
+def _swap_snapshot(snapshot_path, new_path):
+    """
+    ชี้ snapshot ไปยังโฟลเดอร์ใหม่ด้วยการ replace symlink ครั้งเดียว (ผู้อ่านเห็นรุ่นเดิมหรือรุ่นใหม่เสมอ ไม่มีช่วงที่ไม่มี snapshot)
+    เก็บโฟลเดอร์รุ่นก่อนหน้าไว้หนึ่งรุ่นให้ผู้ที่กำลังอ่านอยู่อ่านจนเสร็จ แล้วลบรุ่นที่เก่ากว่านั้น
+    """
+    previous = os.readlink(snapshot_path) if snapshot_path.is_symlink() else None
+    link_path = snapshot_path.with_name(new_path.name + ".link")
+    os.symlink(new_path.name, link_path)
+    if snapshot_path.is_dir() and not snapshot_path.is_symlink():
+        # snapshot แบบเดิมที่เป็นโฟลเดอร์จริง ย้ายออกก่อน (replace ทับโฟลเดอร์ด้วย symlink ไม่ได้)
+        os.replace(snapshot_path, snapshot_path.with_name(new_path.name + ".old"))
+    os.replace(link_path, snapshot_path)
+
+    keep = {new_path.name, previous}
+    for path in snapshot_path.parent.glob(snapshot_path.name + ".*"):
+        if path.name not in keep and path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _build_snapshot(source_path, snapshot_dir, validator):
+    # ผู้เรียกต้องถือ _snapshot_lock ของไฟล์นี้อยู่
+    snapshot_path = _snapshot_path(source_path, snapshot_dir)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+
+    stat = source_path.stat()
+    sha256 = _file_sha256(source_path)
+
+    # เปิดไฟล์ excel ครั้งเดียวแล้วอ่านทุก sheet ตาม schema
+    sheets, problems = read_export_sheets(source_path)
+    if problems:
+        raise SnapshotValidationError(source_path.name, problems)
+    if validator is not None:
+        validator(source_path, sheets)
+
+    # เขียนลงโฟลเดอร์ใหม่ก่อน แล้วสลับ symlink เข้าที่ทีเดียว
+    tmp_path = Path(tempfile.mkdtemp(prefix=snapshot_path.name + ".", dir=snapshot_path.parent))
+    os.chmod(tmp_path, 0o755)
+    try:
+        for sheet_name, df in sheets.items():
+            df = compact_frame(df)
+            # ไม่บีบอัด เพื่อให้อ่านแบบ memory-map ได้
+            feather.write_feather(df, tmp_path / f"{sheet_name}.arrow", compression="uncompressed")
+
+        parsed = parse_export_name(source_path)
+        manifest = {
+            "source": source_path.name,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            # ปีของไฟล์ export กำหนดครั้งเดียวตอนเนื้อหาเปลี่ยน (copy ไฟล์เดิมทับภายหลังไม่ทำให้ปีเปลี่ยน)
+            "year": export_year(parsed[1], stat.st_mtime_ns) if parsed is not None else None,
+            "sha256": sha256,
+            "version": hashlib.sha256(f"{sha256}:{SCHEMA_VERSION}".encode("utf-8")).hexdigest()[:12],
+            "schema": SCHEMA_VERSION,
+            "sheets": list(sheets.keys()),
+        }
+        _write_manifest(tmp_path, manifest)
+        _swap_snapshot(snapshot_path, tmp_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    return manifest
+
+
+def build_snapshot(source_path, snapshot_dir=SNAPSHOT_DIR, validator=None):
+    """
+    แปลงไฟล์ export .xlsx ทั้งไฟล์ (ทุก sheet) เป็น Arrow IPC (Feather) หนึ่งไฟล์ต่อ sheet
+    validator(source_path, sheets) จะถูกเรียกก่อนบันทึก ถ้า raise ออกมา snapshot เดิมจะไม่ถูกแทนที่
+    สร้างได้ทีละผู้สร้างต่อไฟล์ export (ล็อกไฟล์ ใช้ได้ข้าม process) คืนค่า manifest ของ snapshot ที่สร้างขึ้น
+    """
+    source_path = Path(source_path)
+    with _snapshot_lock(source_path, snapshot_dir):
+        return _build_snapshot(source_path, snapshot_dir, validator)
+
+
+def _fresh_manifest(manifest, stat):
+    return (
+        manifest is not None
+        and manifest.get("schema") == SCHEMA_VERSION
+        and manifest["mtime_ns"] == stat.st_mtime_ns
+        and manifest["size"] == stat.st_size
+    )
+
+
+def ensure_snapshot(source_path, snapshot_dir=SNAPSHOT_DIR, validator=None):
+    """
+    ตรวจว่า snapshot ยังตรงกับไฟล์ต้นฉบับหรือไม่ (ดูจาก mtime/size ก่อน แล้วค่อยดู hash)
+    สร้างใหม่เฉพาะเมื่อไฟล์ต้นฉบับเปลี่ยนจริง และคืนค่า manifest ปัจจุบัน
+    ถ้าต้องสร้างใหม่ จะตรวจ manifest ซ้ำหลังได้ล็อก (ผู้สร้างอื่นอาจสร้างเสร็จไปแล้วระหว่างรอ)
+    """
+    source_path = Path(source_path)
+    snapshot_path = _snapshot_path(source_path, snapshot_dir)
+    manifest = _read_manifest(snapshot_path)
+    if _fresh_manifest(manifest, source_path.stat()):
+        return manifest
+
+    with _snapshot_lock(source_path, snapshot_dir):
+        manifest = _read_manifest(snapshot_path)
+        stat = source_path.stat()
+        if _fresh_manifest(manifest, stat):
+            return manifest
+
+        # mtime เปลี่ยนแต่เนื้อหาอาจเหมือนเดิม (เช่น copy ไฟล์ทับ) ให้เทียบ hash ก่อนแปลงใหม่
+        if (
+            manifest is not None
+            and manifest.get("schema") == SCHEMA_VERSION
+            and manifest["sha256"] == _file_sha256(source_path)
+        ):
+            manifest["mtime_ns"] = stat.st_mtime_ns
+            manifest["size"] = stat.st_size
+            _write_manifest(snapshot_path, manifest)
+            return manifest
+
+        return _build_snapshot(source_path, snapshot_dir, validator)
+
+
+def current_snapshot(source_path, snapshot_dir=SNAPSHOT_DIR):
+    """manifest ของ snapshot ที่ใช้งานอยู่ (ไม่ตรวจไฟล์ต้นฉบับ) หรือ None ถ้ายังไม่เคยสร้าง"""
+    return _read_manifest(_snapshot_path(source_path, snapshot_dir))
+
+
+class SnapshotNotReady(Exception):
+    """ยังไม่มี snapshot ของไฟล์ export (รอ SnapshotWatcher แปลงและตรวจไฟล์ให้เสร็จก่อน)"""
+
+
+def read_snapshot_sheet(source_path, sheet_name, snapshot_dir=SNAPSHOT_DIR):
+    """อ่าน sheet จาก snapshot แบบ memory-map"""
+    snapshot_path = _snapshot_path(source_path, snapshot_dir)
+    sheet_path = snapshot_path / f"{sheet_name}.arrow"
+    if not sheet_path.exists():
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+    table = feather.read_table(sheet_path, memory_map=True)
+    return table.to_pandas()
+
+
+def snapshot_artifact_path(source_path, name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    path ของไฟล์ที่คำนวณต่อจาก snapshot (เช่น ดัชนี, โมเดล)
+    เก็บในโฟลเดอร์เดียวกับ snapshot จึงถูกลบไปพร้อมกันเมื่อ snapshot ถูกสร้างใหม่
+    """
+    return _snapshot_path(source_path, snapshot_dir) / name
+
+
+def write_snapshot_artifact(artifact_path, writer):
+    """
+    เรียก writer(path) ให้เขียนลงไฟล์ชั่วคราว แล้วสลับเข้าที่ทีเดียว (worker อื่นไม่เห็นไฟล์ที่เขียนไม่เสร็จ)
+    คืนค่า True ถ้าบันทึกสำเร็จ
+    """
+    artifact_path = Path(artifact_path)
+    tmp_path = artifact_path.with_name(f"{artifact_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, artifact_path)
+        return True
+    except OSError:
+        # snapshot อาจถูกสร้างใหม่ระหว่างเขียน ข้ามการบันทึกไปก่อน
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return False
+
+
+def is_enriched(df):
+    """ตรวจว่า DataFrame มีคอลัมน์ที่คำนวณจาก enrich_frame ครบแล้วหรือไม่"""
+    return all(column in df.columns for column in DERIVED_COLUMNS)
+
+
+def enrich_frame(df):
+    """
+    เพิ่มคอลัมน์ที่คำนวณจากคะแนน (IS_SIMULATED, STUDENT_CATEGORY, STEM_AVG, LANGUAGE_AVG, OVERALL_AVG)
+    ทำครั้งเดียวตอนโหลดข้อมูล และเก็บเป็น dtype ขนาดเล็ก (float32 / category)
+    แก้ไข df ที่ส่งเข้ามาโดยตรง
+    """
+    if "ALIAS" in df.columns:
+        df["IS_SIMULATED"] = df["ALIAS"].astype("string").str.startswith("Sim").fillna(False).astype(bool)
+        df["STUDENT_CATEGORY"] = pd.Categorical(
+            np.where(df["IS_SIMULATED"], "Simulated", "Real"), categories=["Simulated", "Real"]
+        )
+
+    if all(column in df.columns for column in SCORE_COLUMNS):
+        math, science = df["MATH"].to_numpy(np.float32), df["SCIENCE"].to_numpy(np.float32)
+        english, thai = df["ENGLISH"].to_numpy(np.float32), df["THAI"].to_numpy(np.float32)
+        df["STEM_AVG"] = (math + science) / 2
+        df["LANGUAGE_AVG"] = (english + thai) / 2
+        df["OVERALL_AVG"] = (math + science + english + thai) / 4
+
+    return df
+
+
+def _index_key(value):
+    # NaN (เช่น MONTH ของนักเรียนจำลอง) ใช้ None เป็น key แทน
+    return None if pd.isna(value) else value
+
+
+class StudentIndex:
+    """
+    ดัชนีตำแหน่งแถวของ DataFrame ตาม (ALIAS, MONTH, CLASSROOM_TYPE)
+    สร้างครั้งเดียวต่อการโหลดข้อมูล แล้วค้นหาแถวของนักเรียนได้แบบ O(1) แทนการกรองทั้งตาราง
+    ตำแหน่งที่คืนให้ใช้กับ df.iloc ของ DataFrame ที่ใช้สร้างดัชนีเท่านั้น
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self._rows = {}
+        self._student_rows = {}
+        self._alias_rows = {}
+        self._classroom_rows = {}
+        self._months = {}
+        self.sim_aliases = []
+        self.real_aliases = []
+        if "ALIAS" not in df.columns:
+            return
+
+        aliases = pd.unique(df["ALIAS"].dropna())
+        self.sim_aliases = [alias for alias in aliases if str(alias).startswith("Sim")]
+        self.real_aliases = [alias for alias in aliases if not str(alias).startswith("Sim")]
+        sim_set = set(self.sim_aliases)
+
+        group_columns = ["ALIAS", "MONTH"]
+        if "CLASSROOM_TYPE" in df.columns:
+            group_columns.append("CLASSROOM_TYPE")
+        groups = df.groupby(group_columns, dropna=False, observed=True, sort=False).indices
+
+        student_parts = {}
+        alias_parts = {}
+        classroom_parts = {}
+        for key, positions in groups.items():
+            alias, month = _index_key(key[0]), _index_key(key[1])
+            classroom_type = _index_key(key[2]) if len(key) > 2 else None
+            if alias is None:
+                continue
+
+            self._rows[(alias, month, classroom_type)] = positions
+            student_parts.setdefault((alias, month), []).append(positions)
+            alias_parts.setdefault((alias, None), []).append(positions)
+            if classroom_type is not None:
+                alias_parts.setdefault((alias, classroom_type), []).append(positions)
+            classroom_parts.setdefault((classroom_type, None), []).append(positions)
+            classroom_parts.setdefault((classroom_type, alias in sim_set), []).append(positions)
+            if month is not None:
+                self._months.setdefault(alias, set()).add(month)
+
+        self._student_rows = {key: _merge_positions(parts) for key, parts in student_parts.items()}
+        self._alias_rows = {key: _merge_positions(parts) for key, parts in alias_parts.items()}
+        self._classroom_rows = {key: _merge_positions(parts) for key, parts in classroom_parts.items()}
+        self._months = {alias: sorted(months) for alias, months in self._months.items()}
+
+    def rows(self, alias, month, classroom_type=None):
+        """ตำแหน่งแถวของนักเรียนในเดือนและห้องเรียนที่ระบุ"""
+        return self._rows.get((alias, month, classroom_type), _EMPTY_POSITIONS)
+
+    def student_rows(self, alias, month):
+        """ตำแหน่งแถวของนักเรียนในเดือนที่ระบุ (ทุกห้องเรียน)"""
+        return self._student_rows.get((alias, month), _EMPTY_POSITIONS)
+
+    def alias_rows(self, alias, classroom_type=None):
+        """ตำแหน่งแถวของนักเรียน (ทุกเดือน) จะระบุห้องเรียนด้วยก็ได้"""
+        return self._alias_rows.get((alias, classroom_type), _EMPTY_POSITIONS)
+
+    def classroom_rows(self, classroom_type, simulated=None):
+        """ตำแหน่งแถวของห้องเรียน เลือกเฉพาะนักเรียนจำลอง (True) หรือนักเรียนจริง (False) ได้"""
+        return self._classroom_rows.get((classroom_type, simulated), _EMPTY_POSITIONS)
+
+    def months_for(self, alias):
+        """รายการเดือนที่มีข้อมูลของนักเรียน (เรียงแล้ว)"""
+        return self._months.get(alias, [])
+
+
+_EMPTY_POSITIONS = np.empty(0, dtype=np.intp)
+
+
+def _merge_positions(parts):
+    if len(parts) == 1:
+        return parts[0]
+    return np.sort(np.concatenate(parts))
+
+
+# คอลัมน์ที่เก็บในข้อมูลย้อนหลังของนักเรียนจริง (เฉพาะที่มีในไฟล์)
+# YEAR คือปี (ค.ศ.) ของเดือนที่ประเมิน (MONTH) คิดจากปีของไฟล์ export
+HISTORY_COLUMNS = [
+    "ALIAS", "EXPORT_YEAR", "EXPORT_MONTH", "YEAR", "MONTH",
+    "MATH", "SCIENCE", "ENGLISH", "THAI",
+    "STEM_AVG", "LANGUAGE_AVG", "OVERALL_AVG",
+    "MATH_TIME_HR", "SCIENCE_TIME_HR", "ENGLISH_TIME_HR", "THAI_TIME_HR",
+]
+# เปลี่ยนเมื่อรูปแบบดัชนีเปลี่ยน (ดัชนีรูปแบบเก่าจะถูกสร้างใหม่ทั้งหมด)
+# 2: partition ตาม (ปี, เดือน) และบันทึกเวอร์ชันไว้ในไฟล์ partition ให้ผู้อ่านตรวจได้
+HISTORY_INDEX_FORMAT = 2
+# metadata ในไฟล์ partition ที่บอกเวอร์ชันของ snapshot ที่ใช้สร้าง
+PARTITION_VERSION_KEY = b"bewdar.partition_version"
+
+
+def _history_path(level, history_dir=HISTORY_DIR):
+    return Path(history_dir) / level
+
+
+def _history_lock(level, history_dir=HISTORY_DIR):
+    """ล็อกของข้อมูลย้อนหลังระดับชั้น (เขียน partition และดัชนีทีละผู้เขียน)"""
+    return file_lock(Path(history_dir) / LOCK_DIR_NAME / f"{level}.lock")
+
+
+def history_partition(year, month):
+    """ชื่อ partition ของไฟล์ export เดือน month ปี year เช่น 2025-JULY"""
+    return f"{year}-{month}"
+
+
+def read_history_index(level, history_dir=HISTORY_DIR):
+    """
+    ดัชนีของข้อมูลย้อนหลังระดับชั้น
+    partitions: partition (ปี-เดือนของไฟล์ export) -> {"version": เวอร์ชัน snapshot ที่ใช้สร้าง, "rows": จำนวนแถว}
+    students: ALIAS -> partition -> [แถวเริ่มต้น, จำนวนแถว] ใน partition นั้น
+    """
+    try:
+        with open(_history_path(level, history_dir) / HISTORY_INDEX_NAME, encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("format") == HISTORY_INDEX_FORMAT:
+            return index
+    except (OSError, ValueError):
+        pass
+    return {"format": HISTORY_INDEX_FORMAT, "level": level, "version": None, "partitions": {}, "students": {}}
+
+
+def _write_history_index(history_path, index):
+    index["version"] = hashlib.sha256(
+        json.dumps(index["partitions"], sort_keys=True).encode("utf-8")
+    ).hexdigest()[:12]
+    tmp_path = history_path / (HISTORY_INDEX_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, history_path / HISTORY_INDEX_NAME)
+
+
+def _assessment_years(months, export_year, export_month):
+    """ปีของเดือนที่ประเมิน: เดือนที่อยู่หลังเดือนของไฟล์ export (ตามปฏิทิน) เป็นของปีก่อน"""
+    export_position = MONTH_ORDER.index(export_month) if export_month in MONTH_ORDER else len(MONTH_ORDER)
+    positions = months.astype(str).str.upper().map(lambda month: MONTH_ORDER.index(month) if month in MONTH_ORDER else -1)
+    return np.where(positions > export_position, export_year - 1, export_year)
+
+
+def _write_partition(path, df, version):
+    table = pa.Table.from_pandas(compact_frame(df.copy()), preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), PARTITION_VERSION_KEY: version.encode("utf-8")})
+    feather.write_feather(table, path, compression="uncompressed")
+
+
+def append_history(level, month, df, version, history_dir=HISTORY_DIR, year=None):
+    """
+    เพิ่ม (หรือแทนที่) ข้อมูลของนักเรียนจริงในไฟล์ export เดือนนี้ (ปี year) เข้าไปในข้อมูลย้อนหลังของระดับชั้น
+    เก็บหนึ่งไฟล์ Arrow ต่อ (ปี, เดือน) เรียงตาม ALIAS แล้วบันทึกช่วงแถวของแต่ละคนไว้ในดัชนี
+    partition อื่นที่มีอยู่แล้วไม่ถูกอ่านหรือเขียนซ้ำ
+    เขียน partition และดัชนีภายใต้ล็อกของระดับชั้น และเขียนดัชนีเฉพาะเมื่อเขียน partition สำเร็จ
+    """
+    if year is None:
+        year = datetime.now().year
+    partition = history_partition(year, month)
+    history_path = _history_path(level, history_dir)
+    history_path.mkdir(parents=True, exist_ok=True)
+
+    if not is_enriched(df):
+        df = enrich_frame(df.copy())
+    real = df[~df["IS_SIMULATED"]].assign(EXPORT_YEAR=year, EXPORT_MONTH=month)
+    real["YEAR"] = _assessment_years(real["MONTH"], year, str(month).upper())
+    real = real[[column for column in HISTORY_COLUMNS if column in real.columns]]
+    real = real.astype({"ALIAS": str}).sort_values(["ALIAS", "YEAR", "MONTH"], kind="stable").reset_index(drop=True)
+
+    with _history_lock(level, history_dir):
+        index = read_history_index(level, history_dir)
+        written = write_snapshot_artifact(
+            history_path / f"{partition}.arrow", lambda path: _write_partition(path, real, version)
+        )
+        if not written:
+            # ไม่แก้ดัชนี ให้ดัชนียังชี้ไปยัง partition เดิม (ลองใหม่ครั้งถัดไป)
+            return index
+
+        # ลบช่วงแถวเดิมของ partition นี้ แล้วใส่ช่วงแถวใหม่
+        students = index["students"]
+        for partitions in students.values():
+            partitions.pop(partition, None)
+        for alias, positions in real.groupby("ALIAS", sort=False).indices.items():
+            students.setdefault(alias, {})[partition] = [int(positions[0]), len(positions)]
+        index["students"] = {alias: partitions for alias, partitions in students.items() if partitions}
+        index["partitions"][partition] = {"version": version, "rows": len(real)}
+
+        _write_history_index(history_path, index)
+    return index
+
+
+# ป้ายกลุ่มเรียงจากคะแนนเฉลี่ยของศูนย์กลางกลุ่มสูงไปต่ำ (ตรงกับสีใน plot_classroom_cluster)
+CLUSTER_LABELS = ["Very High", "High", "Medium", "Low", "Very Low"]
+CLUSTER_MODEL_NAME = "clusters.joblib"
+CLUSTER_BATCH_SIZE = 1024
+def _cluster_lock(level, history_dir=HISTORY_DIR):
+    """ล็อกของโมเดลจัดกลุ่มระดับชั้น (อ่าน ปรับ และบันทึก clusters.joblib ทีละผู้เขียน ทุก process)"""
+    return file_lock(Path(history_dir) / LOCK_DIR_NAME / f"{level}.clusters.lock")
+
+
+def read_cluster_model(level, history_dir=HISTORY_DIR):
+    """
+    โมเดลจัดกลุ่มของระดับชั้น (MiniBatchKMeans บนคะแนน 4 วิชา) ที่เรียนรู้สะสมทีละเดือน
+    months: partition ของเดือน (เช่น 2025-JULY) -> เวอร์ชัน snapshot ที่ใช้ปรับโมเดล
+    ถ้ายังไม่มีไฟล์ คืนค่าโมเดลว่าง ถ้าอ่านไฟล์ไม่ได้จะ raise (ไม่เริ่มโมเดลใหม่ทับของเดิม)
+    """
+    try:
+        return joblib.load(_history_path(level, history_dir) / CLUSTER_MODEL_NAME)
+    except FileNotFoundError:
+        return {"level": level, "model": None, "months": {}}
+
+
+def update_cluster_model(level, month, df, version, history_dir=HISTORY_DIR, year=None):
+    """
+    ปรับโมเดลจัดกลุ่มด้วยข้อมูลเดือนนี้ (partial_fit ทีละ CLUSTER_BATCH_SIZE แถว ไม่ fit ใหม่ทั้งหมด)
+    แต่ละเดือนใช้ปรับโมเดลครั้งเดียว ถ้าไฟล์ export ของเดือนเดิมเปลี่ยนจะไม่ partial_fit ซ้ำ
+    (ไม่ให้เดือนนั้นมีน้ำหนักเกินเดือนอื่น) ผู้เรียกต้องถือ _cluster_lock ไว้ คืนค่าโมเดลปัจจุบัน
+    """
+    partition = history_partition(year, month) if year else month
+    state = read_cluster_model(level, history_dir)
+    if partition in state["months"]:
+        return state
+
+    scores = df[SCORE_COLUMNS].dropna().to_numpy(dtype=np.float64)
+    model = state["model"]
+    if model is None:
+        if len(scores) < len(CLUSTER_LABELS):
+            return state
+        # import sklearn เฉพาะตอนสร้างโมเดลครั้งแรก (ไม่ให้ช้าตอนเริ่ม process)
+        from sklearn.cluster import MiniBatchKMeans
+
+        model = MiniBatchKMeans(n_clusters=len(CLUSTER_LABELS), random_state=0, n_init=3)
+    for start in range(0, len(scores), CLUSTER_BATCH_SIZE):
+        batch = scores[start:start + CLUSTER_BATCH_SIZE]
+        # รอบแรกต้องมีอย่างน้อยเท่าจำนวนกลุ่ม
+        if len(batch) >= len(CLUSTER_LABELS) or hasattr(model, "cluster_centers_"):
+            model.partial_fit(batch)
+
+    state = {"level": level, "model": model, "months": {**state["months"], partition: version}}
+    history_path = _history_path(level, history_dir)
+    history_path.mkdir(parents=True, exist_ok=True)
+    write_snapshot_artifact(history_path / CLUSTER_MODEL_NAME, lambda path: joblib.dump(state, path))
+    return state
+
+
+def assign_clusters(model, df):
+    """
+    จัดนักเรียนเข้ากลุ่ม คืนค่า DataFrame (CLUSTER, CLUSTER_ORIGINAL) ตามแถวของ df
+    CLUSTER_ORIGINAL คือหมายเลขกลุ่มจากโมเดล, CLUSTER คือป้ายตามลำดับคะแนนเฉลี่ยของกลุ่ม
+    """
+    clusters = pd.DataFrame({
+        "CLUSTER": pd.Series(None, index=df.index, dtype="str"),
+        "CLUSTER_ORIGINAL": pd.Series(pd.NA, index=df.index, dtype="Int64"),
+    })
+    has_scores = df[SCORE_COLUMNS].notna().all(axis=1).to_numpy()
+    if model is None or not hasattr(model, "cluster_centers_") or not has_scores.any():
+        return clusters
+
+    ids = model.predict(df.loc[has_scores, SCORE_COLUMNS].to_numpy(dtype=np.float64))
+    # อันดับของแต่ละกลุ่มตามคะแนนเฉลี่ยของศูนย์กลาง (0 = สูงสุด)
+    ranks = np.empty(len(CLUSTER_LABELS), dtype=int)
+    ranks[np.argsort(-model.cluster_centers_.mean(axis=1))] = np.arange(len(CLUSTER_LABELS))
+    clusters.loc[has_scores, "CLUSTER"] = np.array(CLUSTER_LABELS, dtype=object)[ranks[ids]]
+    clusters.loc[has_scores, "CLUSTER_ORIGINAL"] = ids
+    return clusters
+
+
+def _clusters_path(source_path, sheet_name, snapshot_dir=SNAPSHOT_DIR):
+    return snapshot_artifact_path(source_path, f"clusters_{sheet_name}.arrow", snapshot_dir)
+
+
+def read_clusters(source_path, snapshot_dir=SNAPSHOT_DIR):
+    """ผลการจัดกลุ่มที่บันทึกไว้ตอน ingest (ไม่ปรับโมเดล) None ถ้ายังไม่มี"""
+    parsed = parse_export_name(source_path)
+    if parsed is None:
+        return None
+    clusters_path = _clusters_path(source_path, "OurStudent_" + parsed[0], snapshot_dir)
+    if not clusters_path.exists():
+        return None
+    return feather.read_feather(clusters_path)
+
+
+def ensure_clusters(source_path, snapshot_dir=SNAPSHOT_DIR, history_dir=HISTORY_DIR):
+    """
+    ผลการจัดกลุ่มของนักเรียนใน sheet OurStudent ของไฟล์ export (บันทึกไว้คู่กับ snapshot)
+    ถ้ายังไม่มี จะปรับโมเดลของระดับชั้นด้วยนักเรียนทั้งหมดใน sheet Analysis ของไฟล์นี้ก่อน แล้วจัดกลุ่ม
+    คืนค่า DataFrame ตามแถวของ sheet (None ถ้าไม่ใช่ไฟล์ export ของระดับชั้น หรือยังไม่มี snapshot)
+    """
+    parsed = parse_export_name(source_path)
+    if parsed is None:
+        return None
+    level, month = parsed
+    sheet_name = "OurStudent_" + level
+    clusters = read_clusters(source_path, snapshot_dir)
+    if clusters is not None:
+        return clusters
+
+    clusters_path = _clusters_path(source_path, sheet_name, snapshot_dir)
+    with _cluster_lock(level, history_dir):
+        # ผู้อื่นอาจจัดกลุ่มไฟล์นี้เสร็จระหว่างรอล็อก
+        if clusters_path.exists():
+            return feather.read_feather(clusters_path)
+        # ไม่แปลงไฟล์ที่นี่ ผู้เรียกต้องสร้าง (และตรวจ) snapshot ไว้ก่อนแล้ว
+        manifest = current_snapshot(source_path, snapshot_dir)
+        if manifest is None or sheet_name not in manifest["sheets"]:
+            return None
+        training_sheet = "Analysis_" + level if "Analysis_" + level in manifest["sheets"] else sheet_name
+        year = manifest.get("year") or export_year(month, manifest["mtime_ns"])
+        state = update_cluster_model(
+            level, month, read_snapshot_sheet(source_path, training_sheet, snapshot_dir), manifest["version"],
+            history_dir, year,
+        )
+        clusters = assign_clusters(state["model"], read_snapshot_sheet(source_path, sheet_name, snapshot_dir))
+        write_snapshot_artifact(
+            clusters_path, lambda path: feather.write_feather(clusters, path, compression="uncompressed")
+        )
+    return clusters
+
+
+def apply_clusters(df, clusters):
+    """เติม CLUSTER / CLUSTER_ORIGINAL จากผลการจัดกลุ่ม เฉพาะแถวที่ไฟล์ export ไม่ได้กำหนดมา"""
+    if clusters is None or len(clusters) != len(df):
+        return df
+    for column in ["CLUSTER", "CLUSTER_ORIGINAL"]:
+        values = clusters[column].set_axis(df.index)
+        if column not in df.columns:
+            df[column] = values
+        elif isinstance(df[column].dtype, pd.CategoricalDtype):
+            # ค่าที่เติมอาจไม่อยู่ใน categories ของ snapshot
+            df[column] = df[column].astype(object).fillna(values)
+        else:
+            df[column] = df[column].fillna(values)
+    return df
+
+
+def update_history(level, data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR, history_dir=HISTORY_DIR):
+    """
+    เพิ่มเดือนใหม่ (หรือเดือนที่ไฟล์ export เปลี่ยน) เข้าข้อมูลย้อนหลังของระดับชั้น คืนค่าดัชนีปัจจุบัน
+    และจัดกลุ่มนักเรียนของเดือนนั้น (ปรับโมเดลจัดกลุ่มต่อจากเดือนก่อน)
+    อ่านเฉพาะ snapshot ที่สร้างและตรวจแล้ว ไม่แปลงไฟล์ export เอง (เดือนที่ยังไม่มี snapshot จะถูกข้าม)
+    """
+    index = read_history_index(level, history_dir)
+    for month in available_months(level, data_dir):
+        source_path = export_path(level, month, data_dir)
+        manifest = current_snapshot(source_path, snapshot_dir)
+        if manifest is None:
+            continue
+        ensure_clusters(source_path, snapshot_dir, history_dir)
+        year = manifest.get("year") or export_year(month, manifest["mtime_ns"])
+        if index["partitions"].get(history_partition(year, month), {}).get("version") == manifest["version"]:
+            continue
+        sheet_name = "OurStudent_" + level
+        if sheet_name not in manifest["sheets"]:
+            continue
+        df = read_snapshot_sheet(source_path, sheet_name, snapshot_dir)
+        index = append_history(level, month, df, manifest["version"], history_dir, year)
+    return index
+
+
+def _read_history_rows(history_path, index, alias):
+    """แถวของนักเรียนจากทุก partition ในดัชนี คืนค่า (frames, มี partition ที่ไม่ตรงกับดัชนีหรือไม่)"""
+    frames = []
+    stale = False
+    for partition, (start, length) in index["students"].get(alias, {}).items():
+        expected = index["partitions"].get(partition, {}).get("version")
+        try:
+            table = feather.read_table(history_path / f"{partition}.arrow", memory_map=True)
+        except (OSError, pa.ArrowInvalid):
+            stale = True
+            continue
+        # ดัชนีกับ partition ต้องมาจาก snapshot เดียวกัน (ไม่เช่นนั้นช่วงแถวอาจเป็นของนักเรียนคนอื่น)
+        version = (table.schema.metadata or {}).get(PARTITION_VERSION_KEY, b"").decode("utf-8")
+        if version != expected or start + length > table.num_rows:
+            stale = True
+            continue
+        frames.append(table.slice(start, length).to_pandas())
+    return frames, stale
+
+
+def read_student_history(level, alias, history_dir=HISTORY_DIR):
+    """
+    ข้อมูลย้อนหลังทุกเดือนของนักเรียนหนึ่งคน (เรียงตามปีการศึกษาและเดือน) พร้อมคอลัมน์ PERIOD (เช่น JULY 2025)
+    อ่านเฉพาะช่วงแถวของนักเรียนจากไฟล์แต่ละ partition แบบ memory-map ไม่ต้องเปิดไฟล์ export
+    partition ที่ถูกเขียนใหม่ระหว่างอ่าน (เวอร์ชันไม่ตรงกับดัชนี) จะอ่านดัชนีใหม่หนึ่งครั้ง ถ้ายังไม่ตรงจะข้าม partition นั้น
+    """
+    history_path = _history_path(level, history_dir)
+    for _ in range(2):
+        frames, stale = _read_history_rows(history_path, read_history_index(level, history_dir), alias)
+        if not stale:
+            break
+
+    if not frames:
+        return pd.DataFrame(columns=HISTORY_COLUMNS + ["PERIOD"])
+
+    history = pd.concat(frames, ignore_index=True)
+    for column in ["ALIAS", "EXPORT_MONTH", "MONTH"]:
+        history[column] = history[column].astype(str)
+    history["PERIOD"] = history["MONTH"] + " " + history["YEAR"].astype(str)
+    keys = [(school_year(int(year), month), month_sort_key(month)) for year, month in zip(history["YEAR"], history["MONTH"])]
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return history.iloc[order].reset_index(drop=True)
+
+
+def ingest_all(data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR, history_dir=HISTORY_DIR):
+    """
+    แปลงไฟล์ export ทุกไฟล์ในโฟลเดอร์ให้เป็น snapshot (ข้ามไฟล์ที่ไม่เปลี่ยน)
+    แล้วเพิ่มเดือนใหม่เข้าข้อมูลย้อนหลังของแต่ละระดับชั้น
+    """
+    manifests = {}
+    levels = set()
+    for source_path in sorted(Path(data_dir).glob("export_all_outputs_*.xlsx")):
+        manifests[source_path.name] = ensure_snapshot(source_path, snapshot_dir)
+        parsed = parse_export_name(source_path)
+        if parsed is not None:
+            levels.add(parsed[0])
+    for level in sorted(levels):
+        update_history(level, data_dir, snapshot_dir, history_dir)
+    return manifests
+
+
+def require_level_sheets(source_path, sheets):
+    """
+    ตรวจว่าไฟล์ export มี sheet Analysis_<ระดับชั้น> และ OurStudent_<ระดับชั้น> ที่มีข้อมูล
+    raise SnapshotValidationError พร้อมปัญหาทั้งหมดที่พบ
+    """
+    parsed = parse_export_name(source_path)
+    if parsed is None:
+        raise SnapshotValidationError(
+            Path(source_path).name, ["ชื่อไฟล์ไม่ตรงรูปแบบ export_all_outputs_<level>_<month>.xlsx"]
+        )
+    level = parsed[0]
+    problems = []
+    for sheet_name in ["Analysis_" + level, "OurStudent_" + level]:
+        if sheet_name not in sheets:
+            problems.append(f"ไม่พบ sheet {sheet_name}")
+        elif sheets[sheet_name].empty:
+            problems.append(f"sheet {sheet_name} ไม่มีข้อมูล")
+    if problems:
+        raise SnapshotValidationError(Path(source_path).name, problems)
+
+
+def error_report(error):
+    """รายการปัญหาของข้อผิดพลาดตอนแปลงไฟล์ (รายงานการตรวจ ถ้าเป็น SnapshotValidationError)"""
+    if isinstance(error, SnapshotValidationError):
+        return error.problems
+    return [str(error)]
+
+
+class SnapshotWatcher:
+    """
+    thread เบื้องหลังที่คอยตรวจโฟลเดอร์ข้อมูล แล้วแปลงไฟล์ export ที่เพิ่มหรือเปลี่ยนเป็น snapshot ใหม่
+    ไฟล์จะถูกแปลงเมื่อขนาดและ mtime ไม่เปลี่ยนแล้ว (ไม่อ่านไฟล์ที่กำลังเขียนไม่เสร็จ)
+    snapshot ใหม่ถูกสลับเข้าที่ทีเดียว ระหว่างแปลงผู้ใช้ยังเห็น snapshot เดิม
+    on_snapshot(level, month, version) ถูกเรียกหลังตรวจไฟล์ครั้งแรกและทุกครั้งที่ไฟล์เปลี่ยน (เช่น สร้างรายงานล่วงหน้า)
+    errors: ชื่อไฟล์ -> รายการปัญหาของไฟล์ที่แปลงไม่สำเร็จ (ลบออกเมื่อแปลงไฟล์นั้นสำเร็จ)
+    """
+
+    def __init__(self, data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR, history_dir=HISTORY_DIR,
+                 interval=2.0, settle_seconds=2.0, validator=require_level_sheets, on_snapshot=None):
+        self.data_dir = Path(data_dir)
+        self.snapshot_dir = snapshot_dir
+        self.history_dir = history_dir
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.validator = validator
+        self.on_snapshot = on_snapshot
+        self.errors = {}
+        self._seen = {}
+        self._retired = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="snapshot-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(self.interval)
+
+    def poll_once(self):
+        """ตรวจโฟลเดอร์หนึ่งรอบ คืนรายการ (level, month, เวอร์ชันเดิม, เวอร์ชันใหม่) ที่ถูกแปลงในรอบนี้"""
+        swapped = []
+        for source_path in sorted(self.data_dir.glob("export_all_outputs_*.xlsx")):
+            parsed = parse_export_name(source_path)
+            if parsed is None:
+                continue
+            try:
+                stat = source_path.stat()
+            except OSError:
+                continue
+
+            # _seen เก็บ (mtime, size) ที่เห็นล่าสุด และแปลงไฟล์เวอร์ชันนั้นไปแล้วหรือยัง
+            signature = (stat.st_mtime_ns, stat.st_size)
+            previous = self._seen.get(source_path)
+            if previous is not None and previous[0] == signature:
+                if previous[1]:
+                    continue
+            elif previous is not None or time.time() - stat.st_mtime < self.settle_seconds:
+                # ไฟล์เพิ่งเปลี่ยน รอรอบถัดไปให้เขียนเสร็จก่อน
+                self._seen[source_path] = (signature, False)
+                continue
+
+            old_manifest = current_snapshot(source_path, self.snapshot_dir)
+            try:
+                manifest = ensure_snapshot(source_path, self.snapshot_dir, self.validator)
+            except Exception as e:
+                # ไฟล์เสียหรือไม่ผ่านการตรวจ ใช้ snapshot เดิมต่อไปจนกว่าไฟล์จะเปลี่ยนอีกครั้ง
+                self.errors[source_path.name] = error_report(e)
+                self._seen[source_path] = (signature, True)
+                continue
+
+            old_version = old_manifest["version"] if old_manifest else None
+            if old_version != manifest["version"]:
+                swapped.append((parsed[0], parsed[1], old_version, manifest["version"]))
+            try:
+                update_history(parsed[0], self.data_dir, self.snapshot_dir, self.history_dir)
+            except Exception as e:
+                # snapshot ใช้ได้แล้ว แต่ข้อมูลย้อนหลัง/การจัดกลุ่มยังไม่เสร็จ ลองใหม่รอบถัดไป (ยังไม่ถือว่าแปลงเสร็จ)
+                self.errors[source_path.name] = [f"history: {e}"]
+                self._seen[source_path] = (signature, False)
+                continue
+
+            self.errors.pop(source_path.name, None)
+            self._seen[source_path] = (signature, True)
+            if self.on_snapshot is not None:
+                try:
+                    self.on_snapshot(parsed[0], parsed[1], manifest["version"])
+                except Exception as e:
+                    self.errors[source_path.name] = [f"on_snapshot: {e}"]
+
+        if swapped:
+            with self._lock:
+                self._retired.extend(swapped)
+        return swapped
+
+    def pop_retired(self):
+        """คืนรายการ snapshot ที่ถูกแทนที่ตั้งแต่ครั้งก่อน (สำหรับล้าง cache ของเวอร์ชันเดิม) แล้วล้างรายการ"""
+        with self._lock:
+            retired, self._retired = self._retired, []
+        return retired
+
+
+if __name__ == "__main__":
+    for source_path in sorted(DATA_DIR.glob("export_all_outputs_*.xlsx")):
+        try:
+            manifest = ensure_snapshot(source_path)
+        except ValueError as e:
+            print(e)
+            continue
+        print(f"{source_path.name}: version {manifest['version']} ({', '.join(manifest['sheets'])})")
+        update_history(parse_export_name(source_path)[0])
@@ -0,0 +1,146 @@
+"""
+cache ของข้อมูลต่อ snapshot (DataFrame, ดัชนี, แบบจำลอง, ตารางสรุป) ในหน่วยความจำของ process จำกัดขนาดรวมตามงบที่กำหนด
+
+key เป็น (level, ชนิด, month, snapshot_version, ...) เช่น (level, "frame", month, snapshot_version, sheet_name)
+เมื่อขนาดรวมเกินงบ จะลบทุกรายการของระดับชั้นที่ไม่ได้ใช้นานที่สุดออกก่อน (ระดับชั้นที่เพิ่งใช้จะอยู่ต่อ)
+ขนาดของ DataFrame วัดจาก DataFrame.memory_usage(deep=True) (dtype ถูกลดขนาดแล้วด้วย data_store.compact_frame)
+ค่าอื่นวัดจากขนาดเมื่อ pickle (ประมาณการ ใกล้เคียงหน่วยความจำจริงของ array และ dict ภายใน)
+
+กำหนดงบได้ด้วย BEWDAR_FRAME_CACHE_MB (ค่าเริ่มต้น 256)
+"""
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+FRAME_CACHE_MAX_BYTES = int(float(os.environ.get("BEWDAR_FRAME_CACHE_MB", "256")) * 1024 * 1024)
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def value_bytes(value):
+    """ขนาดโดยประมาณของค่าที่เก็บใน cache (DataFrame วัดตรง, dict/list/tuple รวมขนาดของสมาชิก)"""
+    if isinstance(value, pd.DataFrame):
+        return frame_bytes(value)
+    if isinstance(value, dict):
+        return sum(value_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(value_bytes(item) for item in value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class FrameCache:
+    """
+    cache แบบจำกัดขนาด ใช้ร่วมกันทุก thread ใน process
+    ค่าที่คืนให้ (DataFrame, ดัชนี, แบบจำลอง) ใช้ร่วมกัน ห้ามแก้ไข
+    """
+
+    def __init__(self, max_bytes=FRAME_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._levels = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key)
+            return entry[0]
+
+    def set(self, key, value):
+        size = value_bytes(value)
+        with self._lock:
+            self._entries[key] = (value, size)
+            self._touch(key)
+            self._evict(keep=key)
+        return value
+
+    def get_or_load(self, key, load):
+        """คืนค่าจาก cache ถ้ามี ไม่เช่นนั้นเรียก load() แล้วเก็บไว้ (ไม่เก็บถ้า key มี None)"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = load()
+        if None in key:
+            return value
+        return self.set(key, value)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            if not any(entry_key[0] == key[0] for entry_key in self._entries):
+                self._levels.pop(key[0], None)
+
+    def discard_snapshot(self, level, month, version):
+        """ลบทุกรายการ (ทุกชนิด) ของ snapshot ที่ถูกแทนที่แล้ว"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == level and key[2:4] == (month, version)]:
+                del self._entries[key]
+            if not any(entry_key[0] == level for entry_key in self._entries):
+                self._levels.pop(level, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._levels.clear()
+
+    def _touch(self, key):
+        self._entries.move_to_end(key)
+        self._levels[key[0]] = True
+        self._levels.move_to_end(key[0])
+
+    def _used(self):
+        return sum(size for _, size in self._entries.values())
+
+    def _evict(self, keep):
+        used = self._used()
+        # ลบทั้งระดับชั้นที่ไม่ได้ใช้นานที่สุดก่อน
+        for level in list(self._levels):
+            if used <= self.max_bytes or level == keep[0]:
+                break
+            for key in [key for key in self._entries if key[0] == level]:
+                used -= self._entries.pop(key)[1]
+                self.evictions += 1
+            del self._levels[level]
+        # เหลือแต่ระดับชั้นปัจจุบันแล้วยังเกินงบ ลบรายการเก่าของระดับชั้นนี้ (ยกเว้นรายการที่เพิ่งเพิ่ม)
+        for key in list(self._entries):
+            if used <= self.max_bytes:
+                break
+            if key != keep:
+                used -= self._entries.pop(key)[1]
+                self.evictions += 1
+
+    def stats(self):
+        """สถิติการใช้งาน (ขนาดรวม, จำนวนครั้ง hit/miss/evict และขนาดแยกตามระดับชั้นและตามชนิด)"""
+        with self._lock:
+            levels = {}
+            kinds = {}
+            for key, (_, size) in self._entries.items():
+                for group, name in [(levels, key[0]), (kinds, key[1])]:
+                    counts = group.setdefault(name, {"entries": 0, "bytes": 0})
+                    counts["entries"] += 1
+                    counts["bytes"] += size
+            return {
+                "budget_bytes": self.max_bytes,
+                "used_bytes": self._used(),
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "levels": levels,
+                "kinds": kinds,
+            }
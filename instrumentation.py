@@ -0,0 +1,282 @@
+"""
+วัดเวลาแต่ละส่วนของหน้าเว็บในหนึ่งรอบการ rerun (เปิดใช้เฉพาะเมื่อต้องการ)
+
+เปิดได้สองแบบ:
+    - ตั้ง environment variable BEWDAR_PROFILE=1 (ทุก session)
+    - เปิดหน้าเว็บด้วย ?profile=<token> (เฉพาะ session นั้น) token ตั้งใน BEWDAR_PROFILE_TOKEN
+      หรือ profile_token ใน .streamlit/secrets.toml ถ้าไม่ได้ตั้ง token จะเปิดผ่านหน้าเว็บไม่ได้
+
+ผลของแต่ละรอบแสดงในแถบด้านข้าง และถูกเพิ่มต่อท้าย reports/perf_log.jsonl (JSON หนึ่งบรรทัดต่อรอบ)
+เมื่อไฟล์ใหญ่เกิน LOG_MAX_BYTES จะถูกย้ายไปเป็น perf_log.jsonl.1 (เก็บไฟล์เก่าไว้หนึ่งไฟล์)
+"""
+import functools
+import hmac
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+import data_store
+
+# streamlit ถูก import ในฟังก์ชันที่แสดงผลเท่านั้น โมดูลที่ไม่ใช้ Streamlit (เช่น report_builder) จึง import โมดูลนี้ได้
+
+PROFILE_ENV = "BEWDAR_PROFILE"
+PROFILE_TOKEN_ENV = "BEWDAR_PROFILE_TOKEN"
+PROFILE_TOKEN_SECRET = "profile_token"
+PROFILE_QUERY_PARAM = "profile"
+LOG_PATH = Path(__file__).parent / "reports" / "perf_log.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+
+_local = threading.local()
+_log_lock = threading.Lock()
+_startup_lock = threading.Lock()
+# เวลาเริ่มต้นของ process นี้ (บันทึกครั้งเดียวหลังแสดงหน้าแรกเสร็จ)
+_startup = {}
+
+
+class RerunProfile:
+    """ข้อมูลการวัดของการ rerun หนึ่งรอบ แบ่งเป็นส่วนตามลำดับที่เรียก section()"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.context = {}
+        self.sections = []
+        self.cache = {}
+        self.stats = {}
+        self._current = None
+        self.section("setup")
+
+    def section(self, name):
+        """ปิดส่วนก่อนหน้าแล้วเริ่มนับส่วนใหม่"""
+        self._close_section()
+        self._current = {"section": name, "started": time.perf_counter(), "rows": 0, "figures": 0, "figure_bytes": 0}
+
+    def _close_section(self):
+        if self._current is not None:
+            current = self._current
+            current["seconds"] = round(time.perf_counter() - current.pop("started"), 4)
+            self.sections.append(current)
+            self._current = None
+
+    def add_rows(self, rows):
+        if self._current is not None:
+            self._current["rows"] += int(rows)
+
+    def add_figure(self, fig):
+        if self._current is not None:
+            self._current["figures"] += 1
+            self._current["figure_bytes"] += len(fig.to_json().encode("utf-8"))
+
+    def cache_counts(self, name):
+        return self.cache.setdefault(name, {"hits": 0, "misses": 0})
+
+    def finish(self):
+        self._close_section()
+        return {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "context": self.context,
+            "sections": self.sections,
+            "cache": self.cache,
+            "stats": self.stats,
+        }
+
+
+def current_profile():
+    """profile ของ rerun ที่กำลังทำงานใน thread นี้ (None ถ้าไม่ได้เปิดใช้)"""
+    return getattr(_local, "profile", None)
+
+
+def profile_token():
+    """token สำหรับเปิดการวัดเวลาผ่าน ?profile=<token> (None ถ้าไม่ได้ตั้งไว้)"""
+    token = os.environ.get(PROFILE_TOKEN_ENV)
+    if token:
+        return token
+    import streamlit as st
+
+    try:
+        return st.secrets.get(PROFILE_TOKEN_SECRET) or None
+    except Exception:
+        # ไม่มี secrets.toml หรือไม่ได้ทำงานใน Streamlit
+        return None
+
+
+def is_enabled():
+    if os.environ.get(PROFILE_ENV) == "1":
+        return True
+    token = profile_token()
+    if token is None:
+        return False
+    import streamlit as st
+
+    try:
+        value = st.query_params.get(PROFILE_QUERY_PARAM)
+    except Exception:
+        # ไม่ได้ทำงานใน Streamlit (เช่น batch_reports)
+        return False
+    return value is not None and hmac.compare_digest(str(value).encode("utf-8"), str(token).encode("utf-8"))
+
+
+def section(name):
+    profile = current_profile()
+    if profile is not None:
+        profile.section(name)
+
+
+def set_context(**context):
+    profile = current_profile()
+    if profile is not None:
+        profile.context.update({key: value for key, value in context.items() if value})
+
+
+def add_rows(rows):
+    profile = current_profile()
+    if profile is not None:
+        profile.add_rows(rows)
+
+
+def record_cache_miss(name):
+    """เรียกจากภายในฟังก์ชันที่มี cache (ส่วนนี้ทำงานเฉพาะตอน cache miss)"""
+    profile = current_profile()
+    if profile is not None:
+        profile.cache_counts(name)["misses"] += 1
+
+
+def record_stats(name, stats):
+    """เก็บสถิติของส่วนประกอบอื่น (เช่น ขนาดของ FrameCache) ไว้กับ rerun นี้"""
+    profile = current_profile()
+    if profile is not None:
+        profile.stats[name] = stats
+
+
+def track_cache(name, cached_function):
+    """
+    ห่อฟังก์ชันที่มี st.cache_* เพื่อนับจำนวนครั้งที่เรียก (hit = เรียกทั้งหมด - miss)
+    ฟังก์ชันเดิมต้องเรียก record_cache_miss(name) เอง
+    """
+    @functools.wraps(cached_function)
+    def wrapper(*args, **kwargs):
+        profile = current_profile()
+        if profile is None:
+            return cached_function(*args, **kwargs)
+
+        counts = profile.cache_counts(name)
+        misses = counts["misses"]
+        result = cached_function(*args, **kwargs)
+        if counts["misses"] == misses:
+            counts["hits"] += 1
+        if isinstance(result, pd.DataFrame):
+            profile.add_rows(len(result))
+        return result
+
+    if hasattr(cached_function, "clear"):
+        wrapper.clear = cached_function.clear
+    return wrapper
+
+
+def plotly_chart(fig, **kwargs):
+    """st.plotly_chart ที่นับขนาด JSON ของกราฟที่ส่งไปยัง browser ด้วย (เมื่อเปิดใช้)"""
+    import streamlit as st
+
+    profile = current_profile()
+    if profile is not None and fig is not None:
+        profile.add_figure(fig)
+    return st.plotly_chart(fig, **kwargs)
+
+
+def rotated_log_path(log_path=LOG_PATH):
+    log_path = Path(log_path)
+    return log_path.with_name(log_path.name + ".1")
+
+
+def append_log(record, log_path=LOG_PATH, max_bytes=LOG_MAX_BYTES):
+    """เพิ่มบรรทัดต่อท้าย log ถ้าไฟล์ใหญ่เกิน max_bytes ย้ายไปเป็น <ชื่อไฟล์>.1 ก่อน (ล็อกกันหลาย process)"""
+    log_path = Path(log_path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with _log_lock, data_store.file_lock(log_path.with_name(log_path.name + ".lock")):
+        try:
+            if log_path.stat().st_size >= max_bytes:
+                os.replace(log_path, rotated_log_path(log_path))
+        except FileNotFoundError:
+            pass
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def render_panel(record):
+    """แสดงผลการวัดของรอบนี้ในแถบด้านข้าง"""
+    import streamlit as st
+
+    with st.sidebar.expander(f"⏱️ Performance ({record['total_seconds'] * 1000:.0f} ms)"):
+        sections = pd.DataFrame(record["sections"])
+        sections["ms"] = sections.pop("seconds") * 1000
+        sections["figure_kb"] = sections.pop("figure_bytes") / 1024
+        st.dataframe(
+            sections,
+            hide_index=True,
+            column_config={
+                "ms": st.column_config.NumberColumn("ms", format="%.1f"),
+                "figure_kb": st.column_config.NumberColumn("figure KB", format="%.1f"),
+            },
+        )
+        for name, counts in record["cache"].items():
+            st.caption(f"{name}: hit {counts['hits']} / miss {counts['misses']}")
+        startup = startup_timings()
+        if startup:
+            st.caption(
+                f"startup: import {startup['import_seconds'] * 1000:.0f} ms,"
+                f" first paint {startup['first_paint_seconds'] * 1000:.0f} ms"
+            )
+        frames = record["stats"].get("frame_cache")
+        if frames is not None:
+            st.caption(
+                f"frame cache: {frames['used_bytes'] / 1024 / 1024:.1f} / {frames['budget_bytes'] / 1024 / 1024:.0f} MB"
+                f" ({frames['entries']} entries, evicted {frames['evictions']})"
+            )
+            kinds = frames.get("kinds", {})
+            if kinds:
+                st.caption(", ".join(
+                    f"{kind} {counts['entries']}: {counts['bytes'] / 1024 / 1024:.1f} MB" for kind, counts in kinds.items()
+                ))
+
+
+def record_startup(script_started, imports_finished):
+    """
+    บันทึกเวลา import และเวลาตั้งแต่เริ่มรันสคริปต์จนแสดงหน้าแรกเสร็จ ครั้งเดียวต่อ process
+    เขียนลง log เสมอ (ไม่ต้องเปิดการวัดเวลา) เพื่อดูว่า replica ใหม่พร้อมรับผู้ใช้เร็วแค่ไหน
+    """
+    with _startup_lock:
+        if _startup:
+            return
+        _startup.update({
+            "event": "startup",
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+            "import_seconds": round(imports_finished - script_started, 4),
+            "first_paint_seconds": round(time.perf_counter() - script_started, 4),
+        })
+    append_log(dict(_startup))
+
+
+def startup_timings():
+    return dict(_startup)
+
+
+def run_profiled(main):
+    """เรียก main() และวัดเวลาแต่ละส่วนถ้าเปิดใช้ (ถ้าไม่เปิด เรียก main() ตามปกติ)"""
+    if not is_enabled():
+        return main()
+
+    _local.profile = RerunProfile()
+    try:
+        main()
+        record = _local.profile.finish()
+    finally:
+        _local.profile = None
+
+    render_panel(record)
+    append_log(record)
@@ -0,0 +1,259 @@
+"""
+ทดสอบการรับผู้ใช้พร้อมกันหลาย session ในหนึ่ง process (เทียบเท่า replica เดียว) โดยไม่ต้องเปิด browser
+แต่ละ session ใช้ AppTest รัน main จริง: เลือกระดับชั้น -> เดือน -> นักเรียน แล้วสลับดูห้องเรียนทุกห้อง
+
+ตัวอย่าง:
+    python load_test.py --sessions 8 --rounds 3
+    python load_test.py --sessions 16 --scale 100          # ใช้ไฟล์ export จำลองที่มีนักเรียนจำลอง 100x
+
+รายงาน throughput, เวลา rerun (p50/p95/p99), หน่วยความจำต่อ session และ cache hit rate
+ผลลัพธ์ถูกเพิ่มต่อท้าย reports/load_tests/results.jsonl (JSON หนึ่งบรรทัดต่อการทดสอบ)
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+APP_PATH = Path(__file__).parent / "app.py"
+LOAD_TEST_DIR = Path(__file__).parent / "reports" / "load_tests"
+RESULTS_PATH = LOAD_TEST_DIR / "results.jsonl"
+RERUN_TIMEOUT = 300
+
+
+def _rss_bytes():
+    """หน่วยความจำที่ process ใช้จริง (Linux)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class Session:
+    """ผู้ใช้หนึ่งคน: AppTest หนึ่งตัว และเวลาของแต่ละ rerun"""
+
+    def __init__(self, levels, rng):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(str(APP_PATH), default_timeout=RERUN_TIMEOUT)
+        self.levels = levels
+        self.rng = rng
+        self.latencies = []
+        self.errors = []
+
+    def _rerun(self, action):
+        started = time.perf_counter()
+        action()
+        self.latencies.append(time.perf_counter() - started)
+        if self.app.exception:
+            self.errors.append(self.app.exception[0].message)
+            return False
+        return True
+
+    def run_round(self):
+        """หนึ่งรอบของผู้ปกครอง: เปิดหน้าเว็บ เลือกนักเรียน แล้วดูทุกห้องเรียน"""
+        app = self.app
+        level, month = self.rng.choice(self.levels)
+        if not self._rerun(app.run):
+            return
+        if not self._rerun(lambda: app.sidebar.selectbox[0].select(level).run()):
+            return
+        if not self._rerun(lambda: app.sidebar.selectbox[1].select(month).run()):
+            return
+        if len(app.sidebar.selectbox) < 3:
+            # ยังไม่มี snapshot (หรือไฟล์ไม่ผ่านการตรวจ) หน้าเว็บจึงไม่มีช่องเลือกนักเรียน
+            self.errors.append(f"{level} {month}: ไม่มีช่องเลือกนักเรียน (ข้อมูลยังไม่พร้อม)")
+            return
+        students = [alias for alias in app.sidebar.selectbox[2].options if alias]
+        if not students:
+            self.errors.append(f"{level} {month}: ไม่พบนักเรียน")
+            return
+        if not self._rerun(lambda: app.sidebar.selectbox[2].select(self.rng.choice(students)).run()):
+            return
+        for tabs in app.button_group[:1]:
+            for option in tabs.options[1:]:
+                if not self._rerun(lambda: app.button_group[0].set_value(option).run()):
+                    return
+
+
+def _read_log_lines(path, offset=0):
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        f.seek(offset)
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _log_position(log_path):
+    """(inode, ขนาด) ของ perf_log ตอนเริ่มทดสอบ ใช้ตรวจว่าไฟล์ถูกย้ายไปเป็น .1 ระหว่างทดสอบหรือไม่"""
+    try:
+        stat = log_path.stat()
+    except FileNotFoundError:
+        return None, 0
+    return stat.st_ino, stat.st_size
+
+
+def _profile_records(log_path, position):
+    """
+    rerun ที่ถูกบันทึกใน perf_log หลังตำแหน่ง position (เฉพาะรอบที่วัดด้วย instrumentation)
+    ถ้า log ถูกย้ายไปเป็นไฟล์ .1 ระหว่างทดสอบ อ่านส่วนที่เหลือจากไฟล์นั้นก่อน
+    (ถ้าถูกย้ายเกินหนึ่งครั้ง รอบที่เก่ากว่านั้นจะหายไป)
+    """
+    import instrumentation
+
+    inode, offset = position
+    records = []
+    if inode is not None and _log_position(log_path)[0] != inode:
+        rotated_path = instrumentation.rotated_log_path(log_path)
+        if _log_position(rotated_path)[0] == inode:
+            records += _read_log_lines(rotated_path, offset)
+        offset = 0
+    records += _read_log_lines(log_path, offset)
+    return [record for record in records if "sections" in record]
+
+
+def _cache_hit_rates(records):
+    totals = {}
+    for record in records:
+        for name, counts in record["cache"].items():
+            total = totals.setdefault(name, {"hits": 0, "misses": 0})
+            total["hits"] += counts["hits"]
+            total["misses"] += counts["misses"]
+    return {
+        name: round(counts["hits"] / max(counts["hits"] + counts["misses"], 1), 4)
+        for name, counts in totals.items()
+    }
+
+
+def _share_script_cache():
+    """
+    AppTest compile สคริปต์ใหม่ทุก rerun (ScriptCache ใหม่ทุกครั้ง) ซึ่งไม่ตรงกับ server จริงที่ทุก session ใช้ ScriptCache เดียวกัน
+    และการ compile พร้อมกันหลาย thread ทำให้ Python 3.11 error (AST constructor recursion depth mismatch)
+    จึงให้ทุก session ใช้ ScriptCache ตัวเดียว
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    script_cache = ScriptCache()
+    app_test.ScriptCache = lambda: script_cache
+    local_script_runner.ScriptCache = lambda: script_cache
+
+
+def run_load_test(sessions, rounds, levels, seed=0):
+    """รัน session พร้อมกันใน thread ละ session คืนผลสรุปเป็น dict"""
+    import instrumentation
+
+    _share_script_cache()
+
+    log_path = Path(instrumentation.LOG_PATH)
+    log_position = _log_position(log_path)
+
+    rss_before = _rss_bytes()
+    workers = [Session(levels, random.Random(seed + number)) for number in range(sessions)]
+    barrier = threading.Barrier(sessions)
+
+    def work(session):
+        barrier.wait()
+        for _ in range(rounds):
+            try:
+                session.run_round()
+            except Exception as e:
+                # session ที่ตายต้องปรากฏใน errors ไม่ใช่หายไปเงียบ ๆ
+                session.errors.append(f"{type(e).__name__}: {e}")
+                return
+
+    threads = [threading.Thread(target=work, args=(session,), name=f"session-{number}") for number, session in enumerate(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    rss_after = _rss_bytes()
+
+    latencies = np.array([latency for session in workers for latency in session.latencies])
+    records = _profile_records(log_path, log_position)
+    frame_cache = [record["stats"]["frame_cache"] for record in records if "frame_cache" in record.get("stats", {})]
+    return {
+        "sessions": sessions,
+        "rounds": rounds,
+        "reruns": len(latencies),
+        "errors": sorted({error for session in workers for error in session.errors}),
+        "seconds": round(elapsed, 3),
+        "reruns_per_second": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "latency_ms": {
+            name: round(float(np.percentile(latencies, q)) * 1000, 1) if len(latencies) else None
+            for name, q in [("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)]
+        },
+        "rss_mb": round(rss_after / 1024 / 1024, 1),
+        "memory_per_session_mb": round((rss_after - rss_before) / sessions / 1024 / 1024, 2),
+        "cache_hit_rate": _cache_hit_rates(records),
+        "frame_cache_mb": round(frame_cache[-1]["used_bytes"] / 1024 / 1024, 2) if frame_cache else None,
+    }
+
+
+def _print_result(result):
+    print(f"{result['sessions']} sessions x {result['rounds']} rounds: {result['reruns']} reruns ใน {result['seconds']:.1f}s"
+          f" ({result['reruns_per_second']:.2f} reruns/s)")
+    latency = result["latency_ms"]
+    print(f"  rerun latency  p50 {latency['p50']} ms · p95 {latency['p95']} ms · p99 {latency['p99']} ms · max {latency['max']} ms")
+    print(f"  memory         {result['rss_mb']} MB รวม · {result['memory_per_session_mb']} MB ต่อ session")
+    for name, rate in result["cache_hit_rate"].items():
+        print(f"  cache          {name}: {rate * 100:.1f}% hit")
+    if result["frame_cache_mb"] is not None:
+        print(f"  frame cache    {result['frame_cache_mb']} MB")
+    for error in result["errors"]:
+        print(f"  ERROR {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ทดสอบหน้าเว็บด้วยผู้ใช้พร้อมกันหลาย session")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=2, help="จำนวนรอบ (เลือกนักเรียน + ดูทุกห้องเรียน) ต่อ session")
+    parser.add_argument("--scale", type=int, default=None, help="ใช้ไฟล์ export จำลองที่มีนักเรียนจำลองมากกว่าข้อมูลจริง N เท่า")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    # ต้องกำหนดโฟลเดอร์ข้อมูลและเปิดการวัดเวลาก่อน import โมดูลของแอป (data_store อ่านค่าตอน import)
+    os.environ["BEWDAR_PROFILE"] = "1"
+    if args.scale is not None:
+        data_dir = LOAD_TEST_DIR / "data"
+        os.environ["BEWDAR_DATA_DIR"] = str(data_dir / f"x{args.scale}")
+        import benchmark
+
+        benchmark.build_synthetic_export(args.scale, data_dir)
+        levels = [(benchmark.TEMPLATE_LEVEL, benchmark.TEMPLATE_MONTH)]
+    else:
+        import data_store
+
+        levels = [
+            (level, month)
+            for level in ["Primary1", "Primary2", "Primary3", "Primary4", "Primary5", "Primary6"]
+            for month in data_store.available_months(level)
+        ]
+
+    # แปลงไฟล์ export ให้เสร็จก่อนเริ่มจับเวลา (ไม่อย่างนั้น session แรก ๆ จะเจอหน้ากำลังเตรียมข้อมูลของ watcher)
+    import data_store
+
+    data_store.ingest_all()
+
+    result = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "scale": args.scale,
+        **run_load_test(args.sessions, args.rounds, levels, args.seed),
+    }
+    _print_result(result)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    if result["errors"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1160 @@
+"""
+ส่วนที่สร้างเนื้อหารายงาน (ข้อมูล, ตาราง, กราฟ Plotly) โดยไม่ใช้ Streamlit
+
+ใช้ร่วมกันระหว่างหน้าเว็บ (app.py), การสร้างรายงานแบบ batch (batch_reports.py) และ HTTP API (api.py)
+import โมดูลนี้ไม่ตั้งค่าหน้าเว็บหรือสร้าง cache ของ Streamlit (ต่างจากการ import app.py)
+"""
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+# plotly.graph_objects โหลด class ของกราฟเมื่อถูกใช้ครั้งแรก ส่วน make_subplots import ในฟังก์ชันที่สร้างกราฟ
+import plotly.graph_objects as go
+
+import analytics
+import data_store
+import instrumentation
+import shared_cache
+
+
+# ฟังก์ชันเตรียมข้อมูล (นำมาจากโค้ดเดิม)
+def prepare_data_for_analysis(df):
+    """
+    เตรียมข้อมูลสำหรับการทำกราฟ clustering
+    ข้อมูลที่โหลดผ่าน load_data_by_level คำนวณคอลัมน์ไว้แล้ว จะคืน df เดิมโดยไม่แก้ไข
+    """
+    if data_store.is_enriched(df):
+        return df
+
+    # ข้อมูลที่ยังไม่ผ่านการเตรียม คำนวณบนสำเนาเพื่อไม่แก้ไข df ของผู้เรียก
+    return data_store.enrich_frame(df.copy())
+
+def select_student_rows(df, student_alias, selected_month, student_index=None):
+    """เลือกแถวของนักเรียนในเดือนที่ระบุ (ใช้ StudentIndex ถ้ามี แทนการกรองทั้งตาราง)"""
+    if student_index is not None:
+        positions = student_index.student_rows(student_alias, selected_month)
+        instrumentation.add_rows(len(positions))
+        return df.iloc[positions]
+    instrumentation.add_rows(len(df))
+    return df[(df['ALIAS'] == student_alias) & (df['MONTH'] == selected_month)]
+
+# จำนวนจุดต่อกราฟที่เริ่มเปลี่ยนไปวาดด้วย WebGL (Scattergl) แทน SVG
+WEBGL_POINT_THRESHOLD = 1000
+
+# จำนวนนักเรียนจำลองต่อห้องที่เริ่มแสดงเป็นแผนที่ความหนาแน่นแทนจุดรายคน (None = แสดงเป็นจุดเสมอ)
+DENSITY_POINT_THRESHOLD = 20000
+DENSITY_BIN_SIZE = 2.5
+
+def scatter_trace_class(n_points):
+    """เลือกชนิด trace ตามจำนวนจุด: Scattergl สำหรับข้อมูลจำนวนมาก, Scatter สำหรับข้อมูลน้อย"""
+    if WEBGL_POINT_THRESHOLD is not None and n_points > WEBGL_POINT_THRESHOLD:
+        return go.Scattergl
+    return go.Scatter
+
+def uses_webgl(fig):
+    """ตรวจว่ากราฟมี trace ที่วาดด้วย WebGL หรือไม่ (trace ที่เพิ่มทีหลังควรใช้ชนิดเดียวกันเพื่อไม่ให้ถูกบัง)"""
+    return any(trace.type == 'scattergl' for trace in fig.data)
+
+def build_density_trace(simulated_data, bin_size=DENSITY_BIN_SIZE):
+    """สรุปนักเรียนจำลองจำนวนมากเป็นแผนที่ความหนาแน่น โดย hover แสดงจำนวนนักเรียนแต่ละ TIER ในช่อง"""
+    edges = np.arange(0, 100 + bin_size, bin_size)
+    centers = (edges[:-1] + edges[1:]) / 2
+    x = simulated_data['STEM_AVG'].to_numpy(dtype=float)
+    y = simulated_data['LANGUAGE_AVG'].to_numpy(dtype=float)
+    tiers = simulated_data['TIER'].to_numpy()
+
+    counts, _, _ = np.histogram2d(x, y, bins=[edges, edges])
+    tier_lines = np.full(counts.shape, "", dtype=object)
+    for tier in pd.unique(tiers):
+        mask = tiers == tier
+        tier_counts, _, _ = np.histogram2d(x[mask], y[mask], bins=[edges, edges])
+        occupied = tier_counts > 0
+        tier_lines[occupied] += [f"{tier}: {int(count)}<br>" for count in tier_counts[occupied]]
+
+    # ช่องที่ไม่มีนักเรียนให้เป็นช่องว่าง (โปร่งใส)
+    z = np.where(counts > 0, counts, np.nan)
+
+    return go.Heatmap(
+        x=centers,
+        y=centers,
+        z=z.T,
+        text=tier_lines.T,
+        colorscale='Blues',
+        showscale=False,
+        opacity=0.7,
+        name='Simulated',
+        hovertemplate='STEM: %{x:.1f}<br>Language: %{y:.1f}<br>นักเรียนจำลอง %{z:.0f} คน<br>%{text}<extra></extra>'
+    )
+
+# สีของนักเรียนจำลองแต่ละ TIER (ใช้ทั้งใน scatter plot และภาพรวมระดับชั้น)
+TIER_COLORS = {
+    'Diamond': "#EF28B0",
+    'Platinum': "#001c9a",
+    'Gold': '#F1C40F',
+    'Silver': "#51daf9",
+    'Bronze': '#E74C3C'
+}
+
+# จำนวนกราฟพื้นหลังสูงสุดที่เก็บใน cache (ระดับชั้น x เดือน x ห้องเรียน) เกินแล้วจะลบตัวที่ไม่ได้ใช้นานที่สุด
+BASE_FIGURE_CACHE_MAX_ENTRIES = 64
+
+# ฟังก์ชันสร้างกราฟพื้นหลังของ scatter plot (ส่วนที่เหมือนกันสำหรับนักเรียนทุกคนในห้องเรียนเดียวกัน)
+def build_classroom_base_figure(df, classroom_type, classroom_name, student_index=None):
+    """สร้างกราฟพื้นหลัง: นักเรียนจำลองแยกตาม TIER, เส้นอ้างอิง และ layout"""
+    if student_index is not None:
+        simulated_data = df.iloc[student_index.classroom_rows(classroom_type, simulated=True)]
+    else:
+        comparison_df = prepare_data_for_analysis(df)
+        classroom_data = comparison_df[comparison_df['CLASSROOM_TYPE'] == classroom_type]
+        simulated_data = classroom_data[classroom_data['STUDENT_CATEGORY'] == 'Simulated']
+
+    fig = go.Figure()
+
+    # นักเรียนจำลองจำนวนมาก แสดงเป็นแผนที่ความหนาแน่นแทนจุดรายคน
+    if DENSITY_POINT_THRESHOLD is not None and len(simulated_data) > DENSITY_POINT_THRESHOLD:
+        fig.add_trace(build_density_trace(simulated_data))
+        simulated_data = simulated_data.iloc[0:0]
+
+    # แสดงนักเรียนจำลอง (Simulated) ทุกคน
+    trace_class = scatter_trace_class(len(simulated_data))
+    for tier in simulated_data['TIER'].unique():
+        tier_data = simulated_data[simulated_data['TIER'] == tier]
+        if len(tier_data) > 0:
+            fig.add_trace(
+                trace_class(
+                    x=tier_data['STEM_AVG'],
+                    y=tier_data['LANGUAGE_AVG'],
+                    mode='markers',
+                    marker=dict(
+                        color=TIER_COLORS.get(tier, '#888888'),
+                        size=12,  # ขนาดใหญ่ขึ้นเพื่อดูง่ายบนมือถือ
+                        symbol='circle',
+                        opacity=0.7
+                    ),
+                    name=f'{tier}',
+                    hovertemplate='<b>%{text}</b><br>STEM: %{x:.1f}<br>Language: %{y:.1f}<extra></extra>',
+                    text=tier_data['ALIAS']
+                )
+            )
+
+    # เส้นอ้างอิง
+    fig.add_hline(y=50, line_dash="dash", line_color="red", opacity=0.5)
+    fig.add_vline(x=50, line_dash="dash", line_color="red", opacity=0.5)
+    fig.add_trace(
+        go.Scatter(
+            x=[0, 100], y=[0, 100],
+            mode='lines',
+            line=dict(dash='dot', color='gray', width=1),
+            showlegend=False,
+            hoverinfo='skip'
+        )
+    )
+
+    fig.update_layout(
+        height=500,  # ความสูงที่เหมาะสมกับมือถือ
+        title_text=f"ตำแหน่งนักเรียนในห้องเรียน {classroom_name}",
+        title_x=0.5,
+        showlegend=True,
+        legend=dict(
+            orientation="h",  # แสดง legend แนวนอนเพื่อประหยัดพื้นที่
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        )
+    )
+    
+    fig.update_xaxes(title_text="คะแนนเฉลี่ย STEM (คณิต + วิทยาศาสตร์)", range=[0, 100])
+    fig.update_yaxes(title_text="คะแนนเฉลี่ยภาษา (อังกฤษ + ไทย)", range=[0, 100])
+
+    # การตั้งค่าสำหรับมือถือ
+    fig.update_layout(
+        font=dict(size=12),  # ขนาดฟอนต์ที่เหมาะสม
+        margin=dict(l=50, r=50, t=80, b=50)  # margin ที่เหมาะสม
+    )
+
+    fig.update_layout(dragmode=False)
+
+    return fig
+
+# กราฟพื้นหลังเป็น dict ต่อ snapshot ใช้ร่วมกันทุก thread ใน process (ห้ามแก้ไข)
+_base_figures = OrderedDict()
+_base_figures_lock = threading.Lock()
+
+
+def get_classroom_base_figure(snapshot_key, classroom_type, classroom_name, df, student_index=None):
+    """
+    Plotly JSON ของกราฟพื้นหลัง (df และ student_index ไม่เป็นส่วนหนึ่งของ key)
+    เก็บไม่เกิน BASE_FIGURE_CACHE_MAX_ENTRIES กราฟ process อื่นที่สร้างกราฟเดียวกันไว้แล้ว จะอ่าน JSON จาก shared_cache
+    """
+    key = (*snapshot_key, classroom_type, classroom_name)
+    with _base_figures_lock:
+        figure = _base_figures.get(key)
+        if figure is not None:
+            _base_figures.move_to_end(key)
+            return figure
+
+    figure = shared_cache.cached_json(
+        "base_figure",
+        key,
+        lambda: json.loads(build_classroom_base_figure(df, classroom_type, classroom_name, student_index).to_json()),
+    )
+    with _base_figures_lock:
+        _base_figures[key] = figure
+        _base_figures.move_to_end(key)
+        while len(_base_figures) > BASE_FIGURE_CACHE_MAX_ENTRIES:
+            _base_figures.popitem(last=False)
+    return figure
+
+
+def discard_base_figures(snapshot_key):
+    """ลบกราฟพื้นหลังของ snapshot ที่ถูกแทนที่แล้ว"""
+    with _base_figures_lock:
+        for key in [key for key in _base_figures if key[:len(snapshot_key)] == tuple(snapshot_key)]:
+            del _base_figures[key]
+
+def classroom_scatter_base(df, classroom_type, classroom_name, student_index=None, snapshot_key=None):
+    """กราฟพื้นหลังของ scatter plot เป็น figure ใหม่ที่แก้ไขได้ (ใช้ตัวใน cache ถ้าระบุ snapshot_key)"""
+    if snapshot_key is not None:
+        base_figure = get_classroom_base_figure(snapshot_key, classroom_type, classroom_name, df, student_index)
+        # สร้าง figure ใหม่จาก dict ที่ผ่านการตรวจสอบแล้ว (ไม่แก้ไขตัวที่อยู่ใน cache)
+        return go.Figure(base_figure, _validate=False)
+    return build_classroom_base_figure(df, classroom_type, classroom_name, student_index)
+
+def student_scatter_traces(df, student_alias, classroom_type, student_index=None, webgl=False):
+    """
+    trace ของนักเรียนที่เลือกบน scatter plot (ส่วนเดียวที่ต่างกันระหว่างนักเรียนในห้องเรียนเดียวกัน)
+    webgl=True ใช้ Scattergl ให้ตรงกับพื้นหลังที่เป็น WebGL เพื่อไม่ให้ถูกบัง คืนค่า list (ว่างถ้าไม่มีข้อมูล)
+    """
+    if student_index is not None:
+        target_student = df.iloc[student_index.alias_rows(student_alias, classroom_type)]
+    else:
+        comparison_df = prepare_data_for_analysis(df)
+        target_student = comparison_df[
+            (comparison_df['CLASSROOM_TYPE'] == classroom_type) & (comparison_df['ALIAS'] == student_alias)
+        ]
+
+    if len(target_student) == 0:
+        return []
+
+    target_trace_class = go.Scattergl if webgl else go.Scatter
+    return [
+        target_trace_class(
+            x=target_student['STEM_AVG'],
+            y=target_student['LANGUAGE_AVG'],
+            mode='markers',
+            marker=dict(
+                color='red',
+                size=25,  # ขนาดใหญ่ขึ้นเพื่อดูง่ายบนมือถือ
+                symbol='diamond',
+                line=dict(width=3, color='white')
+            ),
+            name=f'{student_alias}',
+            hovertemplate='<b>%{text}</b><br>STEM: %{x:.1f}<br>Language: %{y:.1f}<extra></extra>',
+            text=target_student['ALIAS']
+        )
+    ]
+
+# ฟังก์ชันสร้าง scatter plot เดี่ยวสำหรับแต่ละห้องเรียน
+def create_single_scatter_plot(df, student_alias, classroom_type, classroom_name, student_index=None, snapshot_key=None):
+    """
+    สร้าง scatter plot สำหรับห้องเรียนเดี่ยว
+    ถ้าระบุ snapshot_key (เช่น (ระดับชั้น, เดือน, snapshot_version)) จะใช้กราฟพื้นหลังจาก cache แล้วเพิ่มเฉพาะนักเรียนที่เลือก
+    """
+    fig = classroom_scatter_base(df, classroom_type, classroom_name, student_index, snapshot_key)
+    # แสดงนักเรียนที่เลือก (ตำแหน่งจริงเสมอ)
+    fig.add_traces(student_scatter_traces(df, student_alias, classroom_type, student_index, uses_webgl(fig)))
+    return fig
+
+# ฟังก์ชันสร้างกราฟเปรียบเทียบคะแนนเดี่ยวสำหรับแต่ละห้องเรียน
+def create_single_subject_comparison(df, student_alias, selected_month, classroom_type, classroom_name, student_index=None):
+    """สร้างกราฟเปรียบเทียบคะแนนสำหรับห้องเรียนเดี่ยว"""
+    if student_index is not None:
+        classroom_student = df.iloc[student_index.rows(student_alias, selected_month, classroom_type)]
+    else:
+        student_data = df[(df['ALIAS'] == student_alias) & (df['MONTH'] == selected_month)]
+
+        if len(student_data) == 0:
+            return None
+
+        classroom_student = student_data[student_data['CLASSROOM_TYPE'] == classroom_type]
+
+    subjects = ['MATH', 'SCIENCE', 'ENGLISH', 'THAI']
+    subject_names = ['คณิตศาสตร์', 'วิทยาศาสตร์', 'ภาษาอังกฤษ', 'ภาษาไทย']
+
+    if len(classroom_student) == 0:
+        return None
+
+    scores = [classroom_student[subject].iloc[0] for subject in subjects]
+
+    # กำหนดสีรายแท่งตาม logic ที่คุณต้องการ
+    bar_colors = []
+    for i, subject in enumerate(subjects):
+        score = scores[i]
+        
+        # เงื่อนไขการให้สีตามคะแนน
+        if score < 50:
+            color = "#E74C3C"  # แดง
+        elif 50 <= score < 80:
+            color = "#F1C40F"  # เหลือง
+        else:
+            color = "#2ECC71"  # เขียว
+
+        # เงื่อนไขการลบสี (ทำให้ bar โปร่ง) สำหรับบางวิชา
+        if classroom_type == 'stem_focused' and subject not in ['MATH', 'SCIENCE']:
+            color = "lightgray"
+        elif classroom_type == 'language_focused' and subject not in ['ENGLISH', 'THAI']:
+            color = "lightgray"
+
+        bar_colors.append(color)
+
+    fig = go.Figure()
+    
+    fig.add_trace(
+        go.Bar(
+            x=subject_names,
+            y=scores,
+            name=classroom_name,
+            marker_color=bar_colors,
+            text=[f'{score:.1f}' for score in scores],
+            textposition='auto',
+            textfont=dict(size=14, color='white', family='Arial Black')  # ข้อความชัดเจนขึ้น
+        )
+    )
+
+    fig.update_layout(
+        height=400,  # ความสูงที่เหมาะสมกับมือถือ
+        title_text=f"คะแนนแต่ละวิชาในห้องเรียน {classroom_name}",
+        title_x=0.5,
+        showlegend=False,
+        font=dict(size=12),
+        margin=dict(l=50, r=50, t=80, b=50)
+    )
+    
+    fig.update_yaxes(title_text="คะแนน", range=[0, 100])
+    fig.update_xaxes(title_text="วิชา")
+
+    fig.update_layout(dragmode=False)
+
+    return fig
+
+# ฟังก์ชันเดิมที่ยังคงใช้ได้ (สำหรับใครที่ต้องการดูแบบรวม)
+def create_interactive_scatter_plot(df, student_alias):
+    """สร้าง interactive scatter plot ด้วย Plotly (แสดงเฉพาะ target + simulated students)"""
+    comparison_df = prepare_data_for_analysis(df)
+    
+    classroom_types = ['stem_focused', 'language_focused', 'balanced_mixed', 'general']
+    classroom_names = ['STEM-Focused', 'Language-Focused', 'Balanced Mixed', 'General']
+
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=classroom_names,
+        specs=[[{"secondary_y": False}, {"secondary_y": False}],
+               [{"secondary_y": False}, {"secondary_y": False}]]
+    )
+
+    for idx, (classroom_type, name) in enumerate(zip(classroom_types, classroom_names)):
+        row = idx // 2 + 1
+        col = idx % 2 + 1
+        
+        classroom_data = comparison_df[comparison_df['CLASSROOM_TYPE'] == classroom_type]
+        target_student = classroom_data[classroom_data['ALIAS'] == student_alias]
+
+        # ✅ แสดงนักเรียนจำลอง (Simulated) ทุกคน
+        simulated_data = classroom_data[classroom_data['STUDENT_CATEGORY'] == 'Simulated']
+        trace_class = scatter_trace_class(len(simulated_data))
+        for tier in simulated_data['TIER'].unique():
+            tier_data = simulated_data[simulated_data['TIER'] == tier]
+            if len(tier_data) > 0:
+                fig.add_trace(
+                    trace_class(
+                        x=tier_data['STEM_AVG'],
+                        y=tier_data['LANGUAGE_AVG'],
+                        mode='markers',
+                        marker=dict(
+                            color=TIER_COLORS.get(tier, '#888888'),
+                            size=8,
+                            symbol='circle',
+                            opacity=0.6
+                        ),
+                        name=f'Simulated - {tier}',
+                        showlegend=True if idx == 0 else False,
+                        hovertemplate='<b>%{text}</b><br>STEM: %{x:.1f}<br>Language: %{y:.1f}<extra></extra>',
+                        text=tier_data['ALIAS']
+                    ),
+                    row=row, col=col
+                )
+
+        # ✅ แสดงเฉพาะนักเรียนที่เลือก
+        if len(target_student) > 0:
+            fig.add_trace(
+                trace_class(
+                    x=target_student['STEM_AVG'],
+                    y=target_student['LANGUAGE_AVG'],
+                    mode='markers',
+                    marker=dict(
+                        color='red',
+                        size=20,
+                        symbol='diamond',
+                        line=dict(width=2, color='white')
+                    ),
+                    name=f'{student_alias} (Target)',
+                    hovertemplate='<b>%{text}</b><br>STEM: %{x:.1f}<br>Language: %{y:.1f}<extra></extra>',
+                    text=target_student['ALIAS'],
+                    showlegend=True if idx == 0 else False
+                ),
+                row=row, col=col
+            )
+        
+        # เส้นอ้างอิง
+        fig.add_hline(y=50, line_dash="dash", line_color="red", opacity=0.5, row=row, col=col)
+        fig.add_vline(x=50, line_dash="dash", line_color="red", opacity=0.5, row=row, col=col)
+        fig.add_trace(
+            go.Scatter(
+                x=[0, 100], y=[0, 100],
+                mode='lines',
+                line=dict(dash='dot', color='gray', width=1),
+                showlegend=False,
+                hoverinfo='skip'
+            ),
+            row=row, col=col
+        )
+
+    fig.update_layout(
+        height=800,
+        title_text=f"Student Performance Analysis - {student_alias}",
+        title_x=0.5,
+        showlegend=True
+    )
+    
+    fig.update_xaxes(title_text="STEM Average (Math + Science)", range=[0, 100])
+    fig.update_yaxes(title_text="Language Average (English + Thai)", range=[0, 100])
+
+    # ปิด interaction
+    fig.update_layout(dragmode=False)
+    
+    return fig
+
+# ฟังก์ชันสร้างกราฟเปรียบเทียบคะแนนในแต่ละวิชา (เดิม)
+def create_subject_comparison(df, student_alias, selected_month, student_index=None):
+    """สร้างกราฟเปรียบเทียบคะแนนในแต่ละวิชา"""
+    student_data = select_student_rows(df, student_alias, selected_month, student_index)
+    
+    if len(student_data) == 0:
+        return None
+
+    subjects = ['MATH', 'SCIENCE', 'ENGLISH', 'THAI']
+    subject_names = ['คณิตศาสตร์', 'วิทยาศาสตร์', 'ภาษาอังกฤษ', 'ภาษาไทย']
+    
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=['STEM-Focused', 'Language-Focused', 'Balanced Mixed', 'General'],
+        specs=[[{"type": "bar"}, {"type": "bar"}],
+               [{"type": "bar"}, {"type": "bar"}]]
+    )
+
+    classroom_types = ['stem_focused', 'language_focused', 'balanced_mixed', 'general']
+    
+    for idx, classroom_type in enumerate(classroom_types):
+        row = idx // 2 + 1
+        col = idx % 2 + 1
+
+        classroom_student = student_data[student_data['CLASSROOM_TYPE'] == classroom_type]
+
+        if len(classroom_student) > 0:
+            scores = [classroom_student[subject].iloc[0] for subject in subjects]
+
+            # กำหนดสีรายแท่งตาม logic ที่คุณต้องการ
+            bar_colors = []
+            for i, subject in enumerate(subjects):
+                score = scores[i]
+                
+                # เงื่อนไขการให้สีตามคะแนน
+                if score < 50:
+                    color = "#E74C3C"  # แดง
+                elif 50 <= score < 80:
+                    color = "#F1C40F"  # เหลือง
+                else:
+                    color = "#2ECC71"  # เขียว
+
+                # เงื่อนไขการลบสี (ทำให้ bar โปร่ง) สำหรับบางวิชา
+                if classroom_type == 'stem_focused' and subject not in ['MATH', 'SCIENCE']:
+                    color = "lightgray"
+                elif classroom_type == 'language_focused' and subject not in ['ENGLISH', 'THAI']:
+                    color = "lightgray"
+
+                bar_colors.append(color)
+
+            fig.add_trace(
+                go.Bar(
+                    x=subject_names,
+                    y=scores,
+                    name=f'{classroom_type.replace("_", " ").title()}',
+                    marker_color=bar_colors,
+                    showlegend=False,
+                    text=[f'{score:.1f}' for score in scores],
+                    textposition='auto',
+                ),
+                row=row, col=col
+            )
+
+    fig.update_layout(
+        height=600,
+        title_text=f"Subject Scores Comparison - {student_alias} (Month {selected_month})",
+        title_x=0.5
+    )
+    
+    fig.update_yaxes(title_text="Score", range=[0, 100])
+
+    # ปิด interaction
+    fig.update_layout(dragmode=False)
+    
+    return fig
+
+def create_growth_trajectory_plot(history, student_alias):
+    """สร้างกราฟพัฒนาการคะแนนเฉลี่ย STEM / ภาษา / รวม ของนักเรียนตามเดือนที่ประเมิน"""
+    if len(history) == 0:
+        return None
+
+    fig = go.Figure()
+    for column, name, color in [
+        ('STEM_AVG', 'STEM', '#1f77b4'),
+        ('LANGUAGE_AVG', 'ภาษา', '#ff7f0e'),
+        ('OVERALL_AVG', 'เฉลี่ยรวม', '#2ca02c'),
+    ]:
+        if column not in history.columns:
+            continue
+        fig.add_trace(go.Scatter(
+            x=history['PERIOD'],
+            y=history[column],
+            mode='lines+markers+text',
+            name=name,
+            line=dict(color=color, width=3, dash='dot' if column == 'OVERALL_AVG' else 'solid'),
+            text=[f'{value:.1f}' for value in history[column]],
+            textposition='top center',
+        ))
+
+    fig.update_layout(
+        height=400,
+        title_text=f"Growth Trajectory - {student_alias}",
+        title_x=0.5,
+        xaxis_title="Month",
+        yaxis_title="Average Score",
+        dragmode=False,
+    )
+    fig.update_xaxes(type='category')
+    fig.update_yaxes(range=[0, 105])
+
+    return fig
+
+# คอลัมน์คะแนนในตารางสรุป (คอลัมน์ใน DataFrame -> ชื่อที่แสดง) เก็บเป็นตัวเลข และจัดรูปแบบตอนแสดงผล
+SUMMARY_SCORE_COLUMNS = {
+    'MATH': 'Math',
+    'SCIENCE': 'Science',
+    'ENGLISH': 'English',
+    'THAI': 'Thai',
+    'STEM_AVG': 'STEM Avg',
+    'LANGUAGE_AVG': 'Language Avg',
+    'OVERALL_AVG': 'Overall Avg',
+}
+
+
+def build_summary_frame(prepared_data, neighbor_index=None):
+    """สร้างตารางสรุปจากแถวที่เตรียมแล้วด้วย column operations (คงชนิดข้อมูลตัวเลขไว้)"""
+    summary = pd.DataFrame({
+        'Classroom Type': prepared_data['CLASSROOM_TYPE'].astype(str).str.replace('_', ' ').str.title(),
+        **{name: prepared_data[column] for column, name in SUMMARY_SCORE_COLUMNS.items()},
+        'Tier': prepared_data['TIER'].astype(object),
+        'Rank': prepared_data['RANK'],
+    })
+    if neighbor_index is not None:
+        summary['Nearest Tier'] = neighbor_index.nearest_tiers(prepared_data)
+    return summary.reset_index(drop=True)
+
+def create_summary_table(df, student_alias, selected_month, student_index=None, neighbor_index=None):
+    """
+    สร้างตารางสรุปผลการประเมิน
+    ถ้าระบุ neighbor_index จะเพิ่มคอลัมน์ Nearest Tier (TIER ส่วนใหญ่ของนักเรียนจำลองที่ใกล้ที่สุด)
+    """
+    student_data = select_student_rows(df, student_alias, selected_month, student_index)
+    
+    if len(student_data) == 0:
+        return None
+    
+    return build_summary_frame(prepare_data_for_analysis(student_data), neighbor_index)
+
+def create_level_summary_table(df, selected_month=None, neighbor_index=None):
+    """
+    ตารางสรุปของนักเรียนจริงทุกคนในระดับชั้นในครั้งเดียว (ใช้กับการ export และ dashboard)
+    มีคอลัมน์ Student และ Month เพิ่มจาก create_summary_table
+    """
+    prepared_data = prepare_data_for_analysis(df)
+    real_data = prepared_data[~prepared_data['IS_SIMULATED']]
+    if selected_month is not None:
+        real_data = real_data[real_data['MONTH'] == selected_month]
+
+    summary = build_summary_frame(real_data, neighbor_index)
+    summary.insert(0, 'Student', real_data['ALIAS'].astype(str).to_numpy())
+    summary.insert(1, 'Month', real_data['MONTH'].astype(str).to_numpy())
+    return summary
+
+def summarize_level_summary_table(level_summary):
+    """
+    สรุปผลรายคนจาก create_level_summary_table ด้วย groupby ครั้งเดียว:
+    ห้องเรียนจำลองที่ดีที่สุด (Rank ต่ำสุด ไม่รวม General) และผลในห้องเรียน General
+    """
+    keys = ['Student', 'Month']
+    simulated = level_summary[level_summary['Classroom Type'] != 'General']
+    best = simulated.loc[simulated.groupby(keys)['Rank'].idxmin(), keys + ['Classroom Type', 'Tier', 'Rank']]
+    best.columns = keys + ['Best Classroom', 'Best Tier', 'Best Rank']
+
+    general = level_summary.loc[level_summary['Classroom Type'] == 'General', keys + ['Overall Avg', 'Tier']]
+    general.columns = keys + ['General Overall Avg', 'General Tier']
+
+    return best.merge(general, on=keys, how='outer').reset_index(drop=True)
+
+def split_level_summary_table(level_summary):
+    """
+    แยกตารางจาก create_level_summary_table เป็นตารางของแต่ละคน (เหมือน create_summary_table)
+    คืนค่า dict ของ (Student, Month) -> DataFrame
+    """
+    return {
+        key: table.drop(columns=['Student', 'Month']).reset_index(drop=True)
+        for key, table in level_summary.groupby(['Student', 'Month'], sort=False)
+    }
+
+def create_summarize_from_summary_table(summary_df):
+    """สร้างข้อความ markdown สำหรับสรุปผล"""
+    if summary_df is None or len(summary_df) == 0:
+        return "⚠️ ไม่พบข้อมูลนักเรียน"
+
+    # คำอธิบายแต่ละระดับ TIER
+    tier_descriptions = {
+        'Diamond': "อยู่ใกล้นักเรียนอัจฉริยะ คาดว่า นักเรียนมีความสามารถเหมาะสมในห้องเรียนนี้",
+        'Platinum': "อยู่ใกล้นักเรียนเก่ง คาดว่า นักเรียนสามารถเรียนในห้องเรียนนี้ได้และจะพัฒนาได้ดีในห้องเรียนนี้",
+        'Gold': "อยู่ใกล้นักเรียนดี คาดว่า  นักเรียนสามารถเรียนในห้องเรียนนี้ได้",
+        'Silver': "อยู่ใกล้นักเรียนพอใช้ คาดว่า นักเรียนสามารถเรียนในห้องเรียนนี้ได้ แต่ต้องพัฒนาตัวเองอย่างสม่ำเสมอ",
+        'Bronze': "อยู่ใกล้นักเรียนที่ต้องพัฒนา คาดว่า นักเรียนต้องพัฒนาตัวเองให้มากกว่าเดิม"
+    }
+
+    # กรองเฉพาะห้องเรียนจำลอง (ไม่รวม 'General')
+    simulated_df = summary_df[summary_df['Classroom Type'] != 'General']
+    
+    # หา Overall Avg สูงสุดในห้องเรียนจำลอง
+    best_row = simulated_df.loc[simulated_df['Rank'].idxmin()]
+    best_classroom = best_row['Classroom Type']
+    best_score = best_row['Overall Avg']
+    best_tier = best_row['Tier']
+    detail_best_tier = tier_descriptions.get(best_tier, "ไม่มีคำอธิบาย")
+
+    # หาค่าจากห้องเรียนทั่วไป
+    general_row = summary_df[summary_df['Classroom Type'] == 'General'].iloc[0]
+    general_score = general_row['Overall Avg']
+    general_tier = general_row['Tier']
+    detail_general_tier = tier_descriptions.get(general_tier, "ไม่มีคำอธิบาย")
+
+    markdown_text = f"""
+        ### 🧠 สรุปผลการจำลองศักยภาพนักเรียน
+
+        1. หากวัดจากในห้องเรียนจำลองทั้งหมด:  
+        นักเรียนมีผลการเรียนที่ดีที่สุดในห้องเรียน **{best_classroom}**  
+        อยู่ในระดับใกล้เคียงกับ **{best_tier}** → _{detail_best_tier}_
+
+        2. หากวัดจากห้องเรียนทั่วไปตามมาตรฐาน:  
+        นักเรียนจะมีคะแนนเฉลี่ย **{general_score:.1f}**  
+        อยู่ในระดับใกล้เคียงกับ **{general_tier}** → _{detail_general_tier}_
+        """
+    return markdown_text
+
+
+# ฟังก์ชันเดิมที่ปรับปรุงเล็กน้อย (สำหรับใครที่ยังต้องการใช้)
+def plot_classroom_cluster(df):
+    """Interactive Scatter Plot (Plotly) แสดง STEM vs Language พร้อม Zoning และ Cluster ถ้ามี"""
+    
+    cluster_df = prepare_data_for_analysis(df)
+
+    cluster_colors = {
+        'Very High': "#00ff2f",
+        'High': "#8e44ad",
+        'Medium': "#f1c40f",
+        'Low': "#5dade2",
+        'Very Low': "#c0392b"
+    }
+
+    zones = [
+        (0, 50, 0, 50, "Warning Zone", "#f9ebea"),
+        (0, 50, 50, 80, "STEM Support", "#fef9e7"),
+        (0, 50, 80, 100, "Language Expert", "#eafaf1"),
+        (50, 80, 0, 50, "Language Support", "#fef5e7"),
+        (50, 80, 50, 80, "Development Zone", "#e8f8f5"),
+        (80, 100, 0, 50, "STEM Expert", "#f4ecf7"),
+        (80, 100, 50, 80, "STEM Strong", "#e8daef"),
+        (50, 80, 80, 100, "Language Strong", "#eaf2f8"),
+        (80, 100, 80, 100, "Perfect Zone", "#d4efdf")
+    ]
+
+    fig = go.Figure()
+
+    # วาด zoning พื้นหลัง
+    for xmin, xmax, ymin, ymax, label, color in zones:
+        fig.add_shape(
+            type="rect",
+            x0=xmin, x1=xmax,
+            y0=ymin, y1=ymax,
+            fillcolor=color,
+            opacity=0.3,
+            line_width=0
+        )
+        fig.add_annotation(
+            x=(xmin + xmax)/2,
+            y=(ymin + ymax)/2,
+            text=label,
+            showarrow=False,
+            font=dict(size=10, color="black")
+        )
+
+    # ตรวจสอบว่ามี column CLUSTER และมีค่าไม่ใช่ NaN หรือไม่
+    use_cluster = 'CLUSTER' in cluster_df.columns and cluster_df['CLUSTER'].notna().sum() > 0
+    trace_class = scatter_trace_class(len(cluster_df))
+
+    if use_cluster:
+        # วาดตาม cluster
+        for cluster, group in cluster_df.groupby('CLUSTER'):
+            fig.add_trace(trace_class(
+                x=group['STEM_AVG'],
+                y=group['LANGUAGE_AVG'],
+                mode='markers',
+                name=cluster,
+                marker=dict(
+                    size=20,
+                    color=cluster_colors.get(cluster, "#888888"),
+                    symbol='diamond',
+                    line=dict(width=1, color='white')
+                ),
+                text=group.get('STUDENT_NAME', None),
+                hoverinfo='text+x+y'
+            ))
+    else:
+        # ไม่มี cluster — วาดแบบปกติ
+        fig.add_trace(trace_class(
+            x=cluster_df['STEM_AVG'],
+            y=cluster_df['LANGUAGE_AVG'],
+            mode='markers',
+            name="Students",
+            marker=dict(
+                color='red',
+                size=20,
+                symbol='diamond',
+                line=dict(width=1, color='white')
+            ),
+            text=cluster_df.get('STUDENT_NAME', None),
+            hoverinfo='text+x+y'
+        ))
+
+    # เส้นแบ่ง
+    fig.add_shape(type="line", x0=50, x1=50, y0=0, y1=100,
+                  line=dict(color="red", dash="dash", width=1))
+    fig.add_shape(type="line", x0=80, x1=80, y0=0, y1=100,
+                  line=dict(color="gray", dash="dot", width=1))
+    fig.add_shape(type="line", x0=0, x1=100, y0=50, y1=50,
+                  line=dict(color="red", dash="dash", width=1))
+    fig.add_shape(type="line", x0=0, x1=100, y0=80, y1=80,
+                  line=dict(color="gray", dash="dot", width=1))
+    fig.add_shape(type="line", x0=0, x1=100, y0=0, y1=100,
+                  line=dict(color="gray", dash="dot", width=1))
+
+    fig.update_layout(
+        title='Student Performance by Zone' + (" and Cluster" if use_cluster else ""),
+        xaxis=dict(title='STEM Average (Math + Science)', range=[0, 100]),
+        yaxis=dict(title='Language Average (English + Thai)', range=[0, 100]),
+        plot_bgcolor='white',
+        legend_title='Cluster' if use_cluster else 'Students',
+        height=700
+    )
+
+    # ปิด interaction
+    fig.update_layout(dragmode=False)
+
+    return fig
+
+
+# ห้องเรียนจำลองที่แสดงในส่วน Simulation (ชื่อปุ่ม, ประเภทห้อง, ชื่อห้อง, หัวข้อ, คำอธิบาย)
+CLASSROOM_TABS = [
+    ("🔬 STEM-Focused", "stem_focused", "STEM-Focused",
+     "#### 🔬 ห้องเรียน STEM-Focused", "**เน้นพัฒนาด้านการคิดวิเคราะห์และแก้ปัญหาจากการทดลอง**"),
+    ("📚 Language-Focused", "language_focused", "Language-Focused",
+     "#### 📚 ห้องเรียน Language-Focused", "**เน้นพัฒนาด้านภาษาและการใช้เหตุผล**"),
+    ("⚖️ Balanced Mixed", "balanced_mixed", "Balanced Mixed",
+     "#### ⚖️ ห้องเรียน Balanced Mixed", "**เน้นการบูรณาการความรู้จากหลายวิชา**"),
+    ("🏫 General", "general", "General",
+     "#### 🏫 ห้องเรียน General", "**ห้องเรียนตามมาตรฐาน (มีนักเรียนเรียนเก่ง, เรียนปานกลาง และ เรียนพอใช้ ปนกันไป)**"),
+]
+
+
+def read_level_sheets(levels, month, sheet_names, refresh=True, precomputed=False):
+    """
+    อ่านหลาย sheet ของระดับชั้นจาก snapshot เดียวกัน พร้อมคอลัมน์ที่คำนวณแล้ว (ไม่มี cache และไม่เรียก st.*)
+    ไฟล์ excel ถูกเปิดครั้งเดียวตอนสร้าง snapshot (ทุก sheet ในรอบเดียว) ไม่ว่าจะอ่านกี่ sheet
+    refresh=False ใช้ snapshot ที่มีอยู่โดยไม่ตรวจไฟล์ต้นฉบับ (ให้ SnapshotWatcher เป็นผู้แปลงไฟล์ใหม่)
+    และ raise data_store.SnapshotNotReady ถ้ายังไม่มี snapshot
+    precomputed=True ใช้เฉพาะผลการจัดกลุ่มที่บันทึกไว้ตอน ingest (ไม่ปรับโมเดล) และ raise SnapshotNotReady ถ้ายังไม่มี
+    คืนค่า dict ของ sheet -> DataFrame
+    """
+    # หาตำแหน่งไฟล์ที่แน่นอน
+    file_path = data_store.export_path(levels, month)
+    if not file_path.exists():
+        raise FileNotFoundError(2, "No such file", str(file_path))
+
+    # อ่านจาก snapshot (Arrow) แทนการ parse excel ทุกครั้ง
+    if refresh:
+        data_store.ensure_snapshot(file_path)
+    elif data_store.current_snapshot(file_path) is None:
+        # ไม่ parse ไฟล์ใน thread ของ request (ไฟล์อาจยัง copy ไม่เสร็จ) รอ watcher สร้างและตรวจ snapshot
+        raise data_store.SnapshotNotReady(file_path.name)
+
+    sheets = {}
+    for sheet_name in sheet_names:
+        df = data_store.read_snapshot_sheet(file_path, sheet_name)
+        # snapshot ลดขนาด dtype ไว้แล้วตอน ingest ลดขนาดเฉพาะคอลัมน์ที่เพิ่มหรือเปลี่ยนหลังอ่าน
+        snapshot_dtypes = df.dtypes.to_dict()
+        if sheet_name.startswith("OurStudent_"):
+            # กลุ่มนักเรียน (CLUSTER) ที่คำนวณตอน ingest สำหรับไฟล์ export ที่ไม่มีคอลัมน์นี้มา
+            if precomputed:
+                clusters = data_store.read_clusters(file_path)
+                if clusters is None:
+                    raise data_store.SnapshotNotReady(file_path.name)
+            else:
+                clusters = data_store.ensure_clusters(file_path)
+            df = data_store.apply_clusters(df, clusters)
+        df["LEVEL"] = sheet_name
+        df = data_store.enrich_frame(df)
+        df = analytics.add_zone_column(df)
+        sheets[sheet_name] = data_store.compact_frame(
+            df, [column for column in df.columns if snapshot_dtypes.get(column) != df[column].dtype]
+        )
+    return sheets
+
+
+def read_level_sheet(levels, sheet_name, month, refresh=True):
+    """อ่าน sheet เดียวของระดับชั้น (ดู read_level_sheets) ใช้ได้ทั้งในหน้าเว็บและในสคริปต์แบบ headless"""
+    return read_level_sheets(levels, month, [sheet_name], refresh)[sheet_name]
+
+
+def level_sheet_names(level):
+    return ["Analysis_" + level, "OurStudent_" + level]
+
+
+# ชื่อประเภทห้องเรียนที่แสดงในภาพรวมระดับชั้น
+CLASSROOM_TYPE_NAMES = {
+    'stem_focused': 'STEM-Focused',
+    'language_focused': 'Language-Focused',
+    'balanced_mixed': 'Balanced Mixed',
+    'general': 'General',
+}
+
+def create_cohort_figures(cohort_stats):
+    """สร้างกราฟภาพรวมระดับชั้นจากผลของ analytics.cohort_statistics (ไม่คำนวณข้อมูลใหม่)"""
+    figures = {}
+
+    # การกระจายของ TIER ในแต่ละห้องเรียน (นักเรียนจำลอง)
+    tiers = cohort_stats['tiers']
+    if not tiers.empty:
+        tiers = tiers[tiers['STUDENT_CATEGORY'] == 'Simulated']
+        classroom_names = tiers['CLASSROOM_TYPE'].map(CLASSROOM_TYPE_NAMES)
+        fig = go.Figure()
+        for tier, color in TIER_COLORS.items():
+            if tier in tiers.columns:
+                fig.add_trace(go.Bar(x=classroom_names, y=tiers[tier], name=tier, marker_color=color))
+        fig.update_layout(barmode='stack', height=400, title_text="Tier Distribution by Classroom", title_x=0.5,
+                          yaxis_title="จำนวนนักเรียน", dragmode=False)
+        figures['tiers'] = fig
+
+    # คะแนนเฉลี่ยแต่ละวิชา แยกนักเรียนจริง / จำลอง
+    scores = cohort_stats['scores']
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=1, cols=2, subplot_titles=['Real Students', 'Simulated Students'], shared_yaxes=True)
+    for col, category in enumerate(['Real', 'Simulated'], start=1):
+        category_scores = scores[scores['STUDENT_CATEGORY'] == category]
+        for subject, subject_name in OVERVIEW_SUBJECTS:
+            fig.add_trace(
+                go.Bar(
+                    x=category_scores['CLASSROOM_TYPE'].map(CLASSROOM_TYPE_NAMES),
+                    y=category_scores[subject],
+                    name=subject_name,
+                    legendgroup=subject,
+                    showlegend=col == 1,
+                    text=[f'{score:.1f}' for score in category_scores[subject]],
+                    textposition='auto',
+                ),
+                row=1, col=col,
+            )
+    fig.update_layout(barmode='group', height=450, title_text="Mean Subject Scores by Classroom", title_x=0.5,
+                      dragmode=False)
+    fig.update_yaxes(range=[0, 100])
+    figures['scores'] = fig
+
+    # จำนวนนักเรียนในแต่ละพื้นที่ (Zoning) ของแต่ละห้องเรียน
+    zones = cohort_stats['zones']
+    simulated_zones = zones[zones['STUDENT_CATEGORY'] == 'Simulated']
+    zone_names = analytics.ZONE_NAMES
+    fig = go.Figure(go.Heatmap(
+        z=simulated_zones[zone_names].to_numpy(),
+        x=zone_names,
+        y=simulated_zones['CLASSROOM_TYPE'].map(CLASSROOM_TYPE_NAMES),
+        colorscale='Blues',
+        text=simulated_zones[zone_names].to_numpy(),
+        texttemplate='%{text}',
+        colorbar=dict(title="นักเรียน"),
+    ))
+    fig.update_layout(height=400, title_text="Zone Occupancy by Classroom (Simulated)", title_x=0.5, dragmode=False)
+    figures['zones'] = fig
+
+    # เวลาเรียนเทียบกับคะแนนเฉลี่ย (ขนาดจุด = จำนวนนักเรียน)
+    time_vs_score = cohort_stats['time_vs_score']
+    if not time_vs_score.empty:
+        fig = go.Figure()
+        max_count = max(time_vs_score['count'].max(), 1)
+        for subject, subject_name in OVERVIEW_SUBJECTS:
+            subject_rows = time_vs_score[time_vs_score['SUBJECT'] == subject]
+            fig.add_trace(go.Scatter(
+                x=subject_rows['TIME_HR'],
+                y=subject_rows['mean'],
+                mode='lines+markers',
+                name=subject_name,
+                marker=dict(size=10 + 30 * subject_rows['count'] / max_count),
+                customdata=subject_rows['count'],
+                hovertemplate="%{x} ชั่วโมง<br>คะแนนเฉลี่ย %{y:.1f}<br>นักเรียน %{customdata} คน<extra></extra>",
+            ))
+        fig.update_layout(height=400, title_text="Time on Subject vs. Score (Real Students)", title_x=0.5,
+                          xaxis_title="เวลาเรียน (ชั่วโมง)", yaxis_title="คะแนนเฉลี่ย", dragmode=False)
+        fig.update_yaxes(range=[0, 105])
+        figures['time_vs_score'] = fig
+
+    return figures
+
+
+# ชื่อวิชาที่ใช้ในส่วนภาพรวม (คอลัมน์, ชื่อภาษาไทย)
+OVERVIEW_SUBJECTS = [
+    ("MATH", "วิชาคณิตศาสตร์"),
+    ("SCIENCE", "วิทยาศาสตร์"),
+    ("ENGLISH", "ภาษาอังกฤษ"),
+    ("THAI", "ภาษาไทย"),
+]
+
+def create_overview_metrics(student_data):
+    """คำนวณคะแนนเฉลี่ยรวม/STEM/ภาษา และเวลาเรียน (นาที) กับหัวข้อที่ทดสอบของแต่ละวิชา"""
+    prepared_data = prepare_data_for_analysis(student_data)
+    return {
+        'avg_overall': float(prepared_data['OVERALL_AVG'].mean()),
+        'avg_stem': float(prepared_data['STEM_AVG'].mean()),
+        'avg_language': float(prepared_data['LANGUAGE_AVG'].mean()),
+        'subjects': {
+            subject: {
+                'minutes': float(student_data[f'{subject}_TIME_HR'].unique()[0] * 60),
+                'topic': student_data[f'{subject}_TOPICS'].unique()[0],
+            }
+            for subject, _ in OVERVIEW_SUBJECTS
+        },
+    }
+
+def create_teacher_notes(student_data):
+    """ดึงผลประเมินจากครู (จุดแข็ง / ด้านที่ควรพัฒนา) จากแถวแรกของนักเรียน (None ถ้าไม่มีข้อมูล)"""
+    teacher_data = student_data.iloc[0]  # เอาแค่ row แรก
+    return {
+        column: teacher_data[column] if pd.notna(teacher_data[column]) else None
+        for column in ['GOOD_AT', 'IMPROVE_ON']
+    }
+
+def build_student_report(df, df_our_students, student_alias, selected_month, student_index=None,
+                         our_student_index=None, neighbor_index=None, snapshot_key=None, summary_df=None):
+    """
+    รวมเนื้อหารายงานของนักเรียนหนึ่งคนแบบไม่เรียก st.* (ใช้กับการสร้างรายงานแบบ batch)
+    summary_df: ตารางสรุปที่สร้างไว้แล้วทั้งระดับชั้น (ดู split_level_summary_table) ถ้าไม่ระบุจะสร้างเฉพาะคนนี้
+    คืนค่า None ถ้าไม่พบข้อมูลนักเรียนในเดือนที่เลือก
+    """
+    student_data = select_student_rows(df, student_alias, selected_month, student_index)
+    if len(student_data) == 0:
+        return None
+    student_data_in_class = select_student_rows(df_our_students, student_alias, selected_month, our_student_index)
+
+    classroom_figures = {}
+    # trace ของนักเรียนบน scatter plot แยกไว้ (serialize_student_report เก็บเฉพาะส่วนนี้ ไม่เก็บกราฟพื้นหลังซ้ำทุกคน)
+    scatter_overlays = {}
+    for _, classroom_type, classroom_name, _, _ in CLASSROOM_TABS:
+        scatter = classroom_scatter_base(df, classroom_type, classroom_name, student_index, snapshot_key)
+        overlay = student_scatter_traces(df, student_alias, classroom_type, student_index, uses_webgl(scatter))
+        scatter.add_traces(overlay)
+        classroom_figures[classroom_type] = {
+            'subject': create_single_subject_comparison(df, student_alias, selected_month, classroom_type, classroom_name, student_index),
+            'scatter': scatter,
+        }
+        scatter_overlays[classroom_type] = overlay
+
+    if summary_df is None:
+        summary_df = create_summary_table(df, student_alias, selected_month, student_index, neighbor_index)
+    zone = None
+    if len(student_data_in_class) > 0 and pd.notna(student_data_in_class['ZONE'].iloc[0]):
+        zone = student_data_in_class['ZONE'].iloc[0]
+
+    return {
+        'alias': student_alias,
+        'month': selected_month,
+        'overview': create_overview_metrics(student_data),
+        'zone': zone,
+        'zoning_figure': plot_classroom_cluster(student_data_in_class),
+        'classroom_figures': classroom_figures,
+        'scatter_overlays': scatter_overlays,
+        'summary_table': summary_df,
+        'summary_text': create_summarize_from_summary_table(summary_df),
+        'teacher_notes': create_teacher_notes(student_data),
+    }
+
+# รายงานที่สร้างไว้ล่วงหน้าหลัง ingest (เก็บใน shared_cache)
+REPORT_CACHE_NAMESPACE = "student_report"
+
+
+def student_report_key(level, export_month, snapshot_version, student_alias, selected_month):
+    return (level, export_month, snapshot_version, str(student_alias), str(selected_month))
+
+
+def serialize_student_report(report):
+    """
+    แปลงผลของ build_student_report เป็น dict ที่บันทึกเป็น JSON ได้ (figure เป็น Plotly JSON)
+    scatter plot เก็บเฉพาะ trace ของนักเรียน (scatter_overlay) กราฟพื้นหลังของห้องเรียนใช้ร่วมกันจาก get_classroom_base_figure
+    """
+    from plotly.io.json import to_json_plotly
+
+    def figure_json(fig):
+        return None if fig is None else json.loads(fig.to_json())
+
+    def traces_json(traces):
+        return [json.loads(to_json_plotly(trace.to_plotly_json())) for trace in traces]
+
+    summary_table = None
+    if report['summary_table'] is not None:
+        summary_table = json.loads(report['summary_table'].to_json(orient='split', index=False))
+
+    return {
+        'alias': str(report['alias']),
+        'month': str(report['month']),
+        'overview': {
+            **{key: report['overview'][key] for key in ['avg_overall', 'avg_stem', 'avg_language']},
+            'subjects': {
+                subject: {'minutes': values['minutes'], 'topic': str(values['topic'])}
+                for subject, values in report['overview']['subjects'].items()
+            },
+        },
+        'zone': None if report['zone'] is None else str(report['zone']),
+        'zoning_figure': figure_json(report['zoning_figure']),
+        'classroom_figures': {
+            classroom_type: {
+                'subject': figure_json(figures['subject']),
+                'scatter_overlay': traces_json(report['scatter_overlays'][classroom_type]),
+            }
+            for classroom_type, figures in report['classroom_figures'].items()
+        },
+        'summary_table': summary_table,
+        'summary_text': report['summary_text'],
+        'teacher_notes': {key: None if value is None else str(value) for key, value in report['teacher_notes'].items()},
+    }
+
+
+def expand_student_report(payload, base_figure):
+    """
+    แทน scatter_overlay ใน payload ด้วย Plotly JSON ของ scatter plot เต็ม (กราฟพื้นหลัง + trace ของนักเรียน)
+    base_figure(classroom_type, classroom_name) คืน Plotly JSON ของกราฟพื้นหลัง (เช่น get_classroom_base_figure)
+    """
+    classroom_names = {classroom_type: classroom_name for _, classroom_type, classroom_name, _, _ in CLASSROOM_TABS}
+
+    def scatter(classroom_type, overlay):
+        base = base_figure(classroom_type, classroom_names[classroom_type])
+        # list ใหม่ ไม่แก้ไข dict ของกราฟพื้นหลังที่อยู่ใน cache
+        return {**base, 'data': list(base['data']) + overlay}
+
+    return {
+        **payload,
+        'classroom_figures': {
+            classroom_type: {'subject': figures['subject'], 'scatter': scatter(classroom_type, figures['scatter_overlay'])}
+            for classroom_type, figures in payload['classroom_figures'].items()
+        },
+    }
+
+
+def deserialize_student_report(payload, base_figure):
+    """แปลง dict จาก serialize_student_report กลับเป็นรูปแบบเดียวกับ build_student_report (ดู expand_student_report)"""
+    def figure(spec):
+        return None if spec is None else go.Figure(spec, _validate=False)
+
+    payload = expand_student_report(payload, base_figure)
+    summary_table = None
+    if payload['summary_table'] is not None:
+        summary_table = pd.DataFrame(payload['summary_table']['data'], columns=payload['summary_table']['columns'])
+
+    return {
+        **payload,
+        'zoning_figure': figure(payload['zoning_figure']),
+        'classroom_figures': {
+            classroom_type: {kind: figure(spec) for kind, spec in figures.items()}
+            for classroom_type, figures in payload['classroom_figures'].items()
+        },
+        'summary_table': summary_table,
+    }
+
+
+def get_cached_student_report(level, export_month, snapshot_version, student_alias, selected_month, base_figure):
+    """รายงานที่สร้างไว้ล่วงหน้า (None ถ้ายังไม่มี ให้สร้างทีละส่วนตามปกติ)"""
+    payload = shared_cache.read_json(
+        REPORT_CACHE_NAMESPACE, student_report_key(level, export_month, snapshot_version, student_alias, selected_month)
+    )
+    return None if payload is None else deserialize_student_report(payload, base_figure)
+
+
+def load_level(level, month, refresh=True, precomputed=False):
+    """
+    โหลดข้อมูลและดัชนีของระดับชั้นครั้งเดียว สำหรับใช้สร้างรายงานทุกคน
+    refresh=False ใช้ snapshot ที่มีอยู่ (raise data_store.SnapshotNotReady ถ้ายังไม่มี) ดู read_level_sheets
+    precomputed=True ใช้เฉพาะผลการจัดกลุ่มและดัชนีนักเรียนจำลองที่สร้างไว้แล้ว (ดู prepare_level_artifacts)
+    ไม่คำนวณเอง และ raise data_store.SnapshotNotReady ถ้ายังไม่มี
+    """
+    analysis_sheet = "Analysis_" + level
+    our_student_sheet = "OurStudent_" + level
+    source_path = data_store.export_path(level, month)
+
+    sheets = read_level_sheets(level, month, [analysis_sheet, our_student_sheet], refresh, precomputed)
+    df, df_our_students = sheets[analysis_sheet], sheets[our_student_sheet]
+    snapshot_version = data_store.current_snapshot(source_path)["version"]
+    if precomputed:
+        neighbor_index = analytics.read_neighbor_index(source_path, analysis_sheet)
+        if neighbor_index is None:
+            raise data_store.SnapshotNotReady(source_path.name)
+    else:
+        neighbor_index = analytics.load_neighbor_index(source_path, analysis_sheet, df)
+
+    return {
+        "level": level,
+        "month": month,
+        "df": df,
+        "df_our_students": df_our_students,
+        "student_index": data_store.StudentIndex(df),
+        "our_student_index": data_store.StudentIndex(df_our_students),
+        "neighbor_index": neighbor_index,
+        "snapshot_key": (level, month, snapshot_version),
+    }
+
+
+def prepare_level_artifacts(level, month):
+    """
+    สร้างผลการจัดกลุ่มและดัชนีนักเรียนจำลองของ snapshot ปัจจุบันแล้วบันทึกคู่กับ snapshot
+    เรียกหลัง ingest (เช่น on_snapshot ของ SnapshotWatcher) เพื่อให้ load_level(precomputed=True) อ่านได้ทันที
+    """
+    source_path = data_store.export_path(level, month)
+    analysis_sheet = "Analysis_" + level
+    data_store.ensure_clusters(source_path)
+    analytics.load_neighbor_index(source_path, analysis_sheet, read_level_sheet(level, analysis_sheet, month, refresh=False))
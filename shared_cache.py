@@ -0,0 +1,230 @@
+"""
+cache ผลลัพธ์บนดิสก์ (SQLite) ที่ใช้ร่วมกันได้หลาย process บนเครื่องเดียวกัน
+เช่น Streamlit หลาย replica, batch_reports และ worker ต่างๆ
+
+key ประกอบด้วยชื่อกลุ่ม (namespace), เวอร์ชันของโค้ด (CODE_VERSION) และ argument ทั้งหมด ซึ่งต้องมีเวอร์ชันของ snapshot อยู่ด้วย
+deploy โค้ดใหม่จึงไม่ได้ผลลัพธ์ที่คำนวณด้วยโค้ดเดิม (รายการเดิมจะถูกลบออกตาม LRU)
+เมื่อขนาดรวมเกิน max_bytes จะลบรายการที่ไม่ได้ใช้นานที่สุดออกก่อน (LRU)
+"""
+import hashlib
+import importlib.metadata
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import pyarrow as pa
+
+import data_store
+
+CACHE_PATH = data_store.DATA_DIR / ".cache" / "results.sqlite"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# ปิดการใช้งานได้ด้วย BEWDAR_SHARED_CACHE=0
+ENABLED = os.environ.get("BEWDAR_SHARED_CACHE", "1") != "0"
+
+# ไฟล์โค้ดและ library ที่กำหนดค่าที่เก็บใน cache (DataFrame, กราฟ, รายงาน)
+CODE_FILES = ["app.py", "analytics.py", "data_store.py", "frame_cache.py", "report_builder.py", "shared_cache.py"]
+CODE_PACKAGES = ["pandas", "pyarrow", "plotly", "scikit-learn"]
+
+
+def _code_version():
+    """hash ของไฟล์ใน CODE_FILES และเวอร์ชันของ CODE_PACKAGES"""
+    digest = hashlib.sha256()
+    for name in CODE_FILES:
+        digest.update((Path(__file__).parent / name).read_bytes())
+    for package in CODE_PACKAGES:
+        try:
+            digest.update(f"{package}=={importlib.metadata.version(package)}".encode("utf-8"))
+        except importlib.metadata.PackageNotFoundError:
+            digest.update(f"{package}==".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+CODE_VERSION = _code_version()
+
+
+class SharedCache:
+    """
+    cache แบบ key-value บน SQLite (WAL) จำกัดขนาดรวมด้วย LRU
+    หนึ่ง connection ต่อ thread จึงใช้ร่วมกันได้ทั้งใน thread และข้าม process
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " namespace TEXT NOT NULL,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_key(namespace, key_parts):
+        digest = hashlib.sha256(repr((namespace, CODE_VERSION, tuple(key_parts))).encode("utf-8")).hexdigest()
+        return f"{namespace}:{digest}"
+
+    def get(self, key):
+        """คืนค่า bytes ที่เก็บไว้ (None ถ้าไม่มี) และอัปเดตเวลาใช้งานล่าสุด"""
+        connection = self._connection()
+        row = connection.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def contains(self, key):
+        """มี key นี้หรือไม่ (ไม่อ่านค่าและไม่อัปเดตเวลาใช้งานล่าสุด)"""
+        row = self._connection().execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def set(self, key, value):
+        """บันทึก bytes แล้วลบรายการเก่าที่สุดจนขนาดรวมไม่เกิน max_bytes"""
+        namespace = key.split(":", 1)[0]
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, namespace, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, namespace, sqlite3.Binary(value), len(value), time.time()),
+        )
+        self._evict(connection)
+
+    def _evict(self, connection):
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        removed = 0
+        stale_keys = []
+        for key, size in connection.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            stale_keys.append((key,))
+            removed += size
+            if removed >= excess:
+                break
+        connection.executemany("DELETE FROM entries WHERE key = ?", stale_keys)
+
+    def clear(self, namespace=None):
+        connection = self._connection()
+        if namespace is None:
+            connection.execute("DELETE FROM entries")
+        else:
+            connection.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def stats(self):
+        """จำนวนรายการและขนาดรวมแยกตาม namespace"""
+        rows = self._connection().execute(
+            "SELECT namespace, COUNT(*), SUM(size) FROM entries GROUP BY namespace"
+        ).fetchall()
+        return {namespace: {"entries": count, "bytes": size} for namespace, count, size in rows}
+
+    def get_or_compute(self, namespace, key_parts, compute, dumps, loads):
+        """
+        คืนค่าจาก cache ถ้ามี ไม่เช่นนั้นเรียก compute() แล้วบันทึก
+        dumps/loads แปลงค่าเป็น bytes และกลับ ถ้า cache ใช้ไม่ได้ (เช่น ดิสก์เต็ม) จะคำนวณใหม่แทน
+        """
+        key = self.make_key(namespace, key_parts)
+        try:
+            value = self.get(key)
+        except sqlite3.Error:
+            value = None
+        if value is not None:
+            return loads(value)
+
+        result = compute()
+        if result is not None:
+            try:
+                self.set(key, dumps(result))
+            except (sqlite3.Error, pa.ArrowException, TypeError, ValueError):
+                pass
+        return result
+
+
+def dump_frame(df):
+    """DataFrame -> Arrow IPC bytes (เก็บ dtype เช่น category / float32 ไว้ครบ)"""
+    table = pa.Table.from_pandas(df)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def load_frame(value):
+    return pa.ipc.open_stream(value).read_all().to_pandas()
+
+
+def dump_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def load_json(value):
+    return json.loads(value)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """cache หลักของ process (None ถ้าปิดการใช้งาน)"""
+    global _cache
+    if not ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SharedCache()
+    return _cache
+
+
+def cached_frame(namespace, key_parts, compute):
+    """DataFrame ที่ใช้ร่วมกันทุก process (ไม่ cache ถ้า key มีเวอร์ชันเป็น None)"""
+    cache = get_cache()
+    if cache is None or None in key_parts:
+        return compute()
+    return cache.get_or_compute(namespace, key_parts, compute, dump_frame, load_frame)
+
+
+def cached_json(namespace, key_parts, compute):
+    """ค่าที่แปลงเป็น JSON ได้ (เช่น dict ของ figure) ที่ใช้ร่วมกันทุก process"""
+    cache = get_cache()
+    if cache is None or None in key_parts:
+        return compute()
+    return cache.get_or_compute(namespace, key_parts, compute, dump_json, load_json)
+
+
+def read_json(namespace, key_parts):
+    """อ่านค่าที่มีอยู่แล้วโดยไม่คำนวณ (None ถ้ายังไม่มีหรือปิด cache)"""
+    cache = get_cache()
+    if cache is None or None in key_parts:
+        return None
+    try:
+        value = cache.get(cache.make_key(namespace, key_parts))
+    except sqlite3.Error:
+        return None
+    return None if value is None else load_json(value)
+
+
+def write_json(namespace, key_parts, value):
+    cache = get_cache()
+    if cache is None or None in key_parts:
+        return
+    try:
+        cache.set(cache.make_key(namespace, key_parts), dump_json(value))
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,59 @@
+"""
+ตั้งค่าร่วมของชุดทดสอบ
+
+โมดูลของแอปอ่าน BEWDAR_DATA_DIR ตอน import จึงตั้งโฟลเดอร์ข้อมูลชั่วคราวที่นี่ก่อน import โมดูลใดๆ
+(ทดสอบไม่เขียนลง mock_data ของ repo)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+MOCK_DATA_DIR = REPO_DIR / "mock_data"
+TEST_LEVEL = "Primary2"
+TEST_MONTH = "JULY"
+
+DATA_DIR = Path(tempfile.mkdtemp(prefix="bewdar-tests-"))
+os.environ["BEWDAR_DATA_DIR"] = str(DATA_DIR)
+sys.path.insert(0, str(REPO_DIR))
+
+
+def copy_export(level, month, data_dir, target_month=None):
+    """copy ไฟล์ export จาก mock_data (mtime ย้อนหลังให้ watcher ถือว่าเขียนเสร็จแล้ว) คืนค่า path ใหม่"""
+    target = Path(data_dir) / f"export_all_outputs_{level}_{target_month or month}.xlsx"
+    shutil.copy(MOCK_DATA_DIR / f"export_all_outputs_{level}_{month}.xlsx", target)
+    past = time.time() - 60
+    os.utime(target, (past, past))
+    return target
+
+
+copy_export(TEST_LEVEL, TEST_MONTH, DATA_DIR)
+
+
+@pytest.fixture(scope="session")
+def ingested():
+    """snapshot, ข้อมูลย้อนหลัง และไฟล์ที่คำนวณหลัง ingest ของระดับชั้นที่ใช้ทดสอบ"""
+    import data_store
+    import report_builder
+
+    data_store.ingest_all()
+    report_builder.prepare_level_artifacts(TEST_LEVEL, TEST_MONTH)
+    return data_store.export_path(TEST_LEVEL, TEST_MONTH)
+
+
+@pytest.fixture
+def store_dirs(tmp_path):
+    """โฟลเดอร์ข้อมูล, snapshot และข้อมูลย้อนหลังแยกต่อการทดสอบ"""
+    dirs = {"data_dir": tmp_path / "data", "snapshot_dir": tmp_path / "snapshots", "history_dir": tmp_path / "history"}
+    for path in dirs.values():
+        path.mkdir()
+    return dirs
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+
+# พื้นที่ตามสี่เหลี่ยมพื้นหลังของ plot_classroom_cluster เดิม: (STEM ต่ำสุด, สูงสุด, ภาษาต่ำสุด, สูงสุด, ชื่อ)
+ZONE_RECTANGLES = [
+    (0, 50, 0, 50, "Warning Zone"),
+    (0, 50, 50, 80, "STEM Support"),
+    (0, 50, 80, 100, "Language Expert"),
+    (50, 80, 0, 50, "Language Support"),
+    (50, 80, 50, 80, "Development Zone"),
+    (80, 100, 0, 50, "STEM Expert"),
+    (80, 100, 50, 80, "STEM Strong"),
+    (50, 80, 80, 100, "Language Strong"),
+    (80, 100, 80, 100, "Perfect Zone"),
+]
+
+
+def _rectangle_zone(stem, language):
+    for stem_min, stem_max, language_min, language_max, name in ZONE_RECTANGLES:
+        # ขอบล่างอยู่ในพื้นที่ ขอบบนอยู่ในพื้นที่ถัดไป (ยกเว้น 100)
+        in_stem = stem_min <= stem < stem_max or stem == stem_max == 100
+        in_language = language_min <= language < language_max or language == language_max == 100
+        if in_stem and in_language:
+            return name
+    return None
+
+
+def test_assign_zones_matches_rectangles():
+    values = [0, 12.5, 49.9, 50, 65, 79.99, 80, 91, 100]
+    stem, language = (grid.ravel() for grid in np.meshgrid(values, values))
+
+    zones = analytics.assign_zones(stem, language)
+
+    assert list(zones) == [_rectangle_zone(s, l) for s, l in zip(stem, language)]
+
+
+def test_assign_zones_missing_scores_are_nan():
+    zones = analytics.assign_zones([np.nan, 90.0], [90.0, np.nan])
+    assert zones.isna().all()
+
+
+def test_zone_statistics_lists_every_zone():
+    df = pd.DataFrame({"STEM_AVG": [90.0, 95.0, 10.0], "LANGUAGE_AVG": [90.0, 85.0, 10.0], "MATH": [90.0, 96.0, 5.0]})
+
+    stats = analytics.zone_statistics(df).set_index("ZONE")
+
+    assert list(stats.index) == analytics.ZONE_NAMES
+    assert stats.loc["Perfect Zone", "STUDENTS"] == 2
+    assert stats.loc["Perfect Zone", "MATH"] == pytest.approx(93.0)
+    assert stats.loc["Development Zone", "STUDENTS"] == 0
+
+
+def _study_frame(times, scores):
+    columns = {}
+    for subject in analytics.STUDY_TIME_SUBJECTS:
+        columns[f"{subject}_TIME_HR"] = times
+        columns[subject] = scores
+    return pd.DataFrame(columns)
+
+
+def test_study_time_model_falls_back_to_prior_without_spread():
+    # เวลาเรียนเท่ากันทุกคน ข้อมูลไม่บอกความชัน ใช้ prior
+    model = analytics.StudyTimeModel(_study_frame([2.0] * 30, list(np.linspace(40, 90, 30))))
+
+    assert model.slopes == pytest.approx([analytics.STUDY_TIME_PRIOR_SLOPE] * 4)
+    assert not model.fitted.any()
+    assert list(model.samples) == [30] * 4
+
+
+def test_study_time_model_needs_enough_samples():
+    times = [0.5, 1.0, 2.0, 4.0]
+    model = analytics.StudyTimeModel(_study_frame(times, [40.0, 50.0, 60.0, 70.0]))
+
+    assert (model.samples < analytics.STUDY_TIME_MIN_SAMPLES).all()
+    assert not model.fitted.any()
+
+
+def test_study_time_model_fits_spread_data():
+    times = np.tile([0.5, 1.0, 2.0, 4.0, 8.0], 6)
+    scores = 40 + 15 * np.log1p(times)
+    model = analytics.StudyTimeModel(_study_frame(times, scores))
+
+    assert model.fitted.all()
+    assert (model.slopes > analytics.STUDY_TIME_PRIOR_SLOPE).all()
+    # เวลาเรียนเท่าเดิม คะแนนไม่เปลี่ยน
+    prediction = model.predict([60.0] * 4, [2.0] * 4, [[2.0] * 4])
+    assert prediction["scores"][0] == pytest.approx([60.0] * 4)
+
+
+def _neighbor_frame():
+    # นักเรียนจำลองของห้อง stem_focused บนแกน (STEM_AVG, LANGUAGE_AVG) และนักเรียนจริงหนึ่งคนที่ต้องไม่ถูกนับ
+    rows = [
+        ("Sim1", 10.0, 10.0, "Bronze"),
+        ("Sim2", 11.0, 10.0, "Bronze"),
+        ("Sim3", 12.0, 10.0, "Silver"),
+        ("Sim4", 90.0, 90.0, "Diamond"),
+        ("Sim5", 91.0, 90.0, "Diamond"),
+        ("Sim6", 92.0, 90.0, "Gold"),
+        ("Kyiv", 10.5, 10.0, "Diamond"),
+    ]
+    df = pd.DataFrame(rows, columns=["ALIAS", "STEM_AVG", "LANGUAGE_AVG", "TIER"])
+    df["CLASSROOM_TYPE"] = "stem_focused"
+    df["IS_SIMULATED"] = df["ALIAS"].str.startswith("Sim")
+    return df
+
+
+def test_tier_vote_uses_majority_of_neighbors():
+    index = analytics.TierNeighborIndex(_neighbor_frame())
+
+    tiers = index.tier_vote("stem_focused", [[10.0, 10.0], [91.0, 91.0]], k=3)
+
+    assert list(tiers) == ["Bronze", "Diamond"]
+
+
+def test_tier_vote_breaks_ties_by_nearest_neighbor():
+    index = analytics.TierNeighborIndex(_neighbor_frame())
+
+    # เพื่อนบ้าน 2 คนคือ Bronze (11) และ Silver (12) ได้คะแนนโหวตเท่ากัน เลือกคนที่ใกล้กว่า
+    assert list(index.tier_vote("stem_focused", [[11.6, 10.0]], k=2)) == ["Silver"]
+    assert list(index.tier_vote("stem_focused", [[11.4, 10.0]], k=2)) == ["Bronze"]
+
+
+def test_tier_vote_unknown_classroom_returns_none():
+    index = analytics.TierNeighborIndex(_neighbor_frame())
+
+    assert list(index.tier_vote("general", [[10.0, 10.0], [50.0, 50.0]])) == [None, None]
+
+
+def test_nearest_tiers_keeps_row_index():
+    df = _neighbor_frame()
+    index = analytics.TierNeighborIndex(df)
+    rows = df[~df["IS_SIMULATED"]]
+
+    tiers = index.nearest_tiers(rows, k=3)
+
+    assert list(tiers.index) == list(rows.index)
+    assert list(tiers) == ["Bronze"]
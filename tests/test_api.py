@@ -0,0 +1,144 @@
+"""
+ทดสอบ api.py โดยเรียก ASGI app ตรงๆ (starlette.testclient ต้องใช้แพ็กเกจ HTTP client ที่ไม่ได้อยู่ใน requirements.txt)
+"""
+import asyncio
+import json
+import shutil
+import types
+
+import pytest
+
+import api
+import data_store
+from conftest import DATA_DIR, MOCK_DATA_DIR, TEST_LEVEL, TEST_MONTH
+
+TOKENS = {
+    "admin-token": {"name": "admin", "students": "*"},
+    "parent-token": {"name": "parent", "students": {TEST_LEVEL: ["Kyiv"]}},
+}
+
+
+class Response:
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def get(path, token=None, headers=None):
+    """ส่ง GET หนึ่งครั้งผ่าน ASGI interface ของ api.api"""
+    request_headers = dict(headers or {})
+    if token is not None:
+        request_headers["Authorization"] = f"Bearer {token}"
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in request_headers.items()],
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+    }
+    response = {"body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {name.decode(): value.decode() for name, value in message["headers"]}
+        else:
+            response["body"] += message.get("body", b"")
+
+    asyncio.run(api.api(scope, receive, send))
+    return Response(response["status"], response["headers"], response["body"])
+
+
+@pytest.fixture(autouse=True)
+def tokens(tmp_path, monkeypatch, ingested):
+    path = tmp_path / "tokens.json"
+    path.write_text(json.dumps({api.hash_token(token): scope for token, scope in TOKENS.items()}), encoding="utf-8")
+    monkeypatch.setenv(api.TOKENS_ENV, str(path))
+
+
+def test_missing_or_unknown_token_is_rejected():
+    for token in [None, "wrong-token"]:
+        response = get("/api/levels", token)
+        assert response.status_code == 401
+        assert response.headers["www-authenticate"] == "Bearer"
+
+
+def test_tokens_file_unset_rejects_everyone(monkeypatch):
+    monkeypatch.delenv(api.TOKENS_ENV)
+    assert get("/api/levels", "admin-token").status_code == 401
+
+
+def test_parent_sees_only_own_student():
+    response = get(f"/api/students/{TEST_LEVEL}/{TEST_MONTH}", "parent-token")
+
+    assert response.status_code == 200
+    assert [student["alias"] for student in response.json()["students"]] == ["Kyiv"]
+    assert get("/api/levels", "parent-token").json()["levels"] == {TEST_LEVEL: [TEST_MONTH]}
+
+
+def test_parent_cannot_read_other_students_or_cohort():
+    assert get(f"/api/report/{TEST_LEVEL}/{TEST_MONTH}/Samara", "parent-token").status_code == 403
+    assert get(f"/api/cohort/{TEST_LEVEL}/{TEST_MONTH}", "parent-token").status_code == 403
+    assert get(f"/api/students/Primary3/{TEST_MONTH}", "parent-token").status_code == 403
+
+
+def test_report_etag_returns_not_modified():
+    path = f"/api/report/{TEST_LEVEL}/{TEST_MONTH}/Kyiv"
+    first = get(path, "parent-token")
+
+    assert first.status_code == 200
+    assert first.json()["alias"] == "Kyiv"
+    assert first.headers["cache-control"] == api.CACHE_CONTROL
+    assert "Authorization" in first.headers["vary"]
+
+    second = get(path, "parent-token", {"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 304
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.body == b""
+
+    assert get(path, "parent-token", {"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_unknown_student_is_not_found():
+    assert get(f"/api/report/{TEST_LEVEL}/{TEST_MONTH}/Nobody", "admin-token").status_code == 404
+
+
+def test_cohort_for_admin():
+    response = get(f"/api/cohort/{TEST_LEVEL}/{TEST_MONTH}", "admin-token")
+
+    assert response.status_code == 200
+    assert {"tiers", "scores", "zones"} <= set(response.json()["tables"])
+
+
+def test_export_without_snapshot_is_not_ready(monkeypatch):
+    source = data_store.export_path("Primary5", TEST_MONTH)
+    shutil.copy(MOCK_DATA_DIR / source.name, source)
+    try:
+        response = get(f"/api/students/Primary5/{TEST_MONTH}", "admin-token")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == str(api.NOT_READY_RETRY_AFTER)
+        assert "problems" not in response.json()
+
+        # watcher พบปัญหาของไฟล์ ส่งรายการปัญหาใน body ด้วย
+        problems = ["ไม่พบ sheet OurStudent_Primary5"]
+        monkeypatch.setattr(api, "_watcher", types.SimpleNamespace(errors={source.name: problems}))
+        response = get(f"/api/students/Primary5/{TEST_MONTH}", "admin-token")
+        assert response.status_code == 503
+        assert response.json()["problems"] == problems
+    finally:
+        source.unlink()
+        assert not (DATA_DIR / source.name).exists()
@@ -0,0 +1,225 @@
+import os
+import shutil
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+import data_store
+from conftest import MOCK_DATA_DIR, copy_export
+
+
+def _positions(values):
+    return list(np.asarray(values))
+
+
+@pytest.fixture
+def index_frame():
+    return pd.DataFrame({
+        "ALIAS": ["Kyiv", "Kyiv", "Sim1", "Kyiv", "Sim2", "Sim1"],
+        "MONTH": ["JULY", "JULY", None, "SEPTEMBER", None, None],
+        "CLASSROOM_TYPE": ["stem_focused", "general", "stem_focused", "stem_focused", "general", "general"],
+    })
+
+
+def test_student_index_lookups(index_frame):
+    index = data_store.StudentIndex(index_frame)
+
+    assert index.real_aliases == ["Kyiv"]
+    assert index.sim_aliases == ["Sim1", "Sim2"]
+    assert _positions(index.rows("Kyiv", "JULY", "stem_focused")) == [0]
+    assert _positions(index.student_rows("Kyiv", "JULY")) == [0, 1]
+    assert _positions(index.alias_rows("Kyiv")) == [0, 1, 3]
+    assert _positions(index.alias_rows("Kyiv", "stem_focused")) == [0, 3]
+    assert _positions(index.classroom_rows("general")) == [1, 4, 5]
+    assert _positions(index.classroom_rows("general", simulated=True)) == [4, 5]
+    assert _positions(index.classroom_rows("general", simulated=False)) == [1]
+    assert index.months_for("Kyiv") == ["JULY", "SEPTEMBER"]
+    # นักเรียนจำลองไม่มีเดือน (MONTH เป็น NaN) ใช้ None เป็น key
+    assert _positions(index.rows("Sim1", None, "general")) == [5]
+    assert index.months_for("Sim1") == []
+
+
+def test_student_index_missing_keys_are_empty(index_frame):
+    index = data_store.StudentIndex(index_frame)
+
+    assert len(index.student_rows("Kyiv", "MARCH")) == 0
+    assert len(index.alias_rows("Nobody")) == 0
+    assert len(index.classroom_rows("language_focused")) == 0
+    assert data_store.StudentIndex(pd.DataFrame({"MATH": [1.0]})).real_aliases == []
+
+
+def test_student_index_matches_masks_on_snapshot(ingested):
+    df = data_store.enrich_frame(data_store.read_snapshot_sheet(ingested, "Analysis_Primary2"))
+    index = data_store.StudentIndex(df)
+
+    for alias in index.real_aliases:
+        for month in index.months_for(alias):
+            mask = (df["ALIAS"] == alias) & (df["MONTH"] == month)
+            assert _positions(index.student_rows(alias, month)) == list(np.flatnonzero(mask))
+
+
+def test_snapshot_reused_while_source_unchanged(store_dirs):
+    source = copy_export("Primary2", "JULY", store_dirs["data_dir"])
+    manifest = data_store.ensure_snapshot(source, store_dirs["snapshot_dir"])
+    snapshot_path = data_store._snapshot_path(source, store_dirs["snapshot_dir"])
+    target = os.readlink(snapshot_path)
+
+    assert snapshot_path.is_symlink()
+    assert data_store.current_snapshot(source, store_dirs["snapshot_dir"]) == manifest
+
+    # copy ทับด้วยเนื้อหาเดิม: mtime เปลี่ยนแต่ hash เท่าเดิม ไม่สร้าง snapshot ใหม่
+    os.utime(source, None)
+    refreshed = data_store.ensure_snapshot(source, store_dirs["snapshot_dir"])
+    assert refreshed["version"] == manifest["version"]
+    assert refreshed["mtime_ns"] == source.stat().st_mtime_ns
+    assert os.readlink(snapshot_path) == target
+
+
+def test_snapshot_swapped_when_source_changes(store_dirs):
+    source = copy_export("Primary2", "JULY", store_dirs["data_dir"])
+    first = data_store.ensure_snapshot(source, store_dirs["snapshot_dir"])
+    snapshot_path = data_store._snapshot_path(source, store_dirs["snapshot_dir"])
+    first_target = os.readlink(snapshot_path)
+
+    shutil.copy(MOCK_DATA_DIR / "export_all_outputs_Primary3_JULY.xlsx", source)
+    second = data_store.ensure_snapshot(source, store_dirs["snapshot_dir"])
+
+    assert second["version"] != first["version"]
+    assert os.readlink(snapshot_path) != first_target
+    assert "Analysis_Primary3" in second["sheets"]
+    # รุ่นก่อนหน้าเก็บไว้หนึ่งรุ่นสำหรับผู้ที่กำลังอ่านอยู่
+    assert (snapshot_path.parent / first_target).is_dir()
+    assert not data_store.read_snapshot_sheet(source, "Analysis_Primary3", store_dirs["snapshot_dir"]).empty
+
+
+def test_snapshot_rebuilt_when_schema_changes(store_dirs, monkeypatch):
+    source = copy_export("Primary2", "JULY", store_dirs["data_dir"])
+    first = data_store.ensure_snapshot(source, store_dirs["snapshot_dir"])
+
+    monkeypatch.setattr(data_store, "SCHEMA_VERSION", data_store.SCHEMA_VERSION + 1)
+    second = data_store.ensure_snapshot(source, store_dirs["snapshot_dir"])
+
+    assert second["schema"] == data_store.SCHEMA_VERSION
+    assert second["version"] != first["version"]
+
+
+def _export_without_our_students(data_dir, month):
+    """ไฟล์ export ของ Primary4 ที่มีแค่ sheet Analysis (ตัวอย่างไฟล์ที่ต้องไม่ถูกเผยแพร่)"""
+    workbook = openpyxl.load_workbook(MOCK_DATA_DIR / "export_all_outputs_Primary4_JULY.xlsx")
+    del workbook["OurStudent_Primary4"]
+    path = data_store.export_path("Primary4", month, data_dir)
+    workbook.save(path)
+    os.utime(path, (0, 0))
+    return path
+
+
+def test_watcher_rejects_export_missing_sheet(store_dirs):
+    copy_export("Primary4", "JULY", store_dirs["data_dir"])
+    bad_path = _export_without_our_students(store_dirs["data_dir"], "SEPTEMBER")
+    watcher = data_store.SnapshotWatcher(settle_seconds=0, **store_dirs)
+
+    swapped = watcher.poll_once()
+
+    assert [(level, month) for level, month, _, _ in swapped] == [("Primary4", "JULY")]
+    assert watcher.errors == {bad_path.name: ["ไม่พบ sheet OurStudent_Primary4"]}
+    assert data_store.current_snapshot(bad_path, store_dirs["snapshot_dir"]) is None
+    partitions = data_store.read_history_index("Primary4", store_dirs["history_dir"])["partitions"]
+    assert [partition.split("-")[1] for partition in partitions] == ["JULY"]
+    # ไฟล์ที่ไม่ผ่านการตรวจไม่ถูกแปลงซ้ำจนกว่าจะเปลี่ยน
+    assert watcher.poll_once() == []
+    assert bad_path.name in watcher.errors
+
+
+def test_watcher_retries_history_on_next_poll(store_dirs, monkeypatch):
+    source = copy_export("Primary2", "JULY", store_dirs["data_dir"])
+    update_history = data_store.update_history
+    calls = []
+
+    def flaky_update_history(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return update_history(*args, **kwargs)
+
+    monkeypatch.setattr(data_store, "update_history", flaky_update_history)
+    published = []
+    watcher = data_store.SnapshotWatcher(
+        settle_seconds=0, on_snapshot=lambda *args: published.append(args), **store_dirs
+    )
+
+    assert len(watcher.poll_once()) == 1
+    assert watcher.errors == {source.name: ["history: disk full"]}
+    assert published == []
+
+    # snapshot สลับไปแล้ว รอบถัดไปลองเฉพาะข้อมูลย้อนหลังใหม่ (ไม่นับเป็นการสลับซ้ำ)
+    assert watcher.poll_once() == []
+    assert watcher.errors == {}
+    assert len(calls) == 2
+    assert [(level, month) for level, month, _ in published] == [("Primary2", "JULY")]
+
+
+def test_require_level_sheets_reports_every_problem(tmp_path):
+    source = data_store.export_path("Primary4", "JULY", tmp_path)
+    with pytest.raises(data_store.SnapshotValidationError) as raised:
+        data_store.require_level_sheets(source, {"Analysis_Primary4": pd.DataFrame()})
+
+    assert raised.value.problems == ["sheet Analysis_Primary4 ไม่มีข้อมูล", "ไม่พบ sheet OurStudent_Primary4"]
+    assert data_store.error_report(raised.value) == raised.value.problems
+
+
+def _history_frame(rows):
+    columns = ["ALIAS", "MONTH", "MATH", "SCIENCE", "ENGLISH", "THAI"]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def test_history_partitions_round_trip(tmp_path):
+    july = _history_frame([
+        ["Kyiv", "JULY", 60.0, 70.0, 80.0, 90.0],
+        ["Kyiv", "MARCH", 50.0, 50.0, 50.0, 50.0],
+        ["Samara", "JULY", 40.0, 40.0, 40.0, 40.0],
+        ["Sim1", None, 99.0, 99.0, 99.0, 99.0],
+    ])
+    september = _history_frame([["Kyiv", "SEPTEMBER", 70.0, 80.0, 90.0, 100.0]])
+
+    data_store.append_history("Primary2", "JULY", july, "v1", tmp_path, year=2025)
+    index = data_store.append_history("Primary2", "SEPTEMBER", september, "v2", tmp_path, year=2025)
+
+    assert index["partitions"] == {"2025-JULY": {"version": "v1", "rows": 3}, "2025-SEPTEMBER": {"version": "v2", "rows": 1}}
+    assert "Sim1" not in index["students"]
+
+    history = data_store.read_student_history("Primary2", "Kyiv", tmp_path)
+    # MARCH ในไฟล์ export เดือน JULY เป็นผลของปีการศึกษาก่อน
+    assert list(history["PERIOD"]) == ["MARCH 2025", "JULY 2025", "SEPTEMBER 2025"]
+    assert list(history["OVERALL_AVG"]) == [50.0, 75.0, 85.0]
+    assert list(data_store.read_student_history("Primary2", "Samara", tmp_path)["PERIOD"]) == ["JULY 2025"]
+
+
+def test_history_partition_replaced_not_duplicated(tmp_path):
+    data_store.append_history("Primary2", "JULY", _history_frame([["Kyiv", "JULY", 60.0, 60.0, 60.0, 60.0]]), "v1", tmp_path, 2025)
+    data_store.append_history("Primary2", "JULY", _history_frame([["Kyiv", "JULY", 80.0, 80.0, 80.0, 80.0]]), "v2", tmp_path, 2025)
+
+    history = data_store.read_student_history("Primary2", "Kyiv", tmp_path)
+
+    assert list(history["MATH"]) == [80.0]
+    assert data_store.read_history_index("Primary2", tmp_path)["partitions"]["2025-JULY"]["version"] == "v2"
+
+
+def test_compact_frame_only_touches_requested_columns():
+    df = pd.DataFrame({
+        "ALIAS": ["a", "b", "c", "d"],
+        "TOPICS": ["x", "x", "x", "y"],
+        "NOTE": ["p", "q", "r", "s"],
+        "MATH": [1.0, 2.0, 3.0, 4.0],
+    })
+
+    data_store.compact_frame(df, ["MATH"])
+    assert df["MATH"].dtype == np.float32
+    assert not isinstance(df["TOPICS"].dtype, pd.CategoricalDtype)
+
+    data_store.compact_frame(df)
+    # ALIAS อยู่ใน CATEGORICAL_COLUMNS เสมอ ส่วนข้อความอื่นขึ้นกับสัดส่วนค่าที่ไม่ซ้ำ
+    assert isinstance(df["ALIAS"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["TOPICS"].dtype, pd.CategoricalDtype)
+    assert not isinstance(df["NOTE"].dtype, pd.CategoricalDtype)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+import frame_cache
+
+
+def _frame(rows):
+    return pd.DataFrame({"MATH": np.zeros(rows, dtype=np.float32)})
+
+
+def _key(level, kind="frame", month="JULY", version="v1", *rest):
+    return (level, kind, month, version, *rest)
+
+
+def test_evicts_least_recently_used_level():
+    size = frame_cache.frame_bytes(_frame(1000))
+    cache = frame_cache.FrameCache(max_bytes=size * 3)
+    cache.set(_key("Primary1"), _frame(1000))
+    cache.set(_key("Primary1", "student_index"), _frame(1000))
+    cache.set(_key("Primary2"), _frame(1000))
+    # ใช้ Primary1 ล่าสุด Primary2 จึงเป็นระดับชั้นที่ไม่ได้ใช้นานที่สุด
+    assert cache.get(_key("Primary1")) is not None
+
+    cache.set(_key("Primary3"), _frame(1000))
+
+    assert cache.get(_key("Primary2")) is None
+    assert cache.get(_key("Primary1")) is not None
+    assert cache.get(_key("Primary1", "student_index")) is not None
+    assert cache.get(_key("Primary3")) is not None
+    assert cache.evictions == 1
+    assert cache.stats()["used_bytes"] <= cache.max_bytes
+
+
+def test_current_level_keeps_newest_entry_when_over_budget():
+    size = frame_cache.frame_bytes(_frame(1000))
+    cache = frame_cache.FrameCache(max_bytes=size * 2)
+    cache.set(_key("Primary1", "frame", "JULY", "v1", "Analysis"), _frame(1000))
+    cache.set(_key("Primary1", "frame", "JULY", "v1", "OurStudent"), _frame(1000))
+
+    cache.set(_key("Primary1", "zone_statistics"), _frame(1000))
+
+    assert cache.get(_key("Primary1", "frame", "JULY", "v1", "Analysis")) is None
+    assert cache.get(_key("Primary1", "zone_statistics")) is not None
+    assert cache.stats()["levels"]["Primary1"]["entries"] == 2
+
+
+def test_entry_larger_than_budget_is_still_returned():
+    cache = frame_cache.FrameCache(max_bytes=1)
+
+    value = cache.get_or_load(_key("Primary1"), lambda: _frame(1000))
+
+    assert len(value) == 1000
+    assert cache.get(_key("Primary1")) is value
+
+
+def test_get_or_load_skips_keys_without_version():
+    cache = frame_cache.FrameCache()
+    calls = []
+
+    def load():
+        calls.append(1)
+        return _frame(1)
+
+    cache.get_or_load(_key("Primary1", version=None), load)
+    cache.get_or_load(_key("Primary1", version=None), load)
+
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_discard_snapshot_removes_only_that_version():
+    cache = frame_cache.FrameCache()
+    cache.set(_key("Primary1", "frame", "JULY", "v1"), _frame(1))
+    cache.set(_key("Primary1", "student_index", "JULY", "v1"), _frame(1))
+    cache.set(_key("Primary1", "frame", "JULY", "v2"), _frame(1))
+    cache.set(_key("Primary1", "frame", "SEPTEMBER", "v1"), _frame(1))
+
+    cache.discard_snapshot("Primary1", "JULY", "v1")
+
+    assert cache.get(_key("Primary1", "frame", "JULY", "v1")) is None
+    assert cache.get(_key("Primary1", "student_index", "JULY", "v1")) is None
+    assert cache.get(_key("Primary1", "frame", "JULY", "v2")) is not None
+    assert cache.get(_key("Primary1", "frame", "SEPTEMBER", "v1")) is not None
+
+
+def test_value_bytes_sums_containers():
+    frame = _frame(100)
+    assert frame_cache.value_bytes({"a": frame, "b": [frame, frame]}) == 3 * frame_cache.frame_bytes(frame)
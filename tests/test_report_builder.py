@@ -0,0 +1,106 @@
+import os
+
+import pandas as pd
+import pytest
+
+import analytics
+import data_store
+import report_builder
+from conftest import TEST_LEVEL, TEST_MONTH
+
+
+@pytest.fixture(scope="module")
+def level_data(ingested):
+    return report_builder.load_level(TEST_LEVEL, TEST_MONTH, refresh=False, precomputed=True)
+
+
+def test_summary_table_keeps_numeric_dtypes(level_data):
+    alias = level_data["student_index"].real_aliases[0]
+    month = level_data["student_index"].months_for(alias)[0]
+
+    summary = report_builder.create_summary_table(
+        level_data["df"], alias, month, level_data["student_index"], level_data["neighbor_index"]
+    )
+
+    for name in report_builder.SUMMARY_SCORE_COLUMNS.values():
+        assert pd.api.types.is_float_dtype(summary[name]), name
+    assert pd.api.types.is_integer_dtype(summary["Rank"])
+    assert set(summary["Classroom Type"]) >= {"General", "Stem Focused"}
+    assert summary["Nearest Tier"].notna().all()
+
+
+def test_level_summary_splits_into_student_tables(level_data):
+    level_summary = report_builder.create_level_summary_table(level_data["df"], neighbor_index=level_data["neighbor_index"])
+    tables = report_builder.split_level_summary_table(level_summary)
+    student_index = level_data["student_index"]
+
+    expected = {(str(alias), str(month)) for alias in student_index.real_aliases for month in student_index.months_for(alias)}
+    assert set(tables) == expected
+    for alias in student_index.real_aliases:
+        for month in student_index.months_for(alias):
+            pd.testing.assert_frame_equal(
+                tables[(str(alias), str(month))],
+                report_builder.create_summary_table(
+                    level_data["df"], alias, month, student_index, level_data["neighbor_index"]
+                ),
+            )
+
+    best = report_builder.summarize_level_summary_table(level_summary)
+    assert len(best) == len(expected)
+    assert (best["Best Classroom"] != "General").all()
+
+
+def test_base_figures_are_bounded_and_discarded(level_data, monkeypatch):
+    monkeypatch.setattr(report_builder, "BASE_FIGURE_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(report_builder, "_base_figures", type(report_builder._base_figures)())
+    df, student_index = level_data["df"], level_data["student_index"]
+    tabs = [(classroom_type, classroom_name) for _, classroom_type, classroom_name, _, _ in report_builder.CLASSROOM_TABS]
+
+    first = report_builder.get_classroom_base_figure(("L", "M", "v1"), *tabs[0], df, student_index)
+    assert report_builder.get_classroom_base_figure(("L", "M", "v1"), *tabs[0], df, student_index) is first
+    report_builder.get_classroom_base_figure(("L", "M", "v1"), *tabs[1], df, student_index)
+    report_builder.get_classroom_base_figure(("L", "M", "v2"), *tabs[0], df, student_index)
+
+    assert len(report_builder._base_figures) == 2
+    assert ("L", "M", "v1", *tabs[0]) not in report_builder._base_figures
+
+    report_builder.discard_base_figures(("L", "M", "v1"))
+    assert list(report_builder._base_figures) == [("L", "M", "v2", *tabs[0])]
+
+
+def test_precomputed_load_requires_ingest_artifacts(ingested):
+    neighbor_path = analytics._neighbor_index_path(ingested, "Analysis_" + TEST_LEVEL, analytics.NEIGHBOR_FEATURES)
+    os.remove(neighbor_path)
+    try:
+        with pytest.raises(data_store.SnapshotNotReady):
+            report_builder.load_level(TEST_LEVEL, TEST_MONTH, refresh=False, precomputed=True)
+    finally:
+        report_builder.prepare_level_artifacts(TEST_LEVEL, TEST_MONTH)
+
+    assert neighbor_path.exists()
+    data = report_builder.load_level(TEST_LEVEL, TEST_MONTH, refresh=False, precomputed=True)
+    assert data["neighbor_index"].version == data["snapshot_key"][2]
+
+
+def test_student_report_round_trips_through_serialization(level_data):
+    alias = level_data["student_index"].real_aliases[0]
+    month = level_data["student_index"].months_for(alias)[0]
+    report = report_builder.build_student_report(
+        level_data["df"], level_data["df_our_students"], alias, month,
+        level_data["student_index"], level_data["our_student_index"], level_data["neighbor_index"],
+        level_data["snapshot_key"],
+    )
+
+    restored = report_builder.deserialize_student_report(
+        report_builder.serialize_student_report(report),
+        lambda classroom_type, classroom_name: report_builder.get_classroom_base_figure(
+            level_data["snapshot_key"], classroom_type, classroom_name, level_data["df"], level_data["student_index"]
+        ),
+    )
+
+    pd.testing.assert_frame_equal(restored["summary_table"], report["summary_table"], check_dtype=False)
+    assert restored["summary_text"] == report["summary_text"]
+    assert set(restored["classroom_figures"]) == set(report["classroom_figures"])
+    # scatter plot ที่ประกอบคืนมีทั้งกราฟพื้นหลังและ trace ของนักเรียน
+    for classroom_type, figures in report["classroom_figures"].items():
+        assert len(restored["classroom_figures"][classroom_type]["scatter"].data) == len(figures["scatter"].data)